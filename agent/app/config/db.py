@@ -1,5 +1,6 @@
 from langchain_mongodb import MongoDBAtlasVectorSearch
 from pymongo import MongoClient
+import hashlib
 import os
 from config.embedding import embeddings
 from langchain_community.document_loaders import PyPDFLoader
@@ -7,32 +8,168 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 load_dotenv()
 
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+DEFAULT_SOURCE = "./test.pdf"
+# Manifest document recording that chunks not tracked by the manifest were purged
+PURGE_MARKER = "__purged_untracked__"
+# Chunk IDs deleted per request when purging
+PURGE_BATCH_SIZE = 500
+
 vector_store = None
+collection = None
+manifest = None
+
 
 def init(docs=None):
-    global vector_store
-    if vector_store is not None:
-        return vector_store
-
-    client = MongoClient(os.environ.get("MONGODB_CONNECTION_STRING"))
-    db = client["sample_mflix"]
-    collection = db["vector_embeddings"]
-
-    loader = PyPDFLoader("./test.pdf")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    if not docs:
-        docs = loader.load()
+    """
+    Attach to the existing vector collection. Nothing is embedded here, so
+    startup cost does not depend on the size of the index; use `reindex`
+    (or `python reindex.py`) to load files into it.
+    :param docs: Optional documents to ingest right away (only new chunks are embedded)
+    :return: The vector store
+    """
+    global vector_store, collection, manifest
+    if vector_store is None:
+        client = MongoClient(os.environ.get("MONGODB_CONNECTION_STRING"))
+        db = client["sample_mflix"]
+        collection = db["vector_embeddings"]
+        manifest = db["ingestion_manifest"]
+
+        vector_store = MongoDBAtlasVectorSearch(
+            collection=collection,
+            embedding=embeddings,
+            index_name=os.environ.get("ATLAS_VECTOR_SEARCH_INDEX_NAME", ""),
+            relevance_score_fn="cosine",
+        )
+
+    if docs:
+        ingest_documents(docs)
+
+    return vector_store
+
+
+def _source_key(source):
+    """Manifest key of a source: the absolute path, so the same file is one entry whichever way it was named"""
+    return os.path.abspath(source) if source != "unknown" else source
+
+
+def _file_hash(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _chunk_id(source, chunk):
+    key = f"{source}\0{CHUNK_SIZE}\0{CHUNK_OVERLAP}\0{chunk.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _up_to_date(entry, content_hash):
+    return (entry.get("content_hash") == content_hash
+            and entry.get("chunk_size") == CHUNK_SIZE
+            and entry.get("chunk_overlap") == CHUNK_OVERLAP)
+
+
+def ingest_documents(docs, source=None, content_hash=None, force=False):
+    """
+    Index the chunks of `docs` that are not in the manifest yet and drop the
+    chunks that no longer exist for this source.
+    :param docs: Loaded documents (e.g. PDF pages)
+    :param source: Manifest key, defaults to the `source` metadata of the first document
+    :param content_hash: Hash of the raw source, computed from the page contents if omitted
+    :param force: Re-embed every chunk even if the manifest is up to date
+    :return: Number of chunks embedded
+    """
+    init()
+    if source is None:
+        source = docs[0].metadata.get("source", "unknown") if docs else "unknown"
+    source = _source_key(source)
+    if content_hash is None:
+        content_hash = hashlib.sha256("\0".join(doc.page_content for doc in docs).encode("utf-8")).hexdigest()
+
+    entry = manifest.find_one({"_id": source}) or {}
+    if not force and _up_to_date(entry, content_hash):
+        print(f"{source} is up to date, nothing to embed")
+        return 0
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     all_splits = text_splitter.split_documents(docs)
-    print("docs: ", docs)
-    print(os.environ.get("ATLAS_VECTOR_SEARCH_INDEX_NAME", ""))
-    vector_store = MongoDBAtlasVectorSearch.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        collection=collection,
-        index_name=os.environ.get("ATLAS_VECTOR_SEARCH_INDEX_NAME", ""),
-        relevance_score_fn="cosine",
+    # overlapping pages can produce identical chunks, keep the first one
+    chunks = {}
+    for chunk in all_splits:
+        chunks.setdefault(_chunk_id(source, chunk), chunk)
+
+    known = set() if force else set(entry.get("chunk_ids", []))
+    new_ids = [chunk_id for chunk_id in chunks if chunk_id not in known]
+    stale_ids = [chunk_id for chunk_id in entry.get("chunk_ids", []) if chunk_id not in chunks]
+
+    if stale_ids:
+        vector_store.delete(ids=stale_ids)
+    if new_ids:
+        vector_store.add_documents(documents=[chunks[i] for i in new_ids], ids=new_ids)
+
+    manifest.replace_one(
+        {"_id": source},
+        {
+            "_id": source,
+            "content_hash": content_hash,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "chunk_ids": list(chunks),
+        },
+        upsert=True,
     )
+    print(f"{source}: embedded {len(new_ids)} chunks, removed {len(stale_ids)}, kept {len(chunks) - len(new_ids)}")
+    return len(new_ids)
 
-    vector_store.add_documents(documents=all_splits)
 
-    return vector_store
+def reindex(file_path=DEFAULT_SOURCE, force=False):
+    """
+    Offline entry point: bring the vector store in sync with a PDF file.
+    The file is only parsed and split when its content hash or the chunking
+    parameters differ from the manifest.
+    :param file_path: Path to the PDF file
+    :param force: Re-embed every chunk even if the manifest is up to date
+    :return: Number of chunks embedded
+    """
+    init()
+    purge_untracked()
+    source = _source_key(file_path)
+    content_hash = _file_hash(file_path)
+    entry = manifest.find_one({"_id": source}, {"chunk_ids": 0}) or {}
+    if not force and _up_to_date(entry, content_hash):
+        print(f"{source} is up to date, nothing to embed")
+        return 0
+
+    docs = PyPDFLoader(file_path).load()
+    return ingest_documents(docs, source=source, content_hash=content_hash, force=force)
+
+
+def purge_untracked(force=False):
+    """
+    Delete the chunks of the vector store that no manifest entry tracks: vectors added before the
+    manifest existed, and the chunks of entries keyed by a relative path (the file is embedded
+    again under its absolute path by the next reindex). Runs once, unless `force`.
+    :return: Number of chunks deleted
+    """
+    init()
+    if not force and manifest.find_one({"_id": PURGE_MARKER}):
+        return 0
+
+    tracked = set()
+    for entry in manifest.find({"_id": {"$ne": PURGE_MARKER}}, {"chunk_ids": 1}):
+        if entry["_id"] != _source_key(entry["_id"]):
+            manifest.delete_one({"_id": entry["_id"]})
+            continue
+        tracked.update(entry.get("chunk_ids", []))
+
+    untracked = [str(doc["_id"]) for doc in collection.find({}, {"_id": 1}) if str(doc["_id"]) not in tracked]
+    for start in range(0, len(untracked), PURGE_BATCH_SIZE):
+        vector_store.delete(ids=untracked[start:start + PURGE_BATCH_SIZE])
+
+    manifest.replace_one({"_id": PURGE_MARKER}, {"_id": PURGE_MARKER, "deleted": len(untracked)}, upsert=True)
+    print(f"Purged {len(untracked)} chunks not tracked by the manifest")
+    return len(untracked)
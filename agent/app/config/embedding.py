@@ -1,6 +1,44 @@
+import os
+import sys
 from langchain_cohere import CohereEmbeddings
+from langchain_core.embeddings import Embeddings
+# modules shared with the other services live in shared/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from shared.embedding_cache import EmbeddingCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
-embeddings = CohereEmbeddings(model="embed-english-v3.0")  # type: ignore
+EMBEDDING_MODEL = "embed-english-v3.0"
+
+embedding_cache = EmbeddingCache(os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"))
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve repeated texts from `embedding_cache` and only send the misses to Cohere."""
+
+    def __init__(self, embeddings, model):
+        self.embeddings = embeddings
+        # Cohere embeds documents and queries with a different input_type
+        self.document_model = f"{model}/search_document"
+        self.query_model = f"{model}/search_query"
+
+    def embed_documents(self, texts):
+        vectors = embedding_cache.get_many(self.document_model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            embedding_cache.put_many(self.document_model, [texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return [[float(x) for x in vector] for vector in vectors]
+
+    def embed_query(self, text):
+        vector = embedding_cache.get(self.query_model, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            embedding_cache.put(self.query_model, text, vector)
+        return [float(x) for x in vector]
+
+
+embeddings = CachedEmbeddings(CohereEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL)  # type: ignore
@@ -0,0 +1,15 @@
+import argparse
+from config.db import DEFAULT_SOURCE, reindex, purge_untracked
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed new or changed chunks of PDF files into the vector store")
+    parser.add_argument("files", nargs="*", default=[DEFAULT_SOURCE], help="PDF files to index")
+    parser.add_argument("--force", action="store_true", help="Re-embed every chunk, ignoring the manifest")
+    parser.add_argument("--purge", action="store_true", help="Delete the chunks the manifest does not track, even if this was done before")
+    args = parser.parse_args()
+
+    if args.purge:
+        purge_untracked(force=True)
+
+    for file_path in args.files:
+        reindex(file_path, force=args.force)
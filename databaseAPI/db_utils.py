@@ -1,38 +1,52 @@
 # db_utils.py
 
 import os
+import sys
+import asyncio
 import dotenv
 import numpy as np
 import firebase_admin
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from firebase_admin import credentials, firestore
-from google.cloud.firestore_v1.vector import Vector
-from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+# modules shared with the other services live in shared/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.embedding_cache import EmbeddingCache, normalize_text
+from shared.vector_backend import get_backend
 
 dotenv.load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+EMBEDDING_MODEL = "text-embedding-3-small"
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# embedding requests in flight at once from the async endpoints
+openai_semaphore = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")))
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"))
 
 cred = credentials.Certificate(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
 firebase_admin.initialize_app(cred)
 firestore_client = firestore.client()
 collection = firestore_client.collection("filter_data")
+vector_backend = get_backend(collection)
 
 
 def get_embedding(text: str):
     """
-    Given a text, return the embedding vector
+    Given a text, return the embedding vector.
+    Vectors are served from `embedding_cache` when the same text was embedded before.
     :param text: Input text
     :return: Embedding vector
     """
-    text = text.replace("\n", " ")
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    embedding = np.array(response.data[0].embedding)
-    return embedding
+    text = normalize_text(text)
+    embedding = embedding_cache.get(EMBEDDING_MODEL, text)
+    if embedding is None:
+        response = openai_client.embeddings.create(
+            input=text,
+            model=EMBEDDING_MODEL
+        )
+        embedding = response.data[0].embedding
+        embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+    return np.array(embedding, dtype=np.float64)
 
 
 def query_database(query: str):
@@ -42,20 +56,38 @@ def query_database(query: str):
     :return: List of results
     """
     query_vec = get_embedding(query)
-    vector_query = collection.find_nearest(
-        vector_field="vector",
-        query_vector=Vector(query_vec),
-        distance_measure=DistanceMeasure.EUCLIDEAN,
-        limit=5,
-    )
-    docs = vector_query.stream()
-    answers = []
-    for doc in docs:
-        temp = doc.to_dict()
-        temp = {key: value for key, value in temp.items() if key != "vector"}
-        # print(f"{doc.id} => {temp}")
-        answers.append(temp)
-    return answers
+    return [doc for doc, _ in vector_backend.query(query_vec, limit=5)]
+
+
+async def aget_embedding(text: str):
+    """
+    Async version of `get_embedding`: the OpenAI request goes through the async client
+    and the cache lookups run in the thread pool, so the event loop is never blocked
+    :param text: Input text
+    :return: Embedding vector
+    """
+    text = normalize_text(text)
+    embedding = await asyncio.to_thread(embedding_cache.get, EMBEDDING_MODEL, text)
+    if embedding is None:
+        async with openai_semaphore:
+            response = await async_openai_client.embeddings.create(
+                input=text,
+                model=EMBEDDING_MODEL
+            )
+        embedding = response.data[0].embedding
+        await asyncio.to_thread(embedding_cache.put, EMBEDDING_MODEL, text, embedding)
+    return np.array(embedding, dtype=np.float64)
+
+
+async def aquery_database(query: str):
+    """
+    Async version of `query_database`, the (blocking) vector search runs in the thread pool
+    :param query: Input query
+    :return: List of results
+    """
+    query_vec = await aget_embedding(query)
+    results = await asyncio.to_thread(vector_backend.query, query_vec, 5)
+    return [doc for doc, _ in results]
 
 
 if __name__ == '__main__':
@@ -1,16 +1,30 @@
 # main.py
 
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Query
 from typing import List
 from pydantic import BaseModel
-from db_utils import query_database
+from db_utils import aquery_database
 
-app = FastAPI()
+# threads available to blocking calls (cache lookups, vector search)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "16"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=WORKER_THREADS))
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/query_database")
 async def query_database_endpoint(query: str = Query(..., description="Your search query")):
-    results = query_database(query)
+    results = await aquery_database(query)
     return results
 
 
@@ -1,9 +1,15 @@
 import os
+import sys
 import json
+import time
+import argparse
 import dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud.firestore_v1.vector import Vector
+# modules shared with the other services live in shared/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.bulk_writer import bulk_insert
 
 dotenv.load_dotenv()
 
@@ -17,19 +23,102 @@ def upload_json_to_firestore(json_file_path, collection_path):
     with open(json_file_path, 'r', encoding='utf-8') as file:
         data = json.load(file)
 
+    # Ensure the data is a list of documents
+    if isinstance(data, dict):
+        data = [data]
+    elif not isinstance(data, list):
+        print("Unsupported JSON format. Must be a list or dictionary.")
+        return
+
     # Convert the vector into a Vector object
     data = [__regulate_json(doc) for doc in data]
 
-    # Ensure the data is a list of documents
-    if isinstance(data, list):
-        for doc in data:
-            db.collection(collection_path).add(doc)
-    elif isinstance(data, dict):
-        db.collection(collection_path).add(data)
-    else:
-        print("Unsupported JSON format. Must be a list or dictionary.")
+    written, failed = bulk_insert(db, db.collection(collection_path), data)
+    if failed:
+        print(f"{len(failed)} documents could not be uploaded.")
+    print(f"Data uploaded successfully ({written} documents).")
+
+
+def iter_json_documents(json_file_path, chunk_size=1 << 20):
+    """
+    Incrementally parse a JSON file and yield its documents one by one.
+    Supports a JSON array of objects, a single object and JSON Lines
+    (one object per line), without loading the whole file in memory.
+    :param json_file_path: Path to the JSON file
+    :param chunk_size: Number of characters read at a time
+    :return: Generator of documents
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file_path, 'r', encoding='utf-8-sig') as file:
+        buffer, pos, eof = "", 0, False
+        read_size = chunk_size
+        in_array = None
+
+        while True:
+            # skip whitespace and separators between documents
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer, pos = file.read(read_size), 0
+                eof = not buffer
+                continue
 
-    print("Data uploaded successfully.")
+            if in_array is None:
+                in_array = buffer[pos] == "["
+                if in_array:
+                    pos += 1
+                continue
+            if in_array and buffer[pos] == "]":
+                return
+
+            try:
+                doc, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the document continues in the next chunk
+                more = file.read(read_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                read_size *= 2
+                continue
+
+            read_size = chunk_size
+            pos = end
+            yield doc
+
+
+def stream_json_to_firestore(json_file_path, collection_path, report_every=5.0):
+    """
+    Upload a JSON array or JSON Lines file while it is being parsed.
+    Vectors are converted per document and documents are fed to the bulk writer
+    as they are read, so memory use does not grow with the file size.
+    :param json_file_path: Path to the JSON file
+    :param collection_path: Firestore collection
+    :param report_every: Seconds between progress reports
+    """
+    start = last_report = time.time()
+    total_bytes = os.path.getsize(json_file_path)
+    written = 0
+
+    def on_commit(count):
+        nonlocal written, last_report
+        written += count
+        now = time.time()
+        if now - last_report >= report_every:
+            last_report = now
+            print(f"{written} documents written, {written / (now - start):.0f} docs/s")
+
+    documents = (__regulate_json(doc) for doc in iter_json_documents(json_file_path))
+    written_total, failed = bulk_insert(db, db.collection(collection_path), documents, on_commit=on_commit)
+
+    elapsed = time.time() - start
+    print(f"Uploaded {written_total} documents ({total_bytes / 1e6:.1f} MB) in {elapsed:.1f}s, "
+          f"{written_total / elapsed if elapsed else 0:.0f} docs/s")
+    if failed:
+        print(f"{len(failed)} documents could not be uploaded.")
 
 
 def __regulate_json(json_dict: dict):
@@ -48,7 +137,13 @@ def __regulate_json(json_dict: dict):
 
 
 if __name__ == "__main__":
-    # Replace with your JSON file path and collection path
-    json_file_path = "test.json"
-    collection_path = "filter_data"
-    upload_json_to_firestore(json_file_path, collection_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Upload a JSON file to Firestore")
+    parser.add_argument("json_file_path", nargs="?", default="test.json", help="JSON array, object or JSON Lines file")
+    parser.add_argument("--collection", default="filter_data", help="Firestore collection")
+    parser.add_argument("--stream", action="store_true", help="Parse and upload incrementally (for large files)")
+    args = parser.parse_args()
+
+    if args.stream:
+        stream_json_to_firestore(args.json_file_path, args.collection)
+    else:
+        upload_json_to_firestore(args.json_file_path, args.collection)
\ No newline at end of file
@@ -1,41 +1,27 @@
 # db_utils.py
 
 import os
+import sys
 import dotenv
-import numpy as np
-import firebase_admin
-from openai import OpenAI
-from firebase_admin import credentials, firestore
-from google.cloud.firestore_v1.vector import Vector
-from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-
-__all__ = ['get_embedding', 'query_database', 'insert_database']
 
 dotenv.load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+import firebase_admin
+from firebase_admin import credentials, firestore
+from utils import get_embedding
+# modules shared with the other services live in shared/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.bulk_writer import bulk_insert, content_id
+from shared.vector_backend import get_backend
+
+__all__ = ['get_embedding', 'query_database', 'insert_database', 'insert_many', 'find_nearest', 'fingerprint_exists']
 
 cred = credentials.Certificate(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
 if not firebase_admin._apps:
     firebase_admin.initialize_app(cred)
 firestore_client = firestore.client()
 collection = firestore_client.collection("filter_data")
-
-
-def get_embedding(text: str):
-    """
-    Given a text, return the embedding vector
-    :param text: Input text
-    :return: Embedding vector
-    """
-    text = text.replace("\n", " ")
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    embedding = np.array(response.data[0].embedding)
-    return embedding
+vector_backend = get_backend(collection)
 
 
 def query_database(query: str):
@@ -45,19 +31,26 @@ def query_database(query: str):
     :return: List of results
     """
     query_vec = get_embedding(query)
-    vector_query = collection.find_nearest(
-        vector_field="vector",
-        query_vector=Vector(query_vec),
-        distance_measure=DistanceMeasure.EUCLIDEAN,
-        limit=5,
-    )
-    docs = vector_query.stream()
-    answers = []
-    for doc in docs:
-        temp = doc.to_dict()
-        temp = {key: value for key, value in temp.items() if key != "vector"}
-        answers.append(temp)
-    return answers
+    return [doc for doc, _ in vector_backend.query(query_vec, limit=5)]
+
+
+def find_nearest(vector, limit=5):
+    """
+    Given an embedding vector, return the closest documents with their distance
+    :param vector: Embedding vector
+    :param limit: Number of documents to return
+    :return: List of (document without vector, euclidean distance)
+    """
+    return vector_backend.query(vector, limit=limit)
+
+
+def fingerprint_exists(fingerprint: str) -> bool:
+    """
+    Check if a document with the given fingerprint is stored
+    :param fingerprint: Fingerprint computed by `dedup.fingerprint`
+    :return: True if it exists
+    """
+    return len(collection.where("fingerprint", "==", fingerprint).limit(1).get()) > 0
 
 
 def insert_database(data):
@@ -66,7 +59,27 @@ def insert_database(data):
     :param data: Data to be inserted
     """
     # print(f"inserting data: {data}")
-    collection.add(data)
+    collection.document(content_id(data)).set(data)
+
+
+def insert_many(documents):
+    """
+    Insert documents with parallel batched writes.
+    Document IDs are content hashes, so inserting the same document again is a no-op.
+    :param documents: Iterable of documents
+    :return: (number of documents written, list of IDs that could not be written)
+    """
+    documents = list(documents)
+    written, failed = bulk_insert(firestore_client, collection, documents)
+    failed = set(failed)
+    ids = [content_id(doc) for doc in documents]
+    new = [(i, doc) for i, doc in zip(ids, documents) if i not in failed and doc.get("vector") is not None]
+    vector_backend.upsert_many(
+        [i for i, _ in new],
+        [{k: v for k, v in doc.items() if k != "vector"} for _, doc in new],
+        [list(doc["vector"]) for _, doc in new],
+    )
+    return written, list(failed)
 
 
 if __name__ == '__main__':
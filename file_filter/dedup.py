@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+from datetime import datetime
+import numpy as np
+
+__all__ = ['fingerprint', 'Deduplicator']
+
+# Euclidean distance between (unit length) embeddings
+# <= DUPLICATE_DISTANCE: duplicate, >= NEW_DISTANCE: new item, in between: ask the LLM
+DUPLICATE_DISTANCE = float(os.getenv("DEDUP_DUPLICATE_DISTANCE", "0.35"))
+NEW_DISTANCE = float(os.getenv("DEDUP_NEW_DISTANCE", "0.75"))
+
+# fields that are not part of the item itself
+IGNORED_FIELDS = {"vector", "fingerprint"}
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%m/%d/%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%Y-%m-%dT%H:%M:%S"]
+
+
+def __normalize_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+def __normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, dict):
+        return {str(k).lower(): __normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [__normalize(v) for v in value]
+    return value
+
+
+def fingerprint(item: dict) -> str:
+    """
+    Canonical fingerprint of an item: keys and string values are lowercased,
+    whitespace is collapsed and the date is converted to YYYY-MM-DD when it can be parsed
+    :param item: Extracted item
+    :return: Hex digest
+    """
+    canonical = {str(k).lower(): __normalize(v) for k, v in item.items() if k not in IGNORED_FIELDS}
+    if isinstance(canonical.get("date"), str):
+        canonical["date"] = __normalize_date(canonical["date"])
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class Deduplicator:
+    """
+    Decides whether an extracted item is already in the database:
+    1. same fingerprint as an item inserted before (or earlier in this run) -> duplicate
+    2. nearest embedding closer than `duplicate_distance` -> duplicate
+    3. nearest embedding further than `new_distance` -> new
+    4. otherwise the LLM decides
+    Items accepted during the run are remembered, so duplicates inside one batch
+    are caught before they reach the database.
+    """
+    def __init__(self, find_nearest, fingerprint_exists, llm_check,
+                 duplicate_distance=DUPLICATE_DISTANCE, new_distance=NEW_DISTANCE):
+        """
+        :param find_nearest: fn(vector) -> list of (document, distance) from the database, run in a thread
+        :param fingerprint_exists: fn(fingerprint) -> True if an item with this fingerprint is stored, run in a thread
+        :param llm_check: async fn(document, neighbours) -> True if the LLM considers it a duplicate
+        """
+        self.find_nearest = find_nearest
+        self.fingerprint_exists = fingerprint_exists
+        self.llm_check = llm_check
+        self.duplicate_distance = duplicate_distance
+        self.new_distance = new_distance
+        self._fingerprints = set()
+        self._vectors = []
+        self._items = []
+        self.llm_calls = 0
+
+    def _log(self, decision, item, reason):
+        print(f"\t[dedup] {decision}: {item.get('name')!r} ({item.get('date')}) - {reason}")
+
+    async def is_duplicate(self, item: dict, vector) -> bool:
+        """
+        :param item: Extracted item without its vector
+        :param vector: Embedding of the item
+        :return: True if the item should not be inserted
+        """
+        fp = fingerprint(item)
+        if fp in self._fingerprints:
+            self._log("duplicate", item, "same fingerprint earlier in this run")
+            return True
+        if await asyncio.to_thread(self.fingerprint_exists, fp):
+            self._log("duplicate", item, "same fingerprint in the database")
+            return True
+
+        vector = np.asarray(vector, dtype=np.float32)
+        neighbours = await asyncio.to_thread(self.find_nearest, vector)
+        distance = min((d for _, d in neighbours), default=float("inf"))
+        if self._vectors:
+            distances = np.linalg.norm(np.stack(self._vectors) - vector, axis=1)
+            closest = int(np.argmin(distances))
+            if distances[closest] < distance:
+                # the closest item was accepted earlier in this run, the LLM has to see it too
+                distance = float(distances[closest])
+                neighbours = [(self._items[closest], distance)] + list(neighbours)
+
+        if distance <= self.duplicate_distance:
+            self._log("duplicate", item, f"distance {distance:.3f} <= {self.duplicate_distance}")
+            return True
+        if distance >= self.new_distance:
+            self._log("new", item, f"distance {distance:.3f} >= {self.new_distance}")
+            return False
+
+        self.llm_calls += 1
+        duplicate = await self.llm_check(item, [doc for doc, _ in neighbours])
+        self._log("duplicate" if duplicate else "new", item, f"distance {distance:.3f} is ambiguous, LLM decided")
+        return duplicate
+
+    def add(self, item: dict, vector):
+        """
+        Remember an item that is being inserted
+        :param item: Extracted item without its vector
+        :param vector: Embedding of the item
+        """
+        self._fingerprints.add(fingerprint(item))
+        self._vectors.append(np.asarray(vector, dtype=np.float32))
+        self._items.append(item)
+
+    def checkpoint(self):
+        """:return: State to pass to `rollback` to forget the items added after this call"""
+        return set(self._fingerprints), len(self._vectors)
+
+    def rollback(self, checkpoint):
+        """
+        Forget the items added since `checkpoint`, e.g. those of a file that was not inserted
+        :param checkpoint: Value returned by `checkpoint`
+        """
+        self._fingerprints, count = checkpoint
+        del self._vectors[count:]
+        del self._items[count:]
@@ -1,13 +1,17 @@
 import os
 import re
 import json
+import asyncio
 import dotenv
 from utils import *
-from db_utils import query_database, insert_database
+from rate_limit import get_limiter
+from dedup import Deduplicator, fingerprint
+from db_utils import insert_many, find_nearest, fingerprint_exists
+from google.cloud.firestore_v1.vector import Vector
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-__all__ = ["summarize_file", "update_database_from_raw_files"]
+__all__ = ["summarize_file", "asummarize_file", "update_database_from_raw_files", "aupdate_database_from_raw_files"]
 
 # Load API Key
 dotenv.load_dotenv()
@@ -15,6 +19,7 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Initialize Gemini model
 llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", api_key=GEMINI_API_KEY)
+gemini_limiter = get_limiter("gemini")
 
 
 # Load PDF file and extract content
@@ -38,17 +43,8 @@ def __clean_json_text(text: str) -> str:
     return re.sub(r"```(?:json)?", "", text).strip()
 
 
-def summarize_file(file_path: str):
-    """
-    Load the file and extract a list of important items from its contents. Return ONLY valid JSON.
-    :param file_path: Path to the input file
-    :return: List of important items
-    """
-    documents = load_documents(file_path)
-
-    all_items = []
-    for text in documents:
-        prompt = f"""
+def __page_prompt(file_path: str, text: str) -> str:
+    return f"""
     Extract a list of important items from the following text. Return ONLY valid JSON.
     Each item should at least include `name` and `date`. Other fields are optional.
     Ensure the context is comprehensive by including details such as filename, description, and any relevant attachments.
@@ -59,33 +55,63 @@ def summarize_file(file_path: str):
     {text}
     \"\"\"
     """
-        response = ""
-        # for chunk in llm.astream(prompt):
-        #     response += chunk.content
-        response = llm.invoke(prompt)
-        try:
-            cleaned = __clean_json_text(response.content)
-            parsed = json.loads(cleaned)
-            if isinstance(parsed, dict):
-                parsed = [parsed]
-            for item in parsed:
-                item["vector"] = get_embedding(json.dumps(item)).tolist()
-            filtered = [item for item in parsed if "name" in item and "date" in item]
-            all_items.extend(filtered)
-        except json.JSONDecodeError as e:
-            print(f"❌ Failed to parse JSON for document:\n{response}")
-            continue
+
+
+def __parse_items(response) -> list:
+    try:
+        cleaned = __clean_json_text(response.content)
+        parsed = json.loads(cleaned)
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+        return [item for item in parsed if "name" in item and "date" in item]
+    except json.JSONDecodeError as e:
+        print(f"❌ Failed to parse JSON for document:\n{response}")
+        return []
+
+
+async def asummarize_file(file_path: str):
+    """
+    Load the file and extract a list of important items from its contents.
+    Pages are sent to the LLM concurrently under the Gemini rate limiter;
+    items are returned in page order.
+    :param file_path: Path to the input file
+    :return: List of important items
+    """
+    documents = await asyncio.to_thread(load_documents, file_path)
+
+    responses = await asyncio.gather(*(
+        gemini_limiter.run(lambda text=text: llm.ainvoke(__page_prompt(file_path, text)))
+        for text in documents
+    ))
+    all_items = []
+    for response in responses:
+        all_items.extend(__parse_items(response))
+
+    # embed all items of the file in one batch instead of one request per item
+    vectors = await asyncio.to_thread(get_embeddings, [json.dumps(item) for item in all_items])
+    for item, vector in zip(all_items, vectors):
+        item["vector"] = vector.tolist()
 
     return all_items
 
 
-def check_in_database(document) -> bool:
+def summarize_file(file_path: str):
+    """
+    Load the file and extract a list of important items from its contents. Return ONLY valid JSON.
+    :param file_path: Path to the input file
+    :return: List of important items
+    """
+    return asyncio.run(asummarize_file(file_path))
+
+
+async def llm_check_duplicate(document, db_response) -> bool:
     """
-    Check if the document is already in the database
+    Ask the LLM if the document is already in the database, under the Gemini rate limiter.
+    Only used for items whose nearest neighbour is neither clearly the same nor clearly different.
     :param document: Document object
+    :param db_response: Nearest documents returned by the database
     :return: True if the document is in the database, False otherwise
     """
-    db_response = query_database(json.dumps(document))
     prompt = f"""
 Check if the following document is already in the database:
 \"\"\"
@@ -93,39 +119,87 @@ Check if the following document is already in the database:
 \"\"\"
 The Database returned the following results:
 \"\"\"
-{json.dumps(db_response, indent=2)}
+{json.dumps(db_response, indent=2, default=str)}
 \"\"\"
 """
-    response = llm.invoke(prompt)
+    response = await gemini_limiter.run(lambda: llm.ainvoke(prompt))
     return "Yes" in response.content
 
 
-def update_database_from_raw_files():
+async def aupdate_database_from_raw_files(on_progress=None):
     """
     This function scans all the files present in the firebase (currently we mock it using the `raw_files` directory)
     and updates the database with the new entries.
+    All files are summarized concurrently; the results are then checked and inserted file by file,
+    in file name order, so the outcome does not depend on which LLM call finished first.
+    :param on_progress: Optional fn(file, status) called when a file is skipped, queued, done or failed
     :return:
     """
+    def report(file, status):
+        if on_progress:
+            on_progress(file, status)
+
     # load all the files
-    files = os.listdir("raw_files")
-    for file in files:
-        print(f"Processing file: {file}") # for testing
+    files = []
+    for file in sorted(os.listdir("raw_files")):
         # if this file is loaded before, skip it
         if check_loaded(file):
             print(f"\tFile {file} already loaded")
+            report(file, "skipped")
+            continue
+        files.append(file)
+        report(file, "queued")
+
+    # load and format the files
+    results = await asyncio.gather(
+        *(asummarize_file(os.path.join("raw_files", file)) for file in files),
+        return_exceptions=True,
+    )
+
+    deduplicator = Deduplicator(find_nearest, fingerprint_exists, llm_check_duplicate)
+    for file, documents in zip(files, results):
+        print(f"Processing file: {file}") # for testing
+        if isinstance(documents, BaseException):
+            print(f"❌ Failed to summarize file {file}: {documents}")
+            report(file, "failed")
             continue
-        # load and format the file
-        documents = summarize_file(os.path.join("raw_files", file))
         # for each document, check if it is already in the database
         # if not, insert it
-        for d in documents:
-            d = {k: v for k, v in d.items() if k != "vector"}
-            if check_in_database(d):
-                print(f"\tDocument already in the database")
-                continue
-            insert_database(d)
+        new_documents = []
+        checkpoint = deduplicator.checkpoint()
+        try:
+            for d in documents:
+                vector = d["vector"]
+                d = {k: v for k, v in d.items() if k != "vector"}
+                if await deduplicator.is_duplicate(d, vector):
+                    continue
+                deduplicator.add(d, vector)
+                new_documents.append(d | {"fingerprint": fingerprint(d), "vector": Vector(vector)})
+        except Exception as e:
+            # nothing of this file was inserted, it is retried on the next run
+            print(f"❌ Failed to check file {file} for duplicates: {e}")
+            deduplicator.rollback(checkpoint)
+            report(file, "failed")
+            continue
+        written, failed = await asyncio.to_thread(insert_many, new_documents)
+        print(f"\tInserted {written} documents")
+        if failed:
+            # keep the file unmarked so the next run retries it; the items that were written
+            # are found in the database, the others must not make later files look duplicate
+            deduplicator.rollback(checkpoint)
+            report(file, "failed")
+            continue
         # mark the file as loaded
         set_loaded(file)
+        report(file, "done")
+    print(f"Dedup: {deduplicator.llm_calls} ambiguous items sent to the LLM")
+
+
+def update_database_from_raw_files():
+    """
+    Synchronous entry point of `aupdate_database_from_raw_files`
+    """
+    asyncio.run(aupdate_database_from_raw_files())
 
 
 if __name__ == "__main__":
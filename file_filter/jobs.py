@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+
+__all__ = ['JobManager', 'ACTIVE_STATUSES']
+
+# queued -> running -> done | partial | failed | cancelled
+# partial: the job ran to the end but some of its files failed, failed: none of them was processed
+ACTIVE_STATUSES = {"queued", "running"}
+# Seconds between two saves of the state file caused by per-file progress
+PROGRESS_SAVE_INTERVAL = 1.0
+
+
+class JobManager:
+    """
+    Runs ingestion jobs in a pool of asyncio workers.
+    Job state (status, error, per-file progress) is saved to a JSON file after every status change
+    and at most every PROGRESS_SAVE_INTERVAL seconds for per-file progress,
+    jobs that were queued or running when the service stopped are queued again on start.
+    Submitting a meeting that already has a queued or running job returns that job.
+    """
+    def __init__(self, handler, path="json_files/jobs.json", workers=1, keep_finished=200):
+        """
+        :param handler: async fn(job, set_file_status) running one job,
+                        set_file_status(file, status) records the progress of a file
+        :param path: State file
+        :param workers: Number of jobs running at once
+        :param keep_finished: Number of finished jobs kept in the state file
+        """
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._queue = None
+        self._tasks = {}
+        self._workers = []
+        self._save_handle = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.jobs = json.load(f)
+        for job in self.jobs.values():
+            if job["status"] in ACTIVE_STATUSES:
+                job["status"] = "queued"
+
+    def _save(self):
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        finished = sorted(
+            (job for job in self.jobs.values() if job["status"] not in ACTIVE_STATUSES),
+            key=lambda job: job["created_at"],
+        )
+        for job in finished[:-self.keep_finished or None]:
+            del self.jobs[job["id"]]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write to a temporary file first so a crash never leaves a truncated state file
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, self.path)
+
+    def _save_later(self):
+        """Save within PROGRESS_SAVE_INTERVAL seconds, so a burst of progress updates costs one write"""
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(PROGRESS_SAVE_INTERVAL, self._save)
+
+    def _update(self, job, **fields):
+        job.update(fields)
+        job["updated_at"] = time.time()
+        self._save()
+
+    async def start(self):
+        """
+        Start the workers and queue the jobs left over from the previous run
+        """
+        self._queue = asyncio.Queue()
+        for job in sorted(self.jobs.values(), key=lambda job: job["created_at"]):
+            if job["status"] == "queued":
+                self._queue.put_nowait(job["id"])
+        self._save()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Stop the workers, running jobs stay queued in the state file
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save()
+
+    def submit(self, meeting_id: str) -> dict:
+        """
+        Queue an ingestion job for a meeting
+        :param meeting_id: Meeting ID
+        :return: The new job, or the active job of this meeting if there is one
+        """
+        for job in self.jobs.values():
+            if job["meeting_id"] == meeting_id and job["status"] in ACTIVE_STATUSES:
+                return job
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "meeting_id": meeting_id,
+            "status": "queued",
+            "error": None,
+            "files": {},
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "updated_at": now,
+        }
+        self.jobs[job["id"]] = job
+        self._save()
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str):
+        """
+        :param job_id: Job ID
+        :return: The job, or None if it does not exist
+        """
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a queued or running job
+        :param job_id: Job ID
+        :return: The job, or None if it does not exist
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return job
+        self._update(job, status="cancelled", finished_at=time.time())
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            # cancelled while it was waiting in the queue
+            if job is None or job["status"] != "queued":
+                continue
+            self._update(job, status="running", started_at=time.time())
+
+            def set_file_status(file, status, job=job):
+                job["files"][file] = status
+                job["updated_at"] = time.time()
+                self._save_later()
+
+            task = asyncio.create_task(self.handler(job, set_file_status))
+            self._tasks[job_id] = task
+            try:
+                await task
+                failed = [file for file, status in job["files"].items() if status == "failed"]
+                if not failed:
+                    self._update(job, status="done", finished_at=time.time())
+                else:
+                    processed = [file for file, status in job["files"].items() if status in ("done", "failed")]
+                    # the failed files are listed in job["files"]
+                    error = f"{len(failed)} of {len(processed)} files failed"
+                    print(f"❌ Job {job_id}: {error}")
+                    status = "failed" if len(failed) == len(processed) else "partial"
+                    self._update(job, status=status, error=error, finished_at=time.time())
+            except asyncio.CancelledError:
+                if job["status"] != "cancelled":
+                    # the worker itself is stopping, leave the job for the next start
+                    task.cancel()
+                    self._update(job, status="queued")
+                    raise
+                print(f"Job {job_id} cancelled")
+            except Exception as e:
+                print(f"❌ Job {job_id} failed: {e}")
+                self._update(job, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self._tasks.pop(job_id, None)
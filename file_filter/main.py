@@ -1,44 +1,104 @@
 # main.py
 
-import requests
-import json
 import os
+import json
+import asyncio
+import httpx
 import dotenv
-from file_filter_utils import update_database_from_raw_files
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from file_filter_utils import aupdate_database_from_raw_files
+from jobs import JobManager
+from fastapi import FastAPI, Query, HTTPException
 from typing import List
 from pydantic import BaseModel
-from db_utils import query_database
-from test_download_and_extract import download_to_current_directory
+from test_download_and_extract import fetch_files
+
+# threads available to blocking calls (downloads, embeddings, Firestore)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "16"))
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# jobs share the raw_files directory, so by default they run one at a time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+http_client: httpx.AsyncClient = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=WORKER_THREADS))
+    http_client = httpx.AsyncClient(base_url=BACKEND_URL, timeout=30.0)
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await http_client.aclose()
 
-app = FastAPI()
 
+app = FastAPI(lifespan=lifespan)
 
-def get_all_files(meeting_id: str) -> List[str]:
+
+async def get_all_files(meeting_id: str) -> List[str]:
     """
     Get all files for a given meeting ID
     :param meeting_id: Meeting ID
     :return: List of files
     """
     endpoint = f"/api/meetings/{meeting_id}/files"
-    url = "http://localhost:8000" + endpoint
-    response = requests.get(url)
+    response = await http_client.get(endpoint)
     parsed = response.json()
     return parsed.get("files", [])
 
 
-@app.get("/update_database")
+async def ingest_meeting(job: dict, set_file_status):
+    """
+    Job handler: download the files of the meeting and update the database with them
+    :param job: Job state
+    :param set_file_status: fn(file, status) recording the progress of a file
+    """
+    files = await get_all_files(job["meeting_id"])
+    # Download all the files straight into raw_files
+    fetched, failed = await asyncio.to_thread(fetch_files, files)
+    if failed:
+        raise RuntimeError(f"Failed to download {len(failed)} of {len(files)} meeting files")
+    # update the database
+    await aupdate_database_from_raw_files(on_progress=set_file_status)
+
+
+job_manager = JobManager(ingest_meeting, path="json_files/jobs.json", workers=JOB_WORKERS)
+
+
+@app.get("/update_database", status_code=202)
 async def update_database(meeting_id: str = Query(..., description="The meeting ID to fetch files for")):
     """
-    Update the database with the latest documents.
+    Queue an update of the database with the latest documents and return the job right away.
+    A meeting that is already queued or running returns its current job.
     The URL is like: http://localhost:8025/update_database?meeting_id=4dtYGMkGnbnlooUQ8Aod
+    Poll /jobs/{job_id} for the progress.
     """
-    files = get_all_files(meeting_id)
-    # Download all the files
-    download_to_current_directory(files)
-    # update the database
-    update_database_from_raw_files()
-    return {"message": "Database updated successfully", "meeting_id": meeting_id, "files_processed": len(files)}
+    job = job_manager.submit(meeting_id)
+    return {"message": "Database update queued", "meeting_id": meeting_id, "job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status and per-file progress of an ingestion job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running ingestion job
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 if __name__ == '__main__':
@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import asyncio
+
+__all__ = ['AsyncRateLimiter', 'get_limiter']
+
+
+class AsyncRateLimiter:
+    """
+    Limits the calls made to one provider:
+    - at most `max_concurrency` calls in flight
+    - at most `requests_per_minute` calls started per minute (evenly spaced)
+    Failed calls are retried with exponential backoff and full jitter.
+    """
+    def __init__(self, requests_per_minute=0, max_concurrency=8, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._next_slot = 0.0
+        self._loop = None
+        self._semaphore = None
+        self._lock = None
+
+    def _primitives(self):
+        # asyncio primitives belong to one event loop, recreate them when called from a new one
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._lock = asyncio.Lock()
+        return self._semaphore, self._lock
+
+    async def _wait_for_slot(self, lock):
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def run(self, make_call):
+        """
+        Run a call under the limits of this provider
+        :param make_call: Function returning a new awaitable each time it is called
+        :return: Result of the call
+        """
+        semaphore, lock = self._primitives()
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await self._wait_for_slot(lock)
+                try:
+                    return await make_call()
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    print(f"\tCall failed ({e}), retrying ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+
+# (requests per minute, max concurrency) used when the environment does not override them
+DEFAULT_LIMITS = {
+    "gemini": (15, 8),  # gemini-2.0-flash free tier
+}
+
+_limiters = {}
+
+
+def get_limiter(provider: str) -> AsyncRateLimiter:
+    """
+    Get the shared limiter of a provider, configured through environment variables
+    <PROVIDER>_RPM and <PROVIDER>_MAX_CONCURRENCY (e.g. GEMINI_RPM=15), 0 RPM means unlimited
+    :param provider: Provider name
+    :return: Rate limiter
+    """
+    if provider not in _limiters:
+        prefix = provider.upper()
+        rpm, concurrency = DEFAULT_LIMITS.get(provider, (0, 8))
+        _limiters[provider] = AsyncRateLimiter(
+            requests_per_minute=float(os.getenv(f"{prefix}_RPM", rpm)),
+            max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+        )
+    return _limiters[provider]
@@ -4,12 +4,21 @@ import json
 import time
 import zipfile
 import shutil
+import hashlib
+import threading
 from typing import List
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 API_URL = "http://localhost:8000/api/files/download"
 TEMP_DIR = "temp_downloads"  # Temporary download directory that will be deleted
 FINAL_DIR = "./raw_files"  # Current directory where files will be placed
+MANIFEST_PATH = "json_files/download_manifest.json"  # ETag/generation of every fetched URL
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+CHUNK_SIZE = 1 << 16
 
 
 file_urls = [
@@ -20,7 +29,8 @@ file_urls = [
 def download_to_current_directory(file_urls: List[str]):
     """
     Download multiple files, extract them directly to the current directory,
-    and delete all temporary files and folders
+    and delete all temporary files and folders.
+    Goes through the backend ZIP endpoint, services should use `fetch_files` instead.
     """
     print("\n" + "="*70)
     print("DOWNLOADING FILES TO CURRENT DIRECTORY".center(70))
@@ -163,6 +173,149 @@ def download_to_current_directory(file_urls: List[str]):
             
         return False
 
+def _make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _load_manifest() -> dict:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _target_name(url: str, manifest: dict) -> str:
+    """
+    File name of a URL inside FINAL_DIR: the object name, prefixed with a short hash
+    of the URL when another URL already uses that name
+    """
+    if url in manifest:
+        return manifest[url]["file"]
+    name = os.path.basename(unquote(urlparse(url).path)) or hashlib.sha256(url.encode()).hexdigest()[:16]
+    taken = {entry["file"] for other, entry in manifest.items() if other != url}
+    if name in taken:
+        name = f"{hashlib.sha256(url.encode()).hexdigest()[:8]}_{name}"
+    return name
+
+
+def _complete_size(response):
+    """Object size from the `Content-Range: bytes */<size>` header of a 416 response, None if missing"""
+    content_range = response.headers.get("Content-Range", "")
+    if content_range.startswith("bytes */"):
+        try:
+            return int(content_range[len("bytes */"):])
+        except ValueError:
+            return None
+    return None
+
+
+def _fetch_one(session, url, entry, on_started):
+    """
+    Download one URL into FINAL_DIR
+    - skipped (304) when the file is present and its ETag did not change
+    - resumed with a Range request when a `.part` file of the same version is left over
+    - a `.part` file that is already complete (416) is finalized, or dropped and downloaded again
+      if the object changed since
+    :return: ("unchanged" | "downloaded", updated manifest entry)
+    """
+    target = os.path.join(FINAL_DIR, entry["file"])
+    part = target + ".part"
+    headers = {}
+    if os.path.exists(target) and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if offset and entry.get("part_etag"):
+        headers["Range"] = f"bytes={offset}-"
+        # the server ignores the range and sends the whole object if it changed since
+        headers["If-Range"] = entry["part_etag"]
+
+    with session.get(url, headers=headers, stream=True, timeout=(10, 60)) as response:
+        if response.status_code == 304:
+            return "unchanged", entry
+        if response.status_code == 416 and "Range" in headers:
+            etag = response.headers.get("ETag") or entry["part_etag"]
+            if _complete_size(response) == offset and etag == entry["part_etag"]:
+                os.replace(part, target)
+            else:
+                os.remove(part)
+                return _fetch_one(session, url, dict(entry, part_etag=None), on_started)
+        else:
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            entry = dict(entry, part_etag=etag)
+            on_started(entry)
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(part, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(part, target)
+
+    entry.pop("part_etag", None)
+    entry.update(
+        etag=etag,
+        generation=response.headers.get("x-goog-generation") or entry.get("generation"),
+        size=os.path.getsize(target),
+    )
+    return "downloaded", entry
+
+
+def fetch_files(file_urls: List[str], max_workers: int = DOWNLOAD_WORKERS):
+    """
+    Download the files straight into FINAL_DIR, several at a time over a pooled session.
+    Files whose ETag did not change since the last fetch are not downloaded again,
+    interrupted downloads are resumed from the `.part` file.
+    :param file_urls: Public URLs of the files
+    :param max_workers: Number of concurrent downloads
+    :return: (file names present in FINAL_DIR for these URLs, URLs that failed)
+    """
+    os.makedirs(FINAL_DIR, exist_ok=True)
+    manifest = _load_manifest()
+    lock = threading.Lock()
+    entries = {}
+    for url in dict.fromkeys(file_urls):
+        entries[url] = dict(manifest.get(url, {}), file=_target_name(url, manifest))
+        manifest[url] = entries[url]
+
+    def record(url, entry):
+        with lock:
+            manifest[url] = entry
+            _save_manifest(manifest)
+
+    def task(url):
+        return _fetch_one(session, url, entries[url], lambda entry: record(url, entry))
+
+    start_time = time.time()
+    fetched, failed = [], []
+    session = _make_session(max_workers)
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {url: pool.submit(task, url) for url in entries}
+        for url, future in futures.items():
+            try:
+                status, entry = future.result()
+                record(url, entry)
+                fetched.append(entry["file"])
+                print(f"  ✓ {status}: {entry['file']}")
+            except Exception as e:
+                failed.append(url)
+                print(f"  ❌ Failed to download {url}: {e}")
+
+    print(f"✅ Fetched {len(fetched)}/{len(entries)} files in {time.time() - start_time:.2f} seconds")
+    return fetched, failed
+
+
 if __name__ == "__main__":
     success = download_to_current_directory()
     
@@ -0,0 +1,209 @@
+"""
+Tests for the ingestion job manager, run with: python -m pytest test_jobs.py
+"""
+import json
+import asyncio
+import jobs
+from jobs import JobManager
+
+
+async def wait_for(condition, timeout=2.0):
+    """Let the workers run until condition() is true"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def make_handler(file_statuses, started=None, release=None):
+    """Handler that reports the given per-file statuses, optionally waiting for `release` first"""
+    async def handler(job, set_file_status):
+        if started is not None:
+            started.set()
+        if release is not None:
+            await release.wait()
+        for file, status in file_statuses.items():
+            set_file_status(file, status)
+    return handler
+
+
+def test_job_runs_and_state_is_saved(tmp_path):
+    path = tmp_path / "jobs.json"
+
+    async def main():
+        manager = JobManager(make_handler({"a.pdf": "done", "b.pdf": "done"}), path=str(path))
+        await manager.start()
+        job = manager.submit("meeting-1")
+        await wait_for(lambda: job["status"] == "done")
+        await manager.stop()
+        return job
+
+    job = asyncio.run(main())
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved[job["id"]]["status"] == "done"
+    assert saved[job["id"]]["files"] == {"a.pdf": "done", "b.pdf": "done"}
+    assert saved[job["id"]]["finished_at"] is not None
+
+
+def test_failed_files_make_job_partial_or_failed(tmp_path):
+    async def main():
+        partial = JobManager(make_handler({"a.pdf": "done", "b.pdf": "failed"}), path=str(tmp_path / "p.json"))
+        failed = JobManager(make_handler({"a.pdf": "failed", "b.pdf": "skipped"}), path=str(tmp_path / "f.json"))
+        await partial.start()
+        await failed.start()
+        partial_job = partial.submit("meeting-1")
+        failed_job = failed.submit("meeting-1")
+        await wait_for(lambda: partial_job["status"] not in jobs.ACTIVE_STATUSES
+                       and failed_job["status"] not in jobs.ACTIVE_STATUSES)
+        await partial.stop()
+        await failed.stop()
+        return partial_job, failed_job
+
+    partial_job, failed_job = asyncio.run(main())
+    assert partial_job["status"] == "partial"
+    assert partial_job["error"] == "1 of 2 files failed"
+    assert failed_job["status"] == "failed"
+    assert failed_job["error"] == "1 of 1 files failed"
+
+
+def test_handler_exception_fails_job(tmp_path):
+    async def handler(job, set_file_status):
+        raise RuntimeError("boom")
+
+    async def main():
+        manager = JobManager(handler, path=str(tmp_path / "jobs.json"))
+        await manager.start()
+        job = manager.submit("meeting-1")
+        await wait_for(lambda: job["status"] == "failed")
+        await manager.stop()
+        return job
+
+    assert asyncio.run(main())["error"] == "boom"
+
+
+def test_submit_coalesces_active_jobs_of_a_meeting(tmp_path):
+    async def main():
+        release = asyncio.Event()
+        manager = JobManager(make_handler({}, release=release), path=str(tmp_path / "jobs.json"))
+        await manager.start()
+        first = manager.submit("meeting-1")
+        second = manager.submit("meeting-1")
+        other = manager.submit("meeting-2")
+        release.set()
+        await wait_for(lambda: first["status"] == "done" and other["status"] == "done")
+        # a finished job is not reused
+        third = manager.submit("meeting-1")
+        await wait_for(lambda: third["status"] == "done")
+        await manager.stop()
+        return first, second, other, third
+
+    first, second, other, third = asyncio.run(main())
+    assert second is first
+    assert other["id"] != first["id"]
+    assert third["id"] != first["id"]
+
+
+def test_cancel_running_and_queued_jobs(tmp_path):
+    async def main():
+        started, release = asyncio.Event(), asyncio.Event()
+        manager = JobManager(make_handler({"a.pdf": "done"}, started, release), path=str(tmp_path / "jobs.json"))
+        await manager.start()
+        running = manager.submit("meeting-1")
+        queued = manager.submit("meeting-2")
+        await started.wait()
+        assert manager.cancel(running["id"])["status"] == "cancelled"
+        assert manager.cancel(queued["id"])["status"] == "cancelled"
+        await wait_for(lambda: not manager._tasks)
+        release.set()
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        return manager, running, queued
+
+    manager, running, queued = asyncio.run(main())
+    assert running["status"] == "cancelled"
+    assert running["files"] == {}
+    # the queued job was dropped by the worker without running
+    assert queued["status"] == "cancelled" and queued["started_at"] is None
+    assert manager.cancel("missing") is None
+
+
+def test_active_jobs_resume_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.json")
+
+    async def first_run():
+        started = asyncio.Event()
+        manager = JobManager(make_handler({}, started, asyncio.Event()), path=path)
+        await manager.start()
+        running = manager.submit("meeting-1")
+        queued = manager.submit("meeting-2")
+        await started.wait()
+        # the service stops while one job runs and another waits
+        await manager.stop()
+        return running["id"], queued["id"]
+
+    running_id, queued_id = asyncio.run(first_run())
+    saved = json.loads(open(path, encoding="utf-8").read())
+    assert saved[running_id]["status"] == "queued"
+    assert saved[queued_id]["status"] == "queued"
+
+    async def second_run():
+        ran = []
+
+        async def handler(job, set_file_status):
+            ran.append(job["meeting_id"])
+            set_file_status("a.pdf", "done")
+
+        manager = JobManager(handler, path=path)
+        await manager.start()
+        await wait_for(lambda: all(job["status"] == "done" for job in manager.jobs.values()))
+        await manager.stop()
+        return ran
+
+    # resumed in the order they were created
+    assert asyncio.run(second_run()) == ["meeting-1", "meeting-2"]
+
+
+def test_progress_saves_are_throttled(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_SAVE_INTERVAL", 0.05)
+    path = tmp_path / "jobs.json"
+
+    async def main():
+        progress, release = asyncio.Event(), asyncio.Event()
+
+        async def handler(job, set_file_status):
+            for i in range(100):
+                set_file_status(f"{i}.pdf", "done")
+            progress.set()
+            await release.wait()
+
+        manager = JobManager(handler, path=str(path))
+        saves = []
+        save = manager._save
+        manager._save = lambda: (saves.append(1), save())[1]
+        await manager.start()
+        job = manager.submit("meeting-1")
+        await progress.wait()
+        before = len(saves)
+        await asyncio.sleep(0.1)
+        # the 100 updates were written by a single delayed save
+        assert len(saves) == before + 1
+        assert len(json.loads(path.read_text(encoding="utf-8"))[job["id"]]["files"]) == 100
+        release.set()
+        await wait_for(lambda: job["status"] == "done")
+        await manager.stop()
+
+    asyncio.run(main())
+
+
+def test_finished_jobs_are_pruned(tmp_path):
+    async def main():
+        manager = JobManager(make_handler({}), path=str(tmp_path / "jobs.json"), keep_finished=2)
+        await manager.start()
+        for i in range(4):
+            job = manager.submit(f"meeting-{i}")
+            await wait_for(lambda: job["status"] == "done")
+        await manager.stop()
+        return manager
+
+    manager = asyncio.run(main())
+    assert sorted(job["meeting_id"] for job in manager.jobs.values()) == ["meeting-2", "meeting-3"]
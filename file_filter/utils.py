@@ -1,14 +1,30 @@
 import os
+import sys
 import json
 import hashlib
 from openai import OpenAI
 import numpy as np
+# modules shared with the other services live in shared/ at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.embedding_cache import EmbeddingCache, normalize_text
 
-__all__ = ['get_embedding', 'check_loaded', 'set_loaded']
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+__all__ = ['get_embedding', 'get_embeddings', 'check_loaded', 'set_loaded', 'embedding_cache']
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+# limits of a single request to the embeddings endpoint
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 300_000
 
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "json_files/embedding_cache.sqlite3"))
 
 
 def get_file_md5(file_path):
@@ -36,13 +52,62 @@ def get_embedding(text: str):
     :param text: Input text
     :return: Embedding vector
     """
-    text = text.replace("\n", " ")
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"  # 请根据实际可用的模型名称进行替换
-    )
-    embedding = np.array(response.data[0].embedding)
-    return embedding
+    return get_embeddings([text])[0].astype(np.float64)
+
+
+def _count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # conservative estimate when tiktoken is not available
+    return len(text) // 3 + 1
+
+
+def _batches(texts):
+    """
+    Split texts into request-sized batches, respecting both the input count and the token budget
+    """
+    batch, tokens = [], 0
+    for text in texts:
+        n = _count_tokens(text)
+        if batch and (len(batch) >= MAX_BATCH_SIZE or tokens + n > MAX_BATCH_TOKENS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += n
+    if batch:
+        yield batch
+
+
+def get_embeddings(texts):
+    """
+    Given a list of texts, return their embedding vectors.
+    Texts that were embedded before are served from `embedding_cache`, the rest
+    are deduplicated and sent to the API in as few requests as possible.
+    :param texts: List of input texts
+    :return: float32 array of shape (len(texts), EMBEDDING_DIM)
+    """
+    texts = [normalize_text(text) for text in texts]
+    vectors = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+
+    missing = {}
+    for i, (text, vector) in enumerate(zip(texts, vectors)):
+        if vector is None:
+            missing.setdefault(text, []).append(i)
+
+    for batch in _batches(list(missing)):
+        response = openai_client.embeddings.create(
+            input=batch,
+            model=EMBEDDING_MODEL  # 请根据实际可用的模型名称进行替换
+        )
+        computed = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        embedding_cache.put_many(EMBEDDING_MODEL, batch, computed)
+        for text, vector in zip(batch, computed):
+            for i in missing[text]:
+                vectors[i] = vector
+
+    if not vectors:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.asarray(vectors, dtype=np.float32)
 
 """
 Note for the check_loaded and set_loaded functions:
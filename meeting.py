@@ -1,17 +1,28 @@
 import undetected_chromedriver as uc
-from time import sleep
 from selenium.webdriver.common.by import By
-import speech_recognition as sr
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import pyttsx3
 import random
 import asyncio
 from agent.ok import getAnswer
-
-async def run_meeting(meetingInfo):
-    """Run the meeting process asynchronously."""
-    meetLink = meetingInfo["meetingLink"]
-    teamName = meetingInfo["teamName"]
-
+from speech_pipeline import SpeechPipeline, get_backend, find_microphone
+
+# Seconds to wait for the pre-join screen (camera button, name input, join button)
+PREJOIN_TIMEOUT = 30
+# Seconds to wait for the host to admit the agent after "Ask to join"
+ADMISSION_TIMEOUT = 300
+JOIN_BUTTON_XPATH = "//span[contains(text(), 'Ask to join') or contains(text(), 'Join now')]"
+LEAVE_BUTTON_XPATH = "//button[@aria-label='Leave call']"
+# Seconds of silence before the agent greets the team, and the longest wait for them
+GREETING_SILENCE = 3
+GREETING_MAX_WAIT = 15
+# Seconds to wait for the question after "How may I help you?"
+CONTEXT_TIMEOUT = 10
+
+def launch_browser():
+    """Start an undetected Chrome with microphone and camera allowed, ready to open a meeting link."""
     options = uc.ChromeOptions()
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
@@ -22,37 +33,51 @@ async def run_meeting(meetingInfo):
         "profile.default_content_setting_values.geolocation": 1,
     }
     options.add_experimental_option("prefs", prefs)
-    driver = uc.Chrome(options=options)
+    return uc.Chrome(options=options)
+
+async def run_meeting(meetingInfo, driver=None):
+    """
+    Run the meeting process asynchronously.
+    `driver` is a browser already started with launch_browser(), one is started if it is None.
+    The browser is closed when the meeting ends.
+    """
+    meetLink = meetingInfo["meetingLink"]
+    teamName = meetingInfo["teamName"]
+
+    if driver is None:
+        driver = launch_browser()
 
     driver.get(meetLink)
-    await asyncio.sleep(3)
 
     def toggle_button(xpath, description):
         """Toggle a button (mic or video) based on its XPath."""
-        while True:
-            try:
-                button = driver.find_element(By.XPATH, xpath)
-                if button.get_attribute("data-is-muted") != "true":
-                    button.click()
-                    print(f"{description} turned off.")
-                else:
-                    print(f"{description} is already off.")
-                break
-            except Exception as e:
-                print(f"{description} button not found. Retrying...")
-                sleep(2)
+        try:
+            button = WebDriverWait(driver, PREJOIN_TIMEOUT).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        except TimeoutException:
+            print(f"{description} button not found.")
+            return
+        if button.get_attribute("data-is-muted") != "true":
+            button.click()
+            print(f"{description} turned off.")
+        else:
+            print(f"{description} is already off.")
 
     # Turn off microphone and camera
     # toggle_button("//div[@aria-label='Turn off microphone']", "Microphone")
     toggle_button("//div[@aria-label='Turn off camera']", "Camera")
 
-    recognizer = sr.Recognizer()
+    # Created before joining, so a local transcription model loads while the meeting page does
+    pipeline = SpeechPipeline(get_backend(), device_index=find_microphone())
     tts_engine = pyttsx3.init()
-    
+
     def speak(text):
-        """Speak the text using pyttsx3."""
-        tts_engine.say(text)
-        tts_engine.runAndWait()
+        """Speak the text using pyttsx3, the agent's own voice is not transcribed."""
+        pipeline.pause()
+        try:
+            tts_engine.say(text)
+            tts_engine.runAndWait()
+        finally:
+            pipeline.resume()
 
     def speak_while_fetching():
         """Speak thinking phrases continuously to cover lag time."""
@@ -64,133 +89,91 @@ async def run_meeting(meetingInfo):
     #     """Simulate AI response generation."""
     #     return f"Thank you for the question: {question}"
 
-    # Enter the name "Agent"
-    while True:
-        try:
-            enterName = driver.find_element(By.XPATH, "//input[@aria-label='Your name']")
-            enterName.clear()
-            enterName.send_keys("Agent")
-            break
-        except Exception as e:
-            print('Your name input not found. Retrying...')
-            await asyncio.sleep(2)
+    # Enter the name "Agent" (the input is only shown when the browser is not signed in)
+    try:
+        enterName = WebDriverWait(driver, PREJOIN_TIMEOUT).until(
+            EC.element_to_be_clickable((By.XPATH, "//input[@aria-label='Your name']"))
+        )
+        enterName.clear()
+        enterName.send_keys("Agent")
+    except TimeoutException:
+        print('Your name input not found. Joining without a name...')
 
     # Click "Ask to join" or "Join now" button
-    while True:
-        try:
-            try:
-                askToJoinButton = driver.find_element(By.XPATH, "//span[contains(text(), 'Ask to join')]")
-            except:
-                askToJoinButton = driver.find_element(By.XPATH, "//span[contains(text(), 'Join now')]")
-            askToJoinButton.click()
-            print("Meeting Joined")
-            break
-        except Exception as e:
-            print("'Ask to join' button not found. Retrying...")
-            await asyncio.sleep(2)
-
-    # Wait for a moment to ensure the meeting interface is fully loaded
-    await asyncio.sleep(5)
-
-    # Ensure no one is talking before greeting
-    recognizer = sr.Recognizer()
-    mic_device_index = None
-    for index, name in enumerate(sr.Microphone.list_microphone_names()):
-        if "VB-Audio" in name:
-            mic_device_index = index
-            break
-
-    if mic_device_index is not None:
-        with sr.Microphone(device_index=mic_device_index) as source:
-            try:
-                recognizer.adjust_for_ambient_noise(source, duration=1)
-                print("Checking if the room is silent...")
-                audio = recognizer.listen(source, timeout=3, phrase_time_limit=3)
-                # If audio is detected, assume someone is talking
-                detected_text = recognizer.recognize_google(audio)
-                print(f"Detected speech: {detected_text}. Delaying greeting...")
-                await asyncio.sleep(5)  # Wait and retry
-            except sr.WaitTimeoutError:
-                # No speech detected, safe to greet
-                print("Room is silent. Greeting the team.")
-                speak(f"Hi {teamName} Team!")
-            except sr.UnknownValueError:
-                print("Could not understand audio, assuming silence.")
-                speak(f"Hi {teamName} Team!")
-            except sr.RequestError as e:
-                print(f"Error checking room silence: {e}. Skipping greeting.")
-
-    # ------------------ Voice Trigger Agent Code ------------------ #
-
-    mic_device_index = None
-    for index, name in enumerate(sr.Microphone.list_microphone_names()):
-        if "VB-Audio" in name:
-            mic_device_index = index
-            print(f"Using VB-Audio device for input: {name} (Index {index})")
-            break
-
-    if mic_device_index is None:
-        print("VB-Audio device not found. Using default microphone.")
-
-    print("Agent is listening for the trigger phrase 'Hey Agent' or meeting end phrase 'Thank you for attending'...")
+    askToJoinButton = WebDriverWait(driver, PREJOIN_TIMEOUT).until(
+        EC.element_to_be_clickable((By.XPATH, JOIN_BUTTON_XPATH))
+    )
+    askToJoinButton.click()
 
+    # The call controls show up once the agent is in the call
     try:
+        WebDriverWait(driver, ADMISSION_TIMEOUT).until(EC.presence_of_element_located((By.XPATH, LEAVE_BUTTON_XPATH)))
+        print("Meeting Joined")
+    except TimeoutException:
+        print("Not admitted to the meeting yet. Listening anyway...")
+
+    # Greet once nobody has been talking for GREETING_SILENCE seconds
+    try:
+        pipeline.start()
+        print("Checking if the room is silent...")
+        waited = 0
+        while pipeline.quiet_for() < GREETING_SILENCE and waited < GREETING_MAX_WAIT:
+            await asyncio.sleep(0.5)
+            waited += 0.5
+        if pipeline.quiet_for() >= GREETING_SILENCE:
+            print("Room is silent. Greeting the team.")
+            speak(f"Hi {teamName} Team!")
+        else:
+            print("The team is talking. Skipping greeting.")
+
+        # ------------------ Voice Trigger Agent Code ------------------ #
+
+        print("Agent is listening for the trigger phrase 'Hey Agent' or meeting end phrase 'Thank you for attending'...")
+
         while True:
-            with sr.Microphone(device_index=mic_device_index) as source:
+            # the pipeline keeps capturing and transcribing while an answer is being fetched or spoken
+            utterance = await asyncio.to_thread(pipeline.next_utterance, 5)
+            if utterance is None:
+                continue
+            text = utterance.text.lower()
+            print("Recognized:", text)
+
+            # Trigger only when "hey agent" or "a agent" is explicitly mentioned
+            if utterance.wake:
+                question = utterance.command
+                if not question:
+                    speak("How may I help you?")
+                    print("Listening for context...")
+                    context = await asyncio.to_thread(pipeline.next_utterance, CONTEXT_TIMEOUT)
+                    if context is None:
+                        print("No question asked!")
+                        continue
+                    question = context.text
+                print("Context recognized:", question)
+
+                speak_while_fetching()
+
+                try:
+                    answer = getAnswer(question)
+                    print("Answer received:", answer)
+                    speak(answer)
+                except Exception as e:
+                    print(f"Error processing the request: {e}")
+                    speak("I couldn't process your request due to an error.")
+
+            elif "thank you for attending" in text or "thanks for attending" in text:
+                print("End phrase detected. Ending the meeting...")
                 try:
-                    recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    audio = recognizer.listen(source, timeout=5)
-                    text = recognizer.recognize_google(audio).lower()
-                    print("Recognized:", text)
-                    
-                    # Trigger only when "hey agent" or "a agent" is explicitly mentioned
-                    if "hey agent" in text or "a agent" in text:
-                        speak("How may I help you?")
-                        print("Listening for context...")
-                        try:
-                            context_audio = recognizer.listen(source, timeout=3, phrase_time_limit=3)
-                            context_text = recognizer.recognize_google(context_audio)
-                            print("Context recognized:", context_text)
-
-                            speak_while_fetching()
-
-                            try:
-                                answer = getAnswer(context_text)
-                                print("Answer received:", answer)
-                                speak(answer)
-                                continue
-                            except Exception as e:
-                                print(f"Error processing the request: {e}")
-                                speak("I couldn't process your request due to an error.")
-                        except sr.WaitTimeoutError:
-                            print("No question asked!")
-                        except sr.UnknownValueError:
-                            print("Could not understand additional context.")
-                        except sr.RequestError as e:
-                            print(f"Could not request results for context; {e}")
-                    
-                    elif "thank you for attending" in text or "thanks for attending" in text:
-                        print("End phrase detected. Ending the meeting...")
-                        while True:
-                            try:
-                                # Updated XPath to use aria-label for the "Leave call" button
-                                leave_button = driver.find_element(By.XPATH, "//button[@aria-label='Leave call']")
-                                leave_button.click()
-                                print("Meeting ended successfully.")
-                                break  # Exit the loop after successfully clicking the button
-                            except Exception as e:
-                                print(f"Error while trying to leave the meeting: {e}")
-                                await asyncio.sleep(2)
-                        return
-
-                except sr.WaitTimeoutError:
-                    print("Listening timed out. Trying again...")
-                    continue
-                except sr.UnknownValueError:
-                    print("Could not understand audio.")
-                except sr.RequestError as e:
-                    print(f"Could not request results;")
+                    leave_button = WebDriverWait(driver, PREJOIN_TIMEOUT).until(
+                        EC.element_to_be_clickable((By.XPATH, LEAVE_BUTTON_XPATH))
+                    )
+                    leave_button.click()
+                    print("Meeting ended successfully.")
+                except TimeoutException:
+                    print("Error while trying to leave the meeting: 'Leave call' button not found")
+                return
     except KeyboardInterrupt:
         print("Meeting ended.")
     finally:
-        driver.quit()
\ No newline at end of file
+        pipeline.stop()
+        driver.quit()
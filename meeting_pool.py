@@ -0,0 +1,278 @@
+import time
+import queue
+import asyncio
+import itertools
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+import psutil
+
+__all__ = ['MeetingPool']
+
+# Seconds between two heartbeats of a worker
+HEARTBEAT_INTERVAL = 5
+# Seconds before a worker is started again after its browser failed to launch or a worker crashed,
+# doubled for every further failure in a row up to MAX_LAUNCH_RETRY_DELAY
+LAUNCH_RETRY_DELAY = 30
+MAX_LAUNCH_RETRY_DELAY = 600
+
+
+def _worker_main(slot_id, inbox, events, warm):
+    """
+    Entry point of a worker process: optionally starts a browser, waits for one meeting on `inbox`,
+    runs it and reports to the pool through `events`. A worker serves a single meeting, the
+    browser is closed with it and the pool starts a fresh worker in its place.
+    """
+    def heartbeat():
+        # a separate thread, so a worker stuck in a blocking Selenium or microphone call still reports;
+        # the child processes are sent along so the pool can kill them even if this process crashes
+        me = psutil.Process()
+        while True:
+            children = [(child.pid, child.create_time()) for child in me.children(recursive=True)]
+            events.put(("heartbeat", slot_id, (time.time(), children)))
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        # imported here, Selenium and the audio stack are only loaded in the workers
+        from meeting import run_meeting, launch_browser
+        driver = launch_browser() if warm else None
+        events.put(("ready", slot_id, None))
+        meeting_info = inbox.get()
+        asyncio.run(run_meeting(meeting_info, driver))
+        events.put(("done", slot_id, None))
+    except BaseException:
+        events.put(("failed", slot_id, traceback.format_exc()))
+
+
+class MeetingPool:
+    """
+    Runs every meeting in its own process, at most `max_workers` at once; extra meetings wait in FIFO order.
+
+    - `max_workers` worker processes are kept started ahead of time; with `warm` each of them
+      has its browser already launched, so a meeting only has to open its link
+    - A worker serves one meeting and exits, a new worker (and browser) is started in its place
+    - Workers send a heartbeat every HEARTBEAT_INTERVAL seconds. A worker that stops sending them
+      for `heartbeat_timeout` seconds, a meeting running longer than `max_duration`, or an idle worker
+      older than `max_idle` is killed with its browser and driver processes
+    - A worker that exits without reporting is logged as crashed; after a crash or a browser that
+      failed to launch, new workers are started with an exponential backoff
+    - Stopped workers are joined and killed in a thread, the event loop is never blocked by them
+    """
+    def __init__(self, max_workers=2, heartbeat_timeout=60, max_duration=3 * 3600, warm=True, max_idle=3600):
+        """
+        :param max_workers: Number of meetings running at once
+        :param heartbeat_timeout: Seconds without a heartbeat before a worker is considered hung
+        :param max_duration: Seconds after which a meeting is stopped
+        :param warm: Launch the browser of a worker before it gets a meeting
+        :param max_idle: Seconds after which an idle worker is replaced by a fresh one
+        """
+        self.max_workers = max_workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_duration = max_duration
+        self.warm = warm
+        self.max_idle = max_idle
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._pending = deque()
+        self._slot_ids = itertools.count(1)
+        self._next_launch = 0
+        self._failures = 0
+        self._stopping = set()
+        self.slots = {}
+
+    def _fill(self):
+        """Start workers until there are `max_workers` of them"""
+        if time.time() < self._next_launch:
+            return
+        while len(self.slots) < self.max_workers:
+            slot_id = next(self._slot_ids)
+            inbox = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(slot_id, inbox, self._events, self.warm),
+                name=f"meeting-worker-{slot_id}",
+            )
+            process.start()
+            now = time.time()
+            self.slots[slot_id] = {
+                "process": process,
+                "inbox": inbox,
+                "state": "starting",
+                "meeting_id": None,
+                "created_at": now,
+                "started_at": None,
+                "last_heartbeat": now,
+                "children": [],
+            }
+
+    def submit(self, meeting_id, meeting_info):
+        """
+        Start a meeting on a ready worker, or queue it until one is ready
+        :param meeting_id: Meeting ID
+        :param meeting_info: Argument of run_meeting
+        """
+        if any(slot["meeting_id"] == meeting_id for slot in self.slots.values()) \
+                or any(pending_id == meeting_id for pending_id, _ in self._pending):
+            print(f"Meeting {meeting_id} is already running or queued")
+            return
+        self._pending.append((meeting_id, meeting_info))
+        self._dispatch()
+
+    def _dispatch(self):
+        for slot in self.slots.values():
+            if not self._pending:
+                return
+            if slot["state"] != "ready":
+                continue
+            meeting_id, meeting_info = self._pending.popleft()
+            slot["inbox"].put(meeting_info)
+            slot.update(state="busy", meeting_id=meeting_id, started_at=time.time())
+            busy = sum(1 for s in self.slots.values() if s["state"] == "busy")
+            print(f"Meeting {meeting_id} started in worker {slot['process'].pid} ({busy}/{self.max_workers} busy)")
+
+    def status(self):
+        """
+        :return: Dict of slot ID -> pid, state, meeting_id, started_at, last_heartbeat and alive, plus the queued meeting IDs
+        """
+        return {
+            "workers": {
+                slot_id: {
+                    "pid": slot["process"].pid,
+                    "state": slot["state"],
+                    "meeting_id": slot["meeting_id"],
+                    "started_at": slot["started_at"],
+                    "last_heartbeat": slot["last_heartbeat"],
+                    "alive": slot["process"].is_alive(),
+                }
+                for slot_id, slot in self.slots.items()
+            },
+            "queued": [meeting_id for meeting_id, _ in self._pending],
+        }
+
+    async def run(self):
+        """
+        Start the workers, collect their reports, hand out queued meetings, clean up the workers
+        that ended, crashed or hung and start their replacements. Runs until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        self._fill()
+        while True:
+            try:
+                event = await loop.run_in_executor(None, self._events.get, True, 1.0)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                self._handle(event)
+            self._check_workers()
+            self._fill()
+            self._dispatch()
+
+    def _handle(self, event):
+        kind, slot_id, payload = event
+        slot = self.slots.get(slot_id)
+        if slot is None:
+            return
+        if kind == "heartbeat":
+            slot["last_heartbeat"], slot["children"] = payload
+        elif kind == "ready":
+            slot["state"] = "ready"
+            slot["created_at"] = time.time()
+            self._failures = 0
+            self._dispatch()
+        elif kind == "done":
+            print(f"Meeting {slot['meeting_id']} finished")
+            self._reap(slot_id, graceful=True)
+        elif kind == "failed":
+            if slot["meeting_id"] is None:
+                print(f"❌ Worker {slot['process'].pid} could not start its browser:\n{payload}")
+                self._back_off()
+            else:
+                print(f"❌ Meeting {slot['meeting_id']} failed:\n{payload}")
+            self._reap(slot_id, graceful=True)
+
+    def _check_workers(self):
+        # a worker that just exited may have reported "done" after the last read
+        while True:
+            try:
+                self._handle(self._events.get_nowait())
+            except queue.Empty:
+                break
+        now = time.time()
+        for slot_id, slot in list(self.slots.items()):
+            process = slot["process"]
+            name = f"meeting {slot['meeting_id']}" if slot["meeting_id"] else f"idle worker {process.pid}"
+            if not process.is_alive():
+                print(f"❌ Worker of {name} crashed (exit code {process.exitcode})")
+                self._back_off()
+                self._reap(slot_id)
+            elif now - slot["last_heartbeat"] > self.heartbeat_timeout:
+                print(f"❌ Worker of {name} sent no heartbeat for {int(now - slot['last_heartbeat'])} seconds, stopping it")
+                self._back_off()
+                self._reap(slot_id)
+            elif slot["state"] == "busy" and now - slot["started_at"] > self.max_duration:
+                print(f"Meeting {slot['meeting_id']} exceeded {self.max_duration} seconds, stopping it")
+                self._reap(slot_id)
+            elif slot["state"] == "ready" and now - slot["created_at"] > self.max_idle:
+                # a long-lived browser drifts (memory, stale profile state), start a fresh one
+                self._reap(slot_id)
+
+    def _back_off(self):
+        """Delay the start of new workers after a failure, longer for every failure in a row"""
+        delay = min(LAUNCH_RETRY_DELAY * 2 ** self._failures, MAX_LAUNCH_RETRY_DELAY)
+        self._failures += 1
+        self._next_launch = time.time() + delay
+        print(f"Starting new workers in {delay} seconds")
+
+    def _reap(self, slot_id, graceful=False, wait=False):
+        """
+        Free the slot of a worker and stop it with its child processes (Chrome, chromedriver)
+        :param graceful: The worker reported its end, give it a few seconds to exit on its own
+        :param wait: Stop it before returning, otherwise it is stopped in a thread of the running event loop
+        """
+        slot = self.slots.pop(slot_id)
+        if wait:
+            self._stop(slot, graceful)
+        else:
+            future = asyncio.get_running_loop().run_in_executor(None, self._stop, slot, graceful)
+            self._stopping.add(future)
+            future.add_done_callback(self._stopping.discard)
+
+    def _stop(self, slot, graceful):
+        """Join, terminate or kill a worker and kill its child processes, blocks up to about 10 seconds"""
+        process = slot["process"]
+        children = []
+        for pid, create_time in slot["children"]:
+            try:
+                child = psutil.Process(pid)
+                # the same create time makes sure the PID was not reused by another process
+                if child.create_time() == create_time:
+                    children.append(child)
+            except psutil.NoSuchProcess:
+                pass
+        try:
+            children += psutil.Process(process.pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            pass
+        if graceful:
+            process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        for child in children:
+            try:
+                child.kill()
+            except psutil.NoSuchProcess:
+                pass
+        process.close()
+        slot["inbox"].close()
+
+    def shutdown(self):
+        """Stop every worker and drop the queued meetings"""
+        self._pending.clear()
+        for slot_id in list(self.slots):
+            self._reap(slot_id, wait=True)
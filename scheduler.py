@@ -1,49 +1,189 @@
-import time
+import os
+import heapq
 from datetime import datetime
 import asyncio
-from meeting import run_meeting
+from meeting_pool import MeetingPool
 import aiohttp
 
-async def scheduler_service():
-    """Infinitely running scheduler service."""
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# A meeting noticed up to this many seconds after its start time (scheduler restart,
+# backend outage, clock change) is still started, later ones are skipped
+GRACE_SECONDS = int(os.getenv("SCHEDULER_GRACE_SECONDS", 300))
+# Seconds the backend holds a schedule request open waiting for a change
+LONG_POLL_TIMEOUT = 50
+# Seconds before a request to the backend (other than the long poll) is abandoned
+REQUEST_TIMEOUT = 30
+# Attempts to take a meeting that was handed to a worker off the backend schedule
+MARK_STARTED_ATTEMPTS = 3
+# Longest single sleep, so a change of the wall clock is noticed within a minute
+MAX_SLEEP = 60
+# Meetings running at once, each one in its own process
+MEETING_WORKERS = int(os.getenv("MEETING_WORKERS", 2))
+# Seconds without a heartbeat before a meeting worker is considered hung and stopped
+MEETING_HEARTBEAT_TIMEOUT = int(os.getenv("MEETING_HEARTBEAT_TIMEOUT", 60))
+# Seconds after which a meeting is stopped
+MEETING_MAX_SECONDS = int(os.getenv("MEETING_MAX_SECONDS", 3 * 3600))
+# Keep a launched browser in every idle worker, MEETING_WARM_BROWSERS=0 launches it when the meeting starts
+MEETING_WARM_BROWSERS = os.getenv("MEETING_WARM_BROWSERS", "1") == "1"
+
+
+class Schedule:
+    """
+    Meetings waiting to start, in a heap ordered by start time.
+    The whole schedule is replaced when the backend reports a new version,
+    meetings this scheduler already started are never queued again.
+    """
+    def __init__(self):
+        self.version = None
+        self.heap = []
+        self.started = set()
+        self.changed = asyncio.Event()
+
+    def replace(self, version, appointments):
+        heap = []
+        for appointment in appointments:
+            if appointment['appointment_id'] in self.started:
+                continue
+            try:
+                start = datetime.strptime(appointment['datetime'], "%Y-%m-%d %H:%M")
+            except ValueError:
+                print(f"Skipping appointment with invalid datetime: {appointment}")
+                continue
+            heap.append((start, appointment['appointment_id']))
+        heapq.heapify(heap)
+        # once the backend no longer lists a started meeting, it cannot come back with the same ID
+        self.started &= {appointment['appointment_id'] for appointment in appointments}
+        self.version = version
+        self.heap = heap
+        self.changed.set()
+
+    def peek(self):
+        return self.heap[0] if self.heap else None
+
+    def pop(self):
+        start, meeting_id = heapq.heappop(self.heap)
+        self.started.add(meeting_id)
+        return start, meeting_id
+
+    def retry(self, start, meeting_id):
+        """
+        Queue a popped meeting again, e.g. after the backend could not be reached to start it.
+        The backend still lists it, so a new schedule version keeps it too.
+        """
+        self.started.discard(meeting_id)
+        heapq.heappush(self.heap, (start, meeting_id))
+
+
+async def watch_schedule(session, schedule):
+    """Keep the schedule up to date with long polls: one request per change or per LONG_POLL_TIMEOUT."""
     while True:
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")  # Current time in yyyy-mm-dd hh:mm format
-        async with aiohttp.ClientSession() as session:
-            async with session.get("http://localhost:8000/api/meeting/earliest") as response:
+        params = {"timeout": LONG_POLL_TIMEOUT}
+        if schedule.version is not None:
+            params["version"] = schedule.version
+        try:
+            async with session.get(
+                f"{BACKEND_URL}/api/meeting/upcoming",
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=LONG_POLL_TIMEOUT + 15)
+            ) as response:
                 if response.status == 200:
                     response_data = await response.json()
-                    earliest_meeting = response_data['appointment']
+                    schedule.replace(response_data['version'], response_data['appointments'])
+                    print(f"Schedule version {schedule.version}: {len(schedule.heap)} meetings waiting")
+                elif response.status != 204:
+                    print(f"Schedule request failed with status code: {response.status}")
+                    await asyncio.sleep(5)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Schedule request failed: {e}. Retrying in 5 seconds...")
+            await asyncio.sleep(5)
+        except Exception as e:
+            # a malformed response must not stop the watcher, the schedule would freeze
+            print(f"Invalid schedule response: {e!r}. Retrying in 5 seconds...")
+            await asyncio.sleep(5)
+
+
+async def mark_started(session, meeting_id):
+    """Take the meeting off the backend schedule, True if the backend accepted it"""
+    async with session.post(f"{BACKEND_URL}/api/meeting/{meeting_id}/started") as response:
+        if response.status != 200:
+            print(f"Could not mark meeting {meeting_id} as started: {response.status}")
+            return False
+    return True
+
+
+async def start_meeting(session, meeting_id, pool):
+    """
+    Hand the meeting to a worker process, then take it off the backend schedule.
+    The backend keeps listing the meeting until it is handed over, so a meeting whose
+    info could not be fetched stays in the schedule and is retried.
+    :return: True once the meeting is handed over, False if it has to be retried
+    """
+    async with session.get(f"{BACKEND_URL}/api/meeting-short-info/{meeting_id}") as response:
+        if response.status != 200:
+            print(f"Could not get info of meeting {meeting_id}: {response.status}")
+            return False
+        meeting_info = await response.json()
+
+    print(f"Starting meeting: {meeting_id}")
+    pool.submit(meeting_id, meeting_info)
+
+    # the meeting runs either way, this scheduler never starts it twice (Schedule.started)
+    for attempt in range(MARK_STARTED_ATTEMPTS):
+        try:
+            if await mark_started(session, meeting_id):
+                break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Could not mark meeting {meeting_id} as started: {e!r}")
+        if attempt + 1 < MARK_STARTED_ATTEMPTS:
+            await asyncio.sleep(5)
+    return True
+
+
+async def scheduler_service():
+    """Infinitely running scheduler service: sleeps until the next start time or a schedule change."""
+    schedule = Schedule()
+    pool = MeetingPool(MEETING_WORKERS, MEETING_HEARTBEAT_TIMEOUT, MEETING_MAX_SECONDS, warm=MEETING_WARM_BROWSERS)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as session:
+        watcher = asyncio.create_task(watch_schedule(session, schedule))
+        monitor = asyncio.create_task(pool.run())
+        try:
+            while True:
+                schedule.changed.clear()
+                head = schedule.peek()
+                if head is None:
+                    print("No meetings scheduled. Waiting...")
+                    wait = MAX_SLEEP
                 else:
-                    earliest_meeting = None
-        if earliest_meeting is None:
-            print("No meetings scheduled. Waiting...")
-            await asyncio.sleep(60)  # Wait for 1 minute before checking again
-            continue
-            
-        meeting_time, meeting_id = earliest_meeting['datetime'], earliest_meeting['appointment_id']  
-        if current_time == meeting_time:
-            print(f"Starting meeting: {meeting_id}")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"http://localhost:8000/api/meeting-short-info/{meeting_id}") as response:
-                    if response.status == 200:
-                        response_data = await response.json()
-                        meeting_info = response_data
-                    else:
-                        meeting = None
-            await run_meeting(meeting_info) 
-            async with aiohttp.ClientSession() as session:
-                async with session.post("http://localhost:8000/api/meetings/cleanup") as response:
-                    if response.status == 200:
-                        print("Cleanup request successful.")
-                    else:
-                        print(f"Cleanup request failed with status code: {response.status}")
-        else:
-            print(f"Waiting for the next meeting at {meeting_time}...")
-
-        
-        await asyncio.sleep(30)
+                    start, meeting_id = head
+                    late = (datetime.now() - start).total_seconds()
+                    if late >= 0:
+                        schedule.pop()
+                        try:
+                            if late <= GRACE_SECONDS:
+                                handled = await start_meeting(session, meeting_id, pool)
+                            else:
+                                print(f"Skipping meeting {meeting_id}: it started {int(late)} seconds ago")
+                                handled = await mark_started(session, meeting_id)
+                        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                            print(f"Error starting meeting {meeting_id}: {e!r}")
+                            handled = False
+                        if not handled:
+                            print(f"Retrying meeting {meeting_id} in 5 seconds...")
+                            schedule.retry(start, meeting_id)
+                            await asyncio.sleep(5)
+                        continue
+                    print(f"Waiting for the next meeting at {start:%Y-%m-%d %H:%M}...")
+                    wait = min(-late, MAX_SLEEP)
+
+                try:
+                    await asyncio.wait_for(schedule.changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.cancel()
+            monitor.cancel()
+            pool.shutdown()
 
 if __name__ == "__main__":
     print("Scheduler service started.")
-    asyncio.run(scheduler_service())
\ No newline at end of file
+    asyncio.run(scheduler_service())
@@ -0,0 +1,4 @@
+"""
+Modules used by several services (file_filter, databaseAPI, agent).
+The services run from their own directory and add the repository root to sys.path to import them.
+"""
@@ -0,0 +1,92 @@
+import json
+import time
+import random
+import hashlib
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from google.cloud.firestore_v1.vector import Vector
+
+__all__ = ['content_id', 'bulk_insert']
+
+# Firestore limit of operations in one batched write
+MAX_BATCH_SIZE = 500
+
+
+def __json_default(value):
+    if isinstance(value, Vector):
+        return list(value)
+    return str(value)
+
+
+def content_id(doc: dict) -> str:
+    """
+    Document ID derived from the document content, so writing the same document twice
+    (e.g. when a batch is retried) does not create a second copy
+    :param doc: Document
+    :return: Hex digest
+    """
+    canonical = json.dumps(doc, sort_keys=True, ensure_ascii=False, default=__json_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _commit(client, collection, batch_docs, max_retries):
+    for attempt in range(max_retries + 1):
+        try:
+            batch = client.batch()
+            for doc_id, doc in batch_docs:
+                batch.set(collection.document(doc_id), doc)
+            batch.commit()
+            return
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            print(f"\tBatch of {len(batch_docs)} failed ({e}), retrying ({attempt + 1}/{max_retries})")
+            time.sleep(random.uniform(0, min(30, 2 ** attempt)))
+
+
+def bulk_insert(client, collection, docs, batch_size=MAX_BATCH_SIZE, max_workers=4, max_retries=3, on_commit=None):
+    """
+    Write documents with batched writes committed in parallel.
+    `docs` is consumed lazily, at most 2 * max_workers batches are held in memory.
+    A failing batch is retried on its own; batches that still fail are reported
+    and do not stop the others.
+    :param client: Firestore client
+    :param collection: Collection reference
+    :param docs: Iterable of documents
+    :param batch_size: Documents per batch (at most 500)
+    :param max_workers: Number of batches committed in parallel
+    :param max_retries: Retries of a failed batch
+    :param on_commit: Optional fn(number of documents) called after each successful commit
+    :return: (number of documents written, list of IDs that could not be written)
+    """
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    iterator = ((content_id(doc), doc) for doc in docs)
+    written = 0
+    failed = []
+    in_flight = {}
+
+    def collect(done):
+        nonlocal written
+        for future in done:
+            batch_docs = in_flight.pop(future)
+            try:
+                future.result()
+                written += len(batch_docs)
+                if on_commit:
+                    on_commit(len(batch_docs))
+            except Exception as e:
+                print(f"❌ Batch of {len(batch_docs)} documents could not be written: {e}")
+                failed.extend(doc_id for doc_id, _ in batch_docs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            batch_docs = list(islice(iterator, batch_size))
+            if not batch_docs:
+                break
+            in_flight[pool.submit(_commit, client, collection, batch_docs, max_retries)] = batch_docs
+            if len(in_flight) >= 2 * max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(in_flight).done)
+
+    return written, failed
@@ -0,0 +1,172 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+__all__ = ['EmbeddingCache', 'normalize_text']
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text before embedding it, so that strings which only differ
+    in whitespace share one cache entry
+    :param text: Input text
+    :return: Normalized text
+    """
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by (model, normalized text)
+    - memory: LRU dict bounded by `max_memory_items`
+    - disk: SQLite table bounded by `max_disk_items`, least recently used rows are evicted first
+    Vectors are stored as float32.
+    """
+    def __init__(self, path=None, max_memory_items=4096, max_disk_items=200_000):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts):
+        """
+        Look up several texts at once
+        :param model: Embedding model name
+        :param texts: List of texts
+        :return: List with a float32 vector for every hit and None for every miss
+        """
+        keys = [self._key(model, text) for text in texts]
+        results = [None] * len(keys)
+        with self._lock:
+            on_disk = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    results[i] = vector
+                else:
+                    on_disk.setdefault(key, []).append(i)
+
+            if on_disk:
+                rows = []
+                pending = list(on_disk)
+                # stay below SQLite's bound parameter limit
+                for start in range(0, len(pending), 500):
+                    batch = pending[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.extend(self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall())
+                now = time.time()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    for i in on_disk.pop(key):
+                        results[i] = vector
+                        self.hits_disk += 1
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+                    self._conn.commit()
+                self.misses += sum(len(indices) for indices in on_disk.values())
+        return results
+
+    def get(self, model: str, text: str):
+        """
+        Look up a single text
+        :param model: Embedding model name
+        :param text: Input text
+        :return: float32 vector, or None if it is not cached
+        """
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts, vectors):
+        """
+        Store several vectors at once
+        :param model: Embedding model name
+        :param texts: List of texts
+        :param vectors: Vectors in the same order as `texts`
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self._key(model, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model, vector.tobytes(), now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def put(self, model: str, text: str, vector):
+        """
+        Store a single vector
+        :param model: Embedding model name
+        :param text: Input text
+        :param vector: Embedding vector
+        """
+        self.put_many(model, [text], [vector])
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_disk_items:
+            return
+        # evict a bit more than needed so we don't pay for this on every insert
+        excess = count - self.max_disk_items + self.max_disk_items // 10
+        cursor = self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self.evictions += cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        :return: Hit/miss counters and the current size of both tiers
+        """
+        with self._lock:
+            disk_items = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+            }
@@ -0,0 +1,167 @@
+"""
+Tests for the local vector index, run from the repository root with: python -m pytest shared/test_vector_backend.py
+"""
+import numpy as np
+from shared.vector_backend import LocalBackend, sync_from_firestore
+
+DIM = 16
+
+
+class FakeDocument:
+    """Stands in for a Firestore document snapshot"""
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.listener = None
+
+    def stream(self):
+        return iter(self.documents)
+
+    def on_snapshot(self, callback):
+        self.listener = callback
+        return self
+
+
+class FakeChange:
+    def __init__(self, type_name, document):
+        self.type = type("ChangeType", (), {"name": type_name})
+        self.document = document
+
+
+def random_vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def make_index(tmp_path, vectors):
+    collection = FakeCollection([
+        FakeDocument(f"doc{i}", {"name": f"doc{i}", "vector": list(map(float, v))}) for i, v in enumerate(vectors)
+    ])
+    directory = str(tmp_path / "index")
+    sync_from_firestore(collection, directory)
+    return LocalBackend(directory)
+
+
+def brute_force(vectors, names, query, limit):
+    distances = np.linalg.norm(vectors - query, axis=1)
+    order = np.argsort(distances)[:limit]
+    return [names[i] for i in order], distances[order]
+
+
+def names_of(results):
+    return [doc["name"] for doc, _ in results]
+
+
+def test_query_matches_brute_force(tmp_path):
+    vectors = random_vectors(200)
+    backend = make_index(tmp_path, vectors)
+    names = [f"doc{i}" for i in range(200)]
+    for query in random_vectors(20, seed=1):
+        results = backend.query(query, limit=5)
+        expected, distances = brute_force(vectors, names, query, 5)
+        assert names_of(results) == expected
+        np.testing.assert_allclose([d for _, d in results], distances, rtol=1e-4)
+        # the vector is not returned with the document
+        assert all("vector" not in doc for doc, _ in results)
+
+
+def test_limit_larger_than_index(tmp_path):
+    backend = make_index(tmp_path, random_vectors(3))
+    assert len(backend.query(random_vectors(1, seed=1)[0], limit=10)) == 3
+    assert LocalBackend(str(tmp_path / "empty")).query(random_vectors(1)[0]) == []
+
+
+def test_upsert_and_remove(tmp_path):
+    vectors = random_vectors(50)
+    backend = make_index(tmp_path, vectors)
+    query = random_vectors(1, seed=1)[0]
+
+    # a new document right on the query is returned first
+    backend.upsert_many(["new"], [{"name": "new"}], [query])
+    assert names_of(backend.query(query, limit=1)) == ["new"]
+
+    # replacing a document moves it, the old vector is not matched anymore
+    backend.upsert_many(["new"], [{"name": "new"}], [query + 100])
+    assert "new" not in names_of(backend.query(query, limit=5))
+
+    nearest = names_of(backend.query(query, limit=1))[0]
+    with backend._lock:
+        backend.remove(nearest)
+    assert nearest not in names_of(backend.query(query, limit=50))
+    assert len(backend.query(query, limit=100)) == 50
+
+
+def test_many_appends_match_brute_force(tmp_path):
+    vectors = random_vectors(20)
+    backend = make_index(tmp_path, vectors)
+    added = random_vectors(300, seed=2)
+    all_vectors = np.concatenate([vectors, added])
+    names = [f"doc{i}" for i in range(20)] + [f"new{i}" for i in range(300)]
+    for i, vector in enumerate(added):
+        backend.upsert_many([f"new{i}"], [{"name": f"new{i}"}], [vector])
+        # a query between appends materializes them one batch at a time
+        if i % 25 == 0:
+            query = random_vectors(1, seed=100 + i)[0]
+            assert names_of(backend.query(query, limit=5)) == brute_force(all_vectors[:21 + i], names[:21 + i], query, 5)[0]
+    query = random_vectors(1, seed=3)[0]
+    assert names_of(backend.query(query, limit=5)) == brute_force(all_vectors, names, query, 5)[0]
+
+
+def test_ivf_probing_every_list_is_exact(tmp_path):
+    vectors = random_vectors(400)
+    backend = make_index(tmp_path, vectors)
+    backend.build_ivf(n_lists=10)
+    names = [f"doc{i}" for i in range(400)]
+    for query in random_vectors(10, seed=1):
+        assert names_of(backend.query(query, limit=5, nprobe=10)) == brute_force(vectors, names, query, 5)[0]
+
+
+def test_ivf_recall(tmp_path):
+    # clustered data, as embeddings are, so a few lists hold the neighbours
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(8, DIM)) * 10
+    vectors = (centers[rng.integers(0, 8, 800)] + rng.normal(size=(800, DIM))).astype(np.float32)
+    backend = make_index(tmp_path, vectors)
+    backend.build_ivf(n_lists=16)
+    names = [f"doc{i}" for i in range(800)]
+    hits = 0
+    for query in vectors[rng.choice(800, 20, replace=False)] + 0.1:
+        expected = set(brute_force(vectors, names, query, 10)[0])
+        hits += len(expected & set(names_of(backend.query(query, limit=10, nprobe=4))))
+    assert hits / 200 >= 0.9
+
+
+def test_ivf_keeps_upserts(tmp_path):
+    backend = make_index(tmp_path, random_vectors(100))
+    backend.build_ivf(n_lists=5)
+    query = random_vectors(1, seed=1)[0]
+    backend.upsert_many(["new"], [{"name": "new"}], [query])
+    assert names_of(backend.query(query, limit=1, nprobe=1)) == ["new"]
+
+
+def test_watch_reconciles_first_snapshot(tmp_path):
+    vectors = random_vectors(3)
+    backend = make_index(tmp_path, vectors)
+    collection = FakeCollection([])
+    backend.watch(collection)
+
+    # doc0 was deleted and doc1 edited while the index was not watched, doc3 is new
+    snapshot = [
+        FakeDocument("doc1", {"name": "doc1-edited", "vector": list(map(float, vectors[1]))}),
+        FakeDocument("doc2", {"name": "doc2", "vector": list(map(float, vectors[2]))}),
+        FakeDocument("doc3", {"name": "doc3", "vector": list(map(float, vectors[0]))}),
+    ]
+    collection.listener(snapshot, [FakeChange("ADDED", doc) for doc in snapshot], None)
+    assert names_of(backend.query(vectors[0], limit=1)) == ["doc3"]
+    assert names_of(backend.query(vectors[1], limit=1)) == ["doc1-edited"]
+    assert len(backend.query(vectors[0], limit=10)) == 3
+
+    collection.listener(snapshot[1:], [FakeChange("REMOVED", snapshot[0])], None)
+    assert "doc1-edited" not in names_of(backend.query(vectors[1], limit=10))
@@ -0,0 +1,338 @@
+import os
+import json
+import shutil
+import argparse
+import threading
+import numpy as np
+from google.cloud.firestore_v1.vector import Vector
+from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+
+__all__ = ['VectorBackend', 'FirestoreBackend', 'LocalBackend', 'sync_from_firestore', 'get_backend']
+
+
+class VectorBackend:
+    """
+    Interface of the stores used for nearest neighbour search over the `vector` field
+    """
+    def query(self, vector, limit=5):
+        """
+        :param vector: Query vector
+        :param limit: Number of documents to return
+        :return: List of (document without vector, euclidean distance), closest first
+        """
+        raise NotImplementedError
+
+    def upsert_many(self, ids, documents, vectors):
+        """
+        Make documents written to Firestore visible to `query` right away
+        :param ids: Document IDs
+        :param documents: Documents without their vector
+        :param vectors: Vectors in the same order
+        """
+        pass
+
+
+class FirestoreBackend(VectorBackend):
+    """
+    Firestore `find_nearest` query, every lookup is a network round trip
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, vector, limit=5):
+        vector_query = self.collection.find_nearest(
+            vector_field="vector",
+            query_vector=Vector([float(x) for x in vector]),
+            distance_measure=DistanceMeasure.EUCLIDEAN,
+            limit=limit,
+            distance_result_field="vector_distance",
+        )
+        results = []
+        for doc in vector_query.stream():
+            temp = doc.to_dict()
+            distance = temp.pop("vector_distance")
+            temp = {key: value for key, value in temp.items() if key != "vector"}
+            results.append((temp, distance))
+        return results
+
+
+class LocalBackend(VectorBackend):
+    """
+    In-process index: vectors live in one contiguous float32 matrix (memory-mapped
+    from `vectors.f32`), documents in `documents.jsonl`.
+    Queries are an exact BLAS matrix-vector product, or an IVF search over
+    `nprobe` clusters once `build_ivf` has been called.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.ids = []
+        self.documents = []
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self._norms = np.empty(0, dtype=np.float32)
+        self.row_of = {}
+        self._pending = []
+        self._capacity = 0
+        self._buffers = None
+        self.centroids = None
+        self.lists = None
+        self.load()
+
+    def load(self):
+        meta_path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        n, dim = meta["count"], meta["dim"]
+        if n:
+            self.vectors = np.memmap(os.path.join(self.directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+        else:
+            self.vectors = np.empty((0, dim), dtype=np.float32)
+        with open(os.path.join(self.directory, "documents.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.row_of[entry["id"]] = len(self.ids)
+                self.ids.append(entry["id"])
+                self.documents.append(entry["doc"])
+        self.alive = np.ones(n, dtype=bool)
+        self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        print(f"Loaded local vector index: {n} vectors of dimension {dim}")
+
+    def _reserve(self, count, dim):
+        # the arrays are over-allocated and doubled when full, so appending a row is amortized O(dim)
+        # instead of copying the whole matrix (the memory-mapped one is copied into memory once)
+        n = len(self.ids)
+        if n + count <= self._capacity:
+            return
+        capacity = max(2 * self._capacity, n + count, 64)
+        vectors = np.empty((capacity, dim), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        norms = np.zeros(capacity, dtype=np.float32)
+        if n:
+            vectors[:n] = self.vectors
+            alive[:n] = self.alive
+            norms[:n] = self._norms
+        self._buffers = (vectors, alive, norms)
+        self._capacity = capacity
+
+    def _materialize(self):
+        # appended rows are kept aside and written into the spare capacity on the next query
+        if not self._pending:
+            return
+        rows = np.asarray([v for _, _, v in self._pending], dtype=np.float32)
+        start = len(self.ids)
+        end = start + len(rows)
+        self._reserve(len(rows), rows.shape[1])
+        vectors, alive, norms = self._buffers
+        vectors[start:end] = rows
+        alive[start:end] = True
+        norms[start:end] = np.einsum("ij,ij->i", rows, rows)
+        # the public arrays are views of the used part of the buffers
+        self.vectors, self.alive, self._norms = vectors[:end], alive[:end], norms[:end]
+        for i, (doc_id, doc, _) in enumerate(self._pending):
+            self.row_of[doc_id] = start + i
+            self.ids.append(doc_id)
+            self.documents.append(doc)
+            if self.centroids is not None:
+                self.lists[int(np.argmin(np.linalg.norm(self.centroids - rows[i], axis=1)))].append(start + i)
+        self._pending = []
+
+    def upsert_many(self, ids, documents, vectors):
+        with self._lock:
+            for doc_id, doc, vector in zip(ids, documents, vectors):
+                self.remove(doc_id)
+                self._pending.append((doc_id, doc, np.asarray(vector, dtype=np.float32)))
+
+    def remove(self, doc_id):
+        row = self.row_of.pop(doc_id, None)
+        if row is not None:
+            self.alive[row] = False
+        self._pending = [p for p in self._pending if p[0] != doc_id]
+
+    def build_ivf(self, n_lists=None, iterations=10, seed=0):
+        """
+        Cluster the vectors with k-means so queries only scan the closest clusters
+        :param n_lists: Number of clusters, defaults to sqrt(n)
+        :param iterations: k-means iterations
+        """
+        with self._lock:
+            self._materialize()
+            n = len(self.ids)
+            if n == 0:
+                return
+            n_lists = n_lists or max(1, int(np.sqrt(n)))
+            rng = np.random.default_rng(seed)
+            centroids = np.array(self.vectors[rng.choice(n, size=min(n_lists, n), replace=False)])
+            for _ in range(iterations):
+                assignment = self._nearest_centroid(centroids, self.vectors)
+                for c in range(len(centroids)):
+                    members = self.vectors[assignment == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+            assignment = self._nearest_centroid(centroids, self.vectors)
+            self.centroids = centroids
+            self.lists = [list(np.flatnonzero(assignment == c)) for c in range(len(centroids))]
+            print(f"Built IVF index with {len(centroids)} lists")
+
+    @staticmethod
+    def _nearest_centroid(centroids, vectors):
+        scores = np.asarray(vectors) @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+        return np.argmax(scores, axis=1)
+
+    def query(self, vector, limit=5, nprobe=8):
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._materialize()
+            if len(self.ids) == 0:
+                return []
+            if self.centroids is not None:
+                probe = np.argsort(np.linalg.norm(self.centroids - query, axis=1))[:nprobe]
+                rows = np.fromiter((r for c in probe for r in self.lists[c]), dtype=np.int64)
+            else:
+                rows = None
+            matrix = self.vectors if rows is None else self.vectors[rows]
+            norms = self._norms if rows is None else self._norms[rows]
+            # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2
+            distances = norms - 2.0 * (matrix @ query) + float(query @ query)
+            distances[~(self.alive if rows is None else self.alive[rows])] = np.inf
+            k = min(limit, len(distances))
+            if k == 0:
+                return []
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+            results = []
+            for i in top:
+                if np.isinf(distances[i]):
+                    break
+                row = i if rows is None else rows[i]
+                results.append((self.documents[row], float(np.sqrt(max(distances[i], 0.0)))))
+            return results
+
+    def _is_current(self, doc_id, document, vector):
+        """True if the index holds this document with the same contents and vector"""
+        row = self.row_of.get(doc_id)
+        if row is None:
+            return False
+        return self.documents[row] == document and np.array_equal(self.vectors[row], np.asarray(vector, dtype=np.float32))
+
+    def watch(self, collection):
+        """
+        Keep the index in sync with Firestore through a snapshot listener.
+        The first snapshot lists the whole collection: documents deleted or edited in Firestore
+        while the index was not watched are removed or replaced then.
+        :param collection: Collection reference
+        :return: Watch handle (call `.unsubscribe()` to stop)
+        """
+        first = [True]
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            if first[0]:
+                first[0] = False
+                current = {doc.id for doc in col_snapshot}
+                with self._lock:
+                    stale = [doc_id for doc_id in self.row_of if doc_id not in current]
+                    for doc_id in stale:
+                        self.remove(doc_id)
+                if stale:
+                    print(f"Removed {len(stale)} vectors deleted from Firestore since the index was written")
+
+            ids, documents, vectors = [], [], []
+            for change in changes:
+                doc_id = change.document.id
+                data = change.document.to_dict()
+                vector = data.pop("vector", None)
+                if change.type.name == "REMOVED" or vector is None:
+                    with self._lock:
+                        self.remove(doc_id)
+                    continue
+                vector = list(vector)
+                document = json.loads(json.dumps(data, default=str))
+                # the first snapshot lists every document, skip the ones loaded from disk unchanged
+                if change.type.name == "ADDED":
+                    with self._lock:
+                        if self._is_current(doc_id, document, vector):
+                            continue
+                ids.append(doc_id)
+                vectors.append(vector)
+                documents.append(document)
+            if ids:
+                self.upsert_many(ids, documents, vectors)
+
+        return collection.on_snapshot(on_snapshot)
+
+
+def sync_from_firestore(collection, directory):
+    """
+    Rebuild the local index from every document of the collection that has a vector.
+    The new files are written next to the old ones and swapped in at the end.
+    :param collection: Collection reference
+    :param directory: Index directory
+    :return: Number of vectors written
+    """
+    tmp = directory.rstrip("/\\") + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    count, dim = 0, 0
+    with open(os.path.join(tmp, "vectors.f32"), "wb") as vf, \
+            open(os.path.join(tmp, "documents.jsonl"), "w", encoding="utf-8") as df:
+        for doc in collection.stream():
+            data = doc.to_dict()
+            vector = data.pop("vector", None)
+            if vector is None:
+                continue
+            vector = np.asarray(list(vector), dtype=np.float32)
+            dim = dim or len(vector)
+            if len(vector) != dim:
+                print(f"Skipping {doc.id}: dimension {len(vector)} != {dim}")
+                continue
+            vf.write(vector.tobytes())
+            df.write(json.dumps({"id": doc.id, "doc": data}, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "dim": dim}, f)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp, directory)
+    print(f"Synced {count} vectors to {directory}")
+    return count
+
+
+def get_backend(collection):
+    """
+    Backend selected with VECTOR_BACKEND=firestore|local (default firestore).
+    The local backend reads VECTOR_INDEX_DIR, syncs it first if it does not exist,
+    and follows Firestore changes unless VECTOR_INDEX_WATCH=0.
+    VECTOR_INDEX_IVF=1 builds the approximate IVF index on load.
+    :param collection: Collection reference
+    :return: VectorBackend
+    """
+    if os.getenv("VECTOR_BACKEND", "firestore") != "local":
+        return FirestoreBackend(collection)
+
+    directory = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        sync_from_firestore(collection, directory)
+    backend = LocalBackend(directory)
+    if os.getenv("VECTOR_INDEX_IVF", "0") == "1":
+        backend.build_ivf()
+    if os.getenv("VECTOR_INDEX_WATCH", "1") == "1":
+        backend.watch(collection)
+    return backend
+
+
+# run from the repository root: python -m shared.vector_backend --dir <service>/vector_index
+if __name__ == '__main__':
+    import dotenv
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    parser = argparse.ArgumentParser(description="Build the local vector index from Firestore")
+    parser.add_argument("--collection", default="filter_data", help="Firestore collection")
+    parser.add_argument("--dir", default=None, help="Index directory (default: VECTOR_INDEX_DIR or vector_index)")
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    firebase_admin.initialize_app(credentials.Certificate(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')))
+    sync_from_firestore(firestore.client().collection(args.collection), args.dir or os.getenv("VECTOR_INDEX_DIR", "vector_index"))
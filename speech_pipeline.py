@@ -0,0 +1,361 @@
+"""
+Streaming speech pipeline of the meeting agent
+
+    capture thread -> ring buffer -> VAD / segmenter thread -> transcription thread -> utterances
+
+- The microphone is opened once and read continuously, audio keeps being captured while
+  earlier utterances are transcribed or the agent is answering
+- Only the chunks the VAD marks as speech reach the transcription backend, fed while the
+  utterance is still being spoken (a streaming backend transcribes as the audio arrives)
+- The wake phrase is spotted in the transcripts, so with a local backend no audio leaves the host
+"""
+import os
+import json
+import time
+import queue
+import threading
+import collections
+import numpy as np
+import speech_recognition as sr
+
+__all__ = ['RingBuffer', 'EnergyVAD', 'WakeWordDetector', 'Utterance', 'TranscriptionBackend',
+           'GoogleBackend', 'SphinxBackend', 'VoskBackend', 'get_backend', 'find_microphone', 'SpeechPipeline']
+
+WAKE_PHRASES = ("hey agent", "a agent")
+
+# Transcribed utterance; `command` is the text after the wake phrase when `wake` is True
+Utterance = collections.namedtuple("Utterance", ["text", "wake", "command", "started_at", "ended_at"])
+
+
+class RingBuffer:
+    """
+    The last `capacity` audio chunks, numbered from 0 as they arrive.
+    The writer never blocks, a reader that falls more than `capacity` chunks behind skips ahead.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._chunks = collections.deque(maxlen=capacity)
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._next += 1
+            self._cond.notify_all()
+
+    def read(self, seq, timeout=None):
+        """
+        :param seq: Number of the chunk to read
+        :param timeout: Seconds to wait for it
+        :return: (seq, chunk) with seq moved forward if the chunk was overwritten, or (seq, None) on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._next > seq, timeout):
+                return seq, None
+            oldest = self._next - len(self._chunks)
+            if seq < oldest:
+                print(f"Speech pipeline fell behind, {oldest - seq} audio chunks dropped")
+                seq = oldest
+            return seq, self._chunks[seq - oldest]
+
+    def last(self, end, count):
+        """:return: Up to `count` chunks before chunk number `end`, oldest first"""
+        with self._cond:
+            oldest = self._next - len(self._chunks)
+            start = max(oldest, end - count)
+            return [self._chunks[i - oldest] for i in range(start, min(end, self._next))]
+
+
+class EnergyVAD:
+    """
+    Speech / non-speech decision per chunk from its RMS energy, against a noise floor that
+    follows the background level while nobody speaks
+    """
+    def __init__(self, ratio=3.0, min_energy=300.0, adapt=0.05):
+        """
+        :param ratio: A chunk is speech when its energy is `ratio` times the noise floor
+        :param min_energy: Energy below which a chunk is never speech
+        :param adapt: Weight of a silent chunk in the noise floor average
+        """
+        self.ratio = ratio
+        self.min_energy = min_energy
+        self.adapt = adapt
+        self.noise_floor = min_energy / ratio
+
+    def is_speech(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        energy = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+        speech = energy > max(self.min_energy, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor += self.adapt * (energy - self.noise_floor)
+        return speech
+
+
+class WakeWordDetector:
+    """Finds the wake phrase in a transcript"""
+    def __init__(self, phrases=WAKE_PHRASES):
+        self.phrases = phrases
+
+    def split(self, text):
+        """
+        :return: (True, text after the wake phrase) if the transcript contains it, else (False, "")
+        """
+        lowered = text.lower()
+        for phrase in self.phrases:
+            index = lowered.find(phrase)
+            if index != -1:
+                return True, text[index + len(phrase):].strip(" ,.!?")
+        return False, ""
+
+
+class TranscriptionBackend:
+    """
+    Turns the audio of one utterance into text. `feed` is called with every chunk while the
+    utterance is spoken, `finish` once it ended. Backends that only work on complete audio
+    collect the chunks and transcribe in `finish`.
+    """
+    def start(self, sample_rate, sample_width):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._chunks = []
+
+    def feed(self, chunk):
+        self._chunks.append(chunk)
+
+    def finish(self):
+        """:return: Transcript, empty if nothing was understood"""
+        raise NotImplementedError
+
+    def _audio(self):
+        return sr.AudioData(b"".join(self._chunks), self.sample_rate, self.sample_width)
+
+
+class GoogleBackend(TranscriptionBackend):
+    """Google Web Speech API through speech_recognition (one request per utterance)"""
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def finish(self):
+        try:
+            return self.recognizer.recognize_google(self._audio())
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            print(f"Could not request results; {e}")
+            return ""
+
+
+class SphinxBackend(TranscriptionBackend):
+    """CMU Sphinx through speech_recognition, offline (needs pocketsphinx)"""
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def finish(self):
+        try:
+            return self.recognizer.recognize_sphinx(self._audio())
+        except sr.UnknownValueError:
+            return ""
+
+
+class VoskBackend(TranscriptionBackend):
+    """Vosk / Kaldi model, offline and streaming: audio is decoded as it is fed"""
+    def __init__(self, model_path):
+        from vosk import Model, KaldiRecognizer
+        self._recognizer_class = KaldiRecognizer
+        self.model = Model(model_path)
+
+    def start(self, sample_rate, sample_width):
+        super().start(sample_rate, sample_width)
+        self._recognizer = self._recognizer_class(self.model, sample_rate)
+        self._text = []
+
+    def feed(self, chunk):
+        if self._recognizer.AcceptWaveform(chunk):
+            self._text.append(json.loads(self._recognizer.Result()).get("text", ""))
+
+    def finish(self):
+        self._text.append(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        return " ".join(part for part in self._text if part)
+
+
+def get_backend(name=None):
+    """
+    Backend selected with SPEECH_BACKEND=google|sphinx|vosk (default google).
+    The vosk backend loads the model directory VOSK_MODEL_PATH (default vosk_model).
+    """
+    name = name or os.getenv("SPEECH_BACKEND", "google")
+    if name == "vosk":
+        return VoskBackend(os.getenv("VOSK_MODEL_PATH", "vosk_model"))
+    if name == "sphinx":
+        return SphinxBackend()
+    return GoogleBackend()
+
+
+def find_microphone(keyword="VB-Audio"):
+    """:return: Index of the first input device whose name contains `keyword`, None for the default microphone"""
+    for index, name in enumerate(sr.Microphone.list_microphone_names()):
+        if keyword in name:
+            print(f"Using {keyword} device for input: {name} (Index {index})")
+            return index
+    print(f"{keyword} device not found. Using default microphone.")
+    return None
+
+
+class SpeechPipeline:
+    """
+    Runs capture, segmentation and transcription in three threads and queues the transcribed utterances.
+    """
+    def __init__(self, backend, device_index=None, sample_rate=16000, chunk_size=1024, ring_seconds=30,
+                 pre_roll_seconds=0.3, silence_seconds=0.8, min_speech_seconds=0.25, max_utterance_seconds=15):
+        """
+        :param backend: TranscriptionBackend
+        :param device_index: Input device, None for the default microphone
+        :param ring_seconds: Audio kept in the ring buffer
+        :param pre_roll_seconds: Audio before the first speech chunk added to an utterance
+        :param silence_seconds: Silence that ends an utterance
+        :param min_speech_seconds: Shorter bursts (clicks, coughs) are not transcribed
+        :param max_utterance_seconds: Longer utterances are cut
+        """
+        self.backend = backend
+        self.device_index = device_index
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        chunk_seconds = chunk_size / sample_rate
+        self.ring = RingBuffer(int(ring_seconds / chunk_seconds))
+        self.pre_roll_chunks = int(pre_roll_seconds / chunk_seconds)
+        self.silence_chunks = max(1, int(silence_seconds / chunk_seconds))
+        self.min_speech_chunks = max(1, int(min_speech_seconds / chunk_seconds))
+        self.max_utterance_chunks = int(max_utterance_seconds / chunk_seconds)
+        self.vad = EnergyVAD()
+        self.wake_word = WakeWordDetector()
+        self.utterances = queue.Queue()
+        self.last_speech = time.monotonic()
+        self._segments = queue.Queue()
+        self._muted = threading.Event()
+        self._running = threading.Event()
+        self._ready = threading.Event()
+        self._capture_error = None
+        self._threads = []
+        self.sample_width = 2
+
+    def start(self):
+        """
+        Open the microphone and start the threads, returns once audio is being captured
+        :raise: The error of the microphone, or RuntimeError if it did not open within 10 seconds
+        """
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._capture, name="speech-capture", daemon=True),
+            threading.Thread(target=self._segment, name="speech-vad", daemon=True),
+            threading.Thread(target=self._transcribe, name="speech-transcribe", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        ready = self._ready.wait(timeout=10)
+        if self._capture_error is not None or not ready:
+            self.stop()
+            if self._capture_error is not None:
+                raise self._capture_error
+            raise RuntimeError("Microphone did not start within 10 seconds")
+        self.last_speech = time.monotonic()
+
+    def stop(self):
+        self._running.clear()
+        self._segments.put(("stop", None))
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def pause(self):
+        """Ignore the audio until resume(), e.g. while the agent speaks"""
+        self._muted.set()
+
+    def resume(self):
+        self._muted.clear()
+
+    def next_utterance(self, timeout=None):
+        """
+        :return: The next Utterance, or None if none arrived within `timeout` seconds
+        :raise: The error that stopped the microphone
+        """
+        try:
+            return self.utterances.get(timeout=timeout)
+        except queue.Empty:
+            if self._capture_error is not None:
+                raise self._capture_error
+            return None
+
+    def quiet_for(self):
+        """:return: Seconds since the last speech chunk"""
+        return time.monotonic() - self.last_speech
+
+    def _capture(self):
+        try:
+            microphone = sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate, chunk_size=self.chunk_size)
+            with microphone as source:
+                self.sample_width = source.SAMPLE_WIDTH
+                self._ready.set()
+                while self._running.is_set():
+                    self.ring.append(source.stream.read(source.CHUNK))
+        except Exception as e:
+            # reported by start(), or ends the meeting loop through next_utterance()
+            self._capture_error = e
+            self._ready.set()
+
+    def _segment(self):
+        seq, start, voiced, silent, length = 0, None, 0, 0, 0
+        while self._running.is_set():
+            seq, chunk = self.ring.read(seq, timeout=0.5)
+            if chunk is None:
+                continue
+            if self._muted.is_set():
+                # drop what was heard so far, the agent's own voice is not a question
+                if start is not None:
+                    self._segments.put(("cancel", None))
+                    start = None
+                seq += 1
+                continue
+
+            speech = self.vad.is_speech(chunk)
+            if speech:
+                self.last_speech = time.monotonic()
+            if start is None:
+                if speech:
+                    start, voiced, silent, length = time.time(), 1, 0, 1
+                    self._segments.put(("start", start))
+                    for previous in self.ring.last(seq, self.pre_roll_chunks):
+                        self._segments.put(("chunk", previous))
+                    self._segments.put(("chunk", chunk))
+            else:
+                self._segments.put(("chunk", chunk))
+                length += 1
+                voiced += speech
+                silent = 0 if speech else silent + 1
+                if silent >= self.silence_chunks or length >= self.max_utterance_chunks:
+                    self._segments.put(("end" if voiced >= self.min_speech_chunks else "cancel", start))
+                    start = None
+            seq += 1
+
+    def _transcribe(self):
+        started_at = None
+        while True:
+            kind, payload = self._segments.get()
+            if kind == "stop":
+                return
+            if kind == "start":
+                started_at = payload
+                self.backend.start(self.sample_rate, self.sample_width)
+            elif kind == "chunk" and started_at is not None:
+                self.backend.feed(payload)
+            elif kind == "cancel":
+                started_at = None
+            elif kind == "end" and started_at is not None:
+                try:
+                    text = self.backend.finish()
+                except Exception as e:
+                    print(f"Transcription failed: {e}")
+                    text = ""
+                if text:
+                    wake, command = self.wake_word.split(text)
+                    self.utterances.put(Utterance(text, wake, command, started_at, time.time()))
+                started_at = None
@@ -0,0 +1,205 @@
+"""
+Tests for the streaming speech pipeline, with synthetic audio and a stub transcription backend.
+Run from the repository root with: python -m pytest test_speech_pipeline.py
+"""
+import time
+import threading
+import numpy as np
+import pytest
+import speech_pipeline
+from speech_pipeline import RingBuffer, EnergyVAD, WakeWordDetector, TranscriptionBackend, SpeechPipeline
+
+CHUNK = 1024
+RATE = 16000
+
+
+def silence():
+    return np.zeros(CHUNK, dtype=np.int16).tobytes()
+
+
+def tone(amplitude=5000):
+    t = np.arange(CHUNK) / RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.int16).tobytes()
+
+
+class StubBackend(TranscriptionBackend):
+    """Records the chunks of every utterance and answers with a fixed transcript"""
+    def __init__(self, text="hey agent what time is it", error=None):
+        self.text = text
+        self.error = error
+        self.utterances = []
+
+    def finish(self):
+        self.utterances.append(list(self._chunks))
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+def run_segmenter(pipeline, chunks):
+    """Put the chunks in the ring buffer and run the VAD and transcription threads, without a microphone"""
+    for chunk in chunks:
+        pipeline.ring.append(chunk)
+    pipeline._running.set()
+    pipeline._threads = [
+        threading.Thread(target=pipeline._segment, daemon=True),
+        threading.Thread(target=pipeline._transcribe, daemon=True),
+    ]
+    for thread in pipeline._threads:
+        thread.start()
+
+
+def test_ring_buffer_reads_in_order_and_skips_overwritten_chunks():
+    ring = RingBuffer(3)
+    assert ring.read(0, timeout=0.01) == (0, None)
+    for i in range(5):
+        ring.append(i)
+    # chunks 0 and 1 were overwritten, the reader moves to the oldest one left
+    assert ring.read(0) == (2, 2)
+    assert ring.read(4) == (4, 4)
+    assert ring.last(5, 2) == [3, 4]
+    assert ring.last(5, 10) == [2, 3, 4]
+
+
+def test_ring_buffer_wakes_reader():
+    ring = RingBuffer(3)
+    threading.Timer(0.05, ring.append, ("chunk",)).start()
+    assert ring.read(0, timeout=2) == (0, "chunk")
+
+
+def test_vad_separates_speech_from_silence():
+    vad = EnergyVAD()
+    assert not vad.is_speech(silence())
+    assert vad.is_speech(tone())
+    assert not vad.is_speech(b"")
+
+
+def test_vad_noise_floor_follows_background():
+    vad = EnergyVAD()
+    # steady background noise is not speech and raises the floor
+    assert vad.is_speech(tone(700))
+    for _ in range(200):
+        assert not vad.is_speech(tone(250))
+    assert not vad.is_speech(tone(700))
+    assert vad.is_speech(tone(5000))
+
+
+def test_wake_word():
+    detector = WakeWordDetector()
+    assert detector.split("Hey Agent, what is the deadline?") == (True, "what is the deadline")
+    assert detector.split("okay a agent") == (True, "")
+    assert detector.split("thank you for attending") == (False, "")
+
+
+def test_utterance_is_segmented_with_pre_roll():
+    backend = StubBackend()
+    pipeline = SpeechPipeline(backend, chunk_size=CHUNK, sample_rate=RATE)
+    speech = [tone() for _ in range(10)]
+    run_segmenter(pipeline, [silence()] * 10 + speech + [silence()] * 30)
+    try:
+        utterance = pipeline.next_utterance(timeout=2)
+    finally:
+        pipeline.stop()
+
+    assert utterance.text == "hey agent what time is it"
+    assert utterance.wake and utterance.command == "what time is it"
+    assert utterance.started_at <= utterance.ended_at
+    # pre-roll, the speech, then the silence that ended it
+    fed = backend.utterances[0]
+    assert fed == [silence()] * pipeline.pre_roll_chunks + speech + [silence()] * pipeline.silence_chunks
+    assert pipeline.next_utterance(timeout=0.1) is None
+
+
+def test_short_bursts_are_not_transcribed():
+    backend = StubBackend()
+    pipeline = SpeechPipeline(backend, chunk_size=CHUNK, sample_rate=RATE)
+    burst = [tone()] * (pipeline.min_speech_chunks - 1)
+    run_segmenter(pipeline, [silence()] * 5 + burst + [silence()] * 30)
+    try:
+        assert pipeline.next_utterance(timeout=0.3) is None
+    finally:
+        pipeline.stop()
+    assert backend.utterances == []
+
+
+def test_long_utterances_are_cut():
+    backend = StubBackend(text="talking")
+    pipeline = SpeechPipeline(backend, chunk_size=CHUNK, sample_rate=RATE, max_utterance_seconds=1)
+    run_segmenter(pipeline, [tone()] * (pipeline.max_utterance_chunks * 2 + 1) + [silence()] * 30)
+    try:
+        first = pipeline.next_utterance(timeout=2)
+        second = pipeline.next_utterance(timeout=2)
+    finally:
+        pipeline.stop()
+    assert first.text == second.text == "talking"
+    assert len(backend.utterances[0]) == pipeline.max_utterance_chunks
+
+
+def test_audio_is_ignored_while_paused():
+    backend = StubBackend()
+    pipeline = SpeechPipeline(backend, chunk_size=CHUNK, sample_rate=RATE)
+    pipeline.pause()
+    run_segmenter(pipeline, [tone()] * 10 + [silence()] * 30)
+    try:
+        assert pipeline.next_utterance(timeout=0.3) is None
+    finally:
+        pipeline.stop()
+    assert backend.utterances == []
+
+
+def test_transcription_errors_are_skipped():
+    backend = StubBackend(error=RuntimeError("backend down"))
+    pipeline = SpeechPipeline(backend, chunk_size=CHUNK, sample_rate=RATE)
+    run_segmenter(pipeline, [tone()] * 10 + [silence()] * 30)
+    try:
+        assert pipeline.next_utterance(timeout=0.5) is None
+    finally:
+        pipeline.stop()
+    assert len(backend.utterances) == 1
+
+
+class FakeMicrophone:
+    """Stands in for sr.Microphone, plays `frames` then silence at about real time"""
+    SAMPLE_WIDTH = 2
+    frames = []
+
+    def __init__(self, device_index=None, sample_rate=None, chunk_size=None):
+        self.CHUNK = chunk_size
+        self.stream = self
+        self._frames = list(self.frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def read(self, size):
+        time.sleep(0.001)
+        return self._frames.pop(0) if self._frames else silence()
+
+
+def test_pipeline_end_to_end(monkeypatch):
+    monkeypatch.setattr(FakeMicrophone, "frames", [silence()] * 5 + [tone()] * 10)
+    monkeypatch.setattr(speech_pipeline.sr, "Microphone", FakeMicrophone)
+    pipeline = SpeechPipeline(StubBackend(text="hello team"), chunk_size=CHUNK, sample_rate=RATE)
+    pipeline.start()
+    try:
+        utterance = pipeline.next_utterance(timeout=5)
+    finally:
+        pipeline.stop()
+    assert utterance.text == "hello team" and not utterance.wake
+    assert pipeline.quiet_for() >= 0
+
+
+def test_microphone_errors_are_raised(monkeypatch):
+    class BrokenMicrophone(FakeMicrophone):
+        def __enter__(self):
+            raise OSError("no input device")
+
+    monkeypatch.setattr(speech_pipeline.sr, "Microphone", BrokenMicrophone)
+    pipeline = SpeechPipeline(StubBackend(), chunk_size=CHUNK, sample_rate=RATE)
+    with pytest.raises(OSError, match="no input device"):
+        pipeline.start()
+    with pytest.raises(OSError):
+        pipeline.next_utterance(timeout=0.01)
@@ -1,16 +1,19 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from werkzeug.exceptions import HTTPException
 from firebase_config import FirebaseService
 from models import User, Meeting, Attachment
 from werkzeug.utils import secure_filename
 from functools import wraps
 from config import Config
+from zip_stream import stream_zip
+from user_cache import UserCache
 from flask_cors import CORS
 import jwt
 import os
 import uuid
 import datetime
 import io
+from concurrent.futures import ThreadPoolExecutor
 import zipfile
 import json
 import sys
@@ -26,6 +29,7 @@ app.secret_key = Config.SECRET_KEY
 
 # Initialize Firebase
 firebase = FirebaseService()
+user_cache = UserCache(ttl=Config.USER_CACHE_TTL)
 
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
@@ -48,6 +52,32 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def load_user(token_data):
+    """
+    Get the user a decoded token belongs to: from the token claims when the profile is embedded,
+    otherwise from the user cache, and from Firestore only on a cache miss
+    """
+    if Config.JWT_EMBED_PROFILE and {'user_id', 'email', 'role', 'name'} <= token_data.keys():
+        return {
+            'id': token_data['user_id'],
+            'email': token_data['email'],
+            'role': token_data['role'],
+            'name': token_data['name']
+        }
+    
+    user_id = token_data.get('user_id')
+    if not user_id:
+        return firebase.get_user_by_email(token_data['email'])
+    
+    user = user_cache.get(user_id)
+    if user is None:
+        user = firebase.get_user_by_id(user_id)
+        if user is not None:
+            # the password hash is not needed after login, keep it out of the cache
+            user = {k: v for k, v in user.items() if k != 'password_hash'}
+            user_cache.put(user)
+    return user
+
 # Helper function to get the current user from the request token
 def get_current_user():
     """Get the current user from the request token"""
@@ -67,7 +97,7 @@ def get_current_user():
     try:
         # Decode the token
         data = jwt.decode(token, app.secret_key, algorithms=["HS256"])
-        current_user = firebase.get_user_by_email(data['email'])
+        current_user = load_user(data)
         return current_user
     except Exception as e:
         print(f"[DEBUG] Error decoding token: {str(e)}")
@@ -88,7 +118,7 @@ def token_required(f):
         try:
             # Decode the token
             data = jwt.decode(token, app.secret_key, algorithms=["HS256"])
-            current_user = firebase.get_user_by_email(data['email'])
+            current_user = load_user(data)
             
             if not current_user:
                 return jsonify({'message': 'User not found!'}), 401
@@ -127,6 +157,7 @@ def signup():
         # Add user to database
         user_id = firebase.create_user(user.to_dict())
         print("User created with ID:", user_id)
+        user_cache.invalidate(user_id=user_id, email=data['email'])
         
         return jsonify({'message': 'User registered successfully', 'user_id': user_id}), 201
     except ValueError as e:
@@ -162,11 +193,15 @@ def login():
             return jsonify({'message': 'Invalid email or password'}), 401
         
         # Generate token
-        token = jwt.encode({
+        claims = {
             'email': user['email'],
             'user_id': user['id'],
             'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }, app.secret_key)
+        }
+        if Config.JWT_EMBED_PROFILE:
+            claims['role'] = user['role']
+            claims['name'] = user['name']
+        token = jwt.encode(claims, app.secret_key)
         
         return jsonify({
             'message': 'Login successful',
@@ -182,6 +217,23 @@ def login():
         print("Error in login:", e)
         return jsonify({'message': 'Login failed', 'error': str(e)}), 500
 
+@app.route('/api/users/<user_id>/role', methods=['PUT'])
+@token_required
+def update_user_role(current_user, user_id):
+    """Change the role of a user (admin only)"""
+    if current_user.get('role') != 'admin':
+        return jsonify({'message': 'Only admins can change roles'}), 403
+    
+    data = request.get_json()
+    if not data or not data.get('role'):
+        return jsonify({'message': 'Missing field: role'}), 400
+    
+    if not firebase.update_user_role(user_id, data['role']):
+        return jsonify({'message': 'User not found'}), 404
+    user_cache.invalidate(user_id=user_id)
+    
+    return jsonify({'message': 'Role updated', 'user_id': user_id, 'role': data['role']}), 200
+
 # Meeting routes
 @app.route('/api/meetings', methods=['POST'])
 @token_required
@@ -212,19 +264,15 @@ def create_meeting(current_user):
         # Add meeting to database
         meeting_id = firebase.create_meeting(meeting.to_dict())
         
-        # Also add to local appointments.json file
+        # Also add to the local appointment store read by the scheduler
         try:
-            # Load existing appointments
-            appointments = manage_appointments.load_appointments()
-            
-            # Add this appointment
             date_str = data['date']
             time_str = data['time']
-            manage_appointments.add_appointment(appointments, date_str, time_str, meeting_id)
+            manage_appointments.add_appointment(date_str, time_str, meeting_id)
             
-            print(f"Successfully added appointment to local file: {date_str} {time_str} -> {meeting_id}")
+            print(f"Successfully added appointment to local store: {date_str} {time_str} -> {meeting_id}")
         except Exception as local_err:
-            print(f"Warning: Could not add appointment to local file: {str(local_err)}")
+            print(f"Warning: Could not add appointment to local store: {str(local_err)}")
         
         return jsonify({
             'message': 'Meeting created successfully',
@@ -237,18 +285,94 @@ def create_meeting(current_user):
 @app.route('/api/meetings', methods=['GET'])
 @token_required
 def get_meetings(current_user):
+    """
+    Get one page of the meetings visible to the current user
+    
+    Query parameters:
+        view: 'all' (default), 'mine' or 'team'
+        status: Status to keep, repeated or comma separated (e.g. status=pending,accepted)
+        sort: 'date_desc' (default), 'date_asc' or 'status'
+        page_size: Meetings per page (default 50, at most 200)
+        cursor: next_cursor returned with the previous page
+    """
     try:
-        # Get status filter from query params
-        status = request.args.get('status')
-        
-        # Get meetings for the user's team
-        meetings = firebase.get_meetings_by_team_or_requester(current_user['role'], status)
+        view = request.args.get('view', 'all')
+        statuses = [s for value in request.args.getlist('status') for s in value.split(',') if s]
+        sort = request.args.get('sort', 'date_desc')
+        cursor = request.args.get('cursor')
+        try:
+            page_size = int(request.args.get('page_size', Config.MEETINGS_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'message': 'page_size must be an integer'}), 400
+        
+        if view not in ('all', 'mine', 'team'):
+            return jsonify({'message': f'Unknown view: {view}'}), 400
+        if sort not in ('date_desc', 'date_asc', 'status'):
+            return jsonify({'message': f'Unknown sort: {sort}'}), 400
+        if len(statuses) > 10:
+            return jsonify({'message': 'At most 10 statuses can be filtered on'}), 400
+        page_size = max(1, min(page_size, Config.MEETINGS_MAX_PAGE_SIZE))
+        
+        # taken before the query runs, so no change made while it runs is missed by /changes
+        watermark = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=Config.CHANGES_CLOCK_SKEW)
+        try:
+            meetings, next_cursor = firebase.query_meetings(current_user, view, statuses, sort, page_size, cursor)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
         
-        return jsonify({'meetings': meetings}), 200
+        return jsonify({
+            'meetings': meetings,
+            'next_cursor': next_cursor,
+            'watermark': format_watermark(watermark)
+        }), 200
     except Exception as e:
         print("Error getting meetings:", e)
         return jsonify({'message': 'Error getting meetings', 'error': str(e)}), 500
 
+def format_watermark(value, doc_id=None):
+    """String of a change watermark: the ISO 8601 UTC timestamp, followed by `|` and the ID
+    of the last document returned at that timestamp if there is one"""
+    timestamp = value.astimezone(datetime.timezone.utc).isoformat()
+    return timestamp if doc_id is None else f"{timestamp}|{doc_id}"
+
+def parse_watermark(value):
+    """Read a watermark sent by a client as a (datetime, ID or None) tuple,
+    raises ValueError if it does not start with an ISO 8601 date"""
+    timestamp, _, doc_id = value.partition('|')
+    watermark = datetime.datetime.fromisoformat(timestamp)
+    if watermark.tzinfo is None:
+        watermark = watermark.replace(tzinfo=datetime.timezone.utc)
+    return watermark, doc_id or None
+
+@app.route('/api/meetings/changes', methods=['GET'])
+@token_required
+def get_meeting_changes(current_user):
+    """
+    Get the meetings visible to the current user that changed after a watermark
+    
+    Query parameters:
+        since: watermark returned by GET /api/meetings or by the previous call
+        
+    Returns:
+        JSON with the changed meetings, the IDs of deleted meetings, the next watermark
+        and has_more (call again right away with the new watermark)
+    """
+    since = request.args.get('since')
+    if not since:
+        return jsonify({'message': 'since is required'}), 400
+    try:
+        since = parse_watermark(since)
+    except ValueError:
+        return jsonify({'message': f'Invalid watermark: {since}'}), 400
+    
+    try:
+        changes = firebase.get_meeting_changes(current_user, since, limit=Config.MEETINGS_MAX_PAGE_SIZE)
+        changes['watermark'] = format_watermark(*changes['watermark'])
+        return jsonify(changes), 200
+    except Exception as e:
+        print("Error getting meeting changes:", e)
+        return jsonify({'message': 'Error getting meeting changes', 'error': str(e)}), 500
+
 @app.route('/api/meetings/<meeting_id>', methods=['GET'])
 @token_required
 def get_meeting(current_user, meeting_id):
@@ -288,21 +412,17 @@ def update_meeting(current_user, meeting_id):
         if 'status' in data:
             firebase.update_meeting_status(meeting_id, data['status'])
             
-            # If status is 'canceled' or 'completed', remove from local appointments.json
+            # If status is 'canceled' or 'completed', remove from the local appointment store
             if data['status'].lower() in ['canceled', 'cancelled', 'completed']:
                 try:
-                    # Load appointments
-                    appointments = manage_appointments.load_appointments()
-                    
-                    # Delete the appointment with this meeting_id
-                    success = manage_appointments.delete_appointment(appointments, appointment_id=meeting_id)
+                    success = manage_appointments.delete_appointment(appointment_id=meeting_id)
                     
                     if success:
-                        print(f"Successfully removed canceled/completed meeting {meeting_id} from local file")
+                        print(f"Successfully removed canceled/completed meeting {meeting_id} from local store")
                     else:
-                        print(f"Meeting {meeting_id} not found in local appointments file")
+                        print(f"Meeting {meeting_id} not found in local appointment store")
                 except Exception as local_err:
-                    print(f"Warning: Could not update local appointments file: {str(local_err)}")
+                    print(f"Warning: Could not update local appointment store: {str(local_err)}")
         
         # Update meeting response
         if 'response' in data and current_user['role'] == meeting['team_agent']:
@@ -313,6 +433,32 @@ def update_meeting(current_user, meeting_id):
         print("Error updating meeting:", e)
         return jsonify({'message': 'Error updating meeting', 'error': str(e)}), 500
 
+@app.route('/api/meetings/<meeting_id>', methods=['DELETE'])
+@token_required
+def delete_meeting(current_user, meeting_id):
+    try:
+        meeting = firebase.get_meeting_by_id(meeting_id)
+        
+        if not meeting:
+            return jsonify({'message': 'Meeting not found'}), 404
+        
+        # Only the requester (or an admin) can delete a meeting
+        if meeting['requester_id'] != current_user['id'] and current_user.get('role') != 'admin':
+            return jsonify({'message': 'You do not have permission to delete this meeting'}), 403
+        
+        if not firebase.delete_meeting(meeting_id):
+            return jsonify({'message': 'Meeting not found'}), 404
+        
+        try:
+            manage_appointments.delete_appointment(appointment_id=meeting_id)
+        except Exception as local_err:
+            print(f"Warning: Could not update local appointment store: {str(local_err)}")
+        
+        return jsonify({'message': 'Meeting deleted successfully'}), 200
+    except Exception as e:
+        print("Error deleting meeting:", e)
+        return jsonify({'message': 'Error deleting meeting', 'error': str(e)}), 500
+
 # File upload routes
 @app.route('/api/upload-file', methods=['POST'])
 def upload_file():
@@ -356,12 +502,6 @@ def upload_file():
             team_agent = meeting.get('team_agent')
             print(f"[DEBUG] Found team_agent for meeting: {team_agent}")
     
-    # Save file temporarily
-    temp_dir = 'uploads'
-    os.makedirs(temp_dir, exist_ok=True)
-    filepath = os.path.join(temp_dir, secure_filename(file.filename))
-    file.save(filepath)
-    
     # Set folder path based on role and team_agent
     if is_admin:
         folder = "attachments"
@@ -378,18 +518,15 @@ def upload_file():
     print(f"[DEBUG] Uploading to folder: {folder}")
     
     try:
-        # Upload file to Firebase Storage
+        # Stream the file to Firebase Storage
         content_type = file.content_type if hasattr(file, 'content_type') else None
-        url = firebase.upload_file(
-            file_path=filepath, 
+        url = firebase.upload_stream(
+            file.stream,
             filename=secure_filename(file.filename), 
             folder=folder,
             content_type=content_type
         )
         
-        # Remove temporary file
-        os.remove(filepath)
-        
         # If this is a team upload to a meeting, add it to the meeting response files too
         if is_team and meeting_id and team_agent:
             result = firebase.add_response_file_to_meeting(
@@ -412,9 +549,6 @@ def upload_file():
         return jsonify(response_data), 200
     except Exception as e:
         print(f"[DEBUG] Error in file upload: {str(e)}")
-        # Clean up temp file if it exists
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/team-upload', methods=['POST'])
@@ -461,65 +595,65 @@ def upload_team_file():
     meeting_id = request.form.get('meeting_id')
     print(f"[DEBUG] Meeting ID: {meeting_id}")
     
-    temp_dir = 'uploads'
-    os.makedirs(temp_dir, exist_ok=True)
+    def upload_one(file):
+        filename = secure_filename(file.filename)
+        
+        # Use the user's role directly as the folder
+        folder = user_role  # Already capitalized above
+        print(f"[DEBUG] Uploading to folder: {folder} - File: {filename}")
+        
+        # Stream to Firebase Storage
+        content_type = file.content_type if hasattr(file, 'content_type') else None
+        url = firebase.upload_stream(
+            file.stream,
+            filename=filename,
+            folder=folder,
+            content_type=content_type
+        )
+        print(f"[DEBUG] File {filename} uploaded successfully. URL: {url}")
+        return filename, url
     
     # Track the results
     uploaded_files = []
     error_files = []
-    
-    # Process each file
-    for file in files:
-        if file.filename == '':
-            continue
-            
-        try:
-            # Save the file temporarily
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(temp_dir, filename)
-            file.save(filepath)
-            
-            # Use the user's role directly as the folder
-            folder = user_role  # Already capitalized above
-            print(f"[DEBUG] Uploading to folder: {folder} - File: {filename}")
-            
-            # Upload to Firebase Storage
-            content_type = file.content_type if hasattr(file, 'content_type') else None
-            url = firebase.upload_file(
-                file_path=filepath,
-                filename=filename,
-                folder=folder,
-                content_type=content_type
-            )
-            
-            # Remove temporary file
-            os.remove(filepath)
-            
-            # Add to meeting document if meeting_id is provided
-            if meeting_id:
-                file_data = {
-                    "filename": filename,
-                    "url": url,
-                    "uploaded_by": current_user.get('email'),
-                    "uploaded_at": datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-                    "team": user_role  # Use user_role as team, maintain capitalization
-                }
-                result = firebase.add_response_file_to_meeting(meeting_id, file_data)
-                print(f"[DEBUG] Added file to meeting document: {result}")
+    response_files = []
+    
+    # Upload the files in parallel, results are collected in the order the files were sent
+    files = [file for file in files if file.filename != '']
+    with ThreadPoolExecutor(max_workers=min(Config.UPLOAD_CONCURRENCY, len(files))) as pool:
+        futures = [pool.submit(upload_one, file) for file in files]
+        for file, future in zip(files, futures):
+            try:
+                filename, url = future.result()
+            except Exception as e:
+                print(f"[DEBUG] Error uploading file {file.filename}: {str(e)}")
+                error_files.append(file.filename)
+                continue
             
             uploaded_files.append({
                 "filename": filename,
                 "url": url,
                 "team": user_role
             })
-            print(f"[DEBUG] File {filename} uploaded successfully. URL: {url}")
-                
-        except Exception as e:
-            print(f"[DEBUG] Error uploading file {file.filename}: {str(e)}")
-            error_files.append(file.filename)
-            # Clean up temp file if it exists
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            response_files.append({
+                "filename": filename,
+                "url": url,
+                "uploaded_by": current_user.get('email'),
+                "uploaded_at": datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                "team": user_role  # Use user_role as team, maintain capitalization
+            })
+    
+    # Add all uploaded files to the meeting document in one write if meeting_id is provided
+    if meeting_id and response_files:
+        attached = firebase.add_response_files_to_meeting(meeting_id, response_files)
+        print(f"[DEBUG] Added {len(response_files)} files to meeting document: {attached}")
+        if not attached:
+            # The files are in storage but the meeting does not list them, so the upload is not done
+            return jsonify({
+                "error": f"Files were uploaded but could not be attached to meeting {meeting_id}",
+                "files": uploaded_files,
+                "errors": error_files
+            }), 500
     
     # Return the results
     if len(uploaded_files) > 0:
@@ -553,8 +687,9 @@ def delete_attachment(current_user, meeting_id):
         if meeting['requester_id'] != current_user['id'] and meeting['team_agent'] != current_user['role']:
             return jsonify({'message': 'You do not have permission to delete from this meeting'}), 403
         
-        # Remove the attachment from the meeting
-        firebase.remove_attachment_from_meeting(meeting_id, file_url)
+        # Remove the attachment from the meeting, the file is only deleted once it is no longer listed
+        if not firebase.remove_attachment_from_meeting(meeting_id, file_url):
+            return jsonify({'message': 'Meeting not found'}), 404
         
         # Delete the file from Firebase Storage
         firebase.delete_file(file_url)
@@ -583,6 +718,8 @@ def get_status():
             "storage_bucket": bucket_name
         },
         "upload_folder": app.config['UPLOAD_FOLDER'],
+        "blob_cache": firebase.blob_cache.stats() if firebase.blob_cache else None,
+        "user_cache": user_cache.stats(),
         "version": "1.0.0"
     }
     
@@ -640,33 +777,21 @@ def simple_upload_file():
     print(f"[DEBUG] Will upload file directly to folder: {user_role}")
     print(f"[DEBUG] File: {file.filename}, Content Type: {file.content_type if hasattr(file, 'content_type') else 'unknown'}")
     
-    # Save file temporarily
-    temp_dir = 'uploads'
-    os.makedirs(temp_dir, exist_ok=True)
-    filepath = os.path.join(temp_dir, secure_filename(file.filename))
-    file.save(filepath)
-    
     try:
-        # Upload file to Firebase Storage directly to the role folder
+        # Stream the file to Firebase Storage directly to the role folder
         content_type = file.content_type if hasattr(file, 'content_type') else None
-        url = firebase.upload_file(
-            file_path=filepath, 
+        url = firebase.upload_stream(
+            file.stream,
             filename=secure_filename(file.filename), 
             folder=user_role,  # Just the role name, nothing else
             content_type=content_type
         )
         
-        # Remove temporary file
-        os.remove(filepath)
-        
         print(f"[DEBUG] File uploaded successfully to {user_role} folder. URL: {url}")
         return jsonify({"url": url, "role": user_role}), 200
         
     except Exception as e:
         print(f"[DEBUG] Error in simple file upload: {str(e)}")
-        # Clean up temp file if it exists
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({"error": str(e)}), 500
     
 @app.route('/api/meeting/earliest', methods=['GET'])
@@ -677,6 +802,38 @@ def get_earliest_meeting():
     appointment = manage_appointments.get_earliest_meeting()
     return jsonify({"appointment": appointment})
 
+@app.route('/api/meeting/upcoming', methods=['GET'])
+def get_upcoming_meetings():
+    """
+    Get every scheduled appointment, as a long poll
+    
+    Query parameters:
+        version: version the caller already has, the request then waits for a change
+        timeout: seconds to wait for a change (at most SCHEDULE_LONG_POLL_MAX)
+        
+    Returns:
+        JSON with version and appointments, or 204 if nothing changed before the timeout
+    """
+    try:
+        version = request.args.get('version', type=int)
+        timeout = min(request.args.get('timeout', default=Config.SCHEDULE_LONG_POLL_MAX, type=float),
+                      Config.SCHEDULE_LONG_POLL_MAX)
+    except ValueError:
+        return jsonify({'message': 'version and timeout must be numbers'}), 400
+    
+    upcoming = manage_appointments.get_upcoming(version, max(timeout, 0))
+    if upcoming is None:
+        return '', 204
+    return jsonify(upcoming), 200
+
+@app.route('/api/meeting/<meeting_id>/started', methods=['POST'])
+def mark_meeting_started(meeting_id):
+    """
+    Remove a meeting the scheduler has started from the local appointment store
+    """
+    removed = manage_appointments.delete_appointment(appointment_id=meeting_id)
+    return jsonify({'meeting_id': meeting_id, 'removed': removed}), 200
+
 @app.route('/api/meeting-short-info/<meeting_id>', methods=['GET'])
 def get_meeting_short_info(meeting_id):
     """
@@ -689,7 +846,7 @@ def get_meeting_short_info(meeting_id):
 @app.route('/api/meetings/cleanup', methods=['POST'])
 def cleanup_meetings():
     """
-    Cleanup past meetings from the appointments.json file
+    Cleanup past meetings from the local appointment store
     
     Returns:
         JSON with message and count of removed appointments
@@ -717,7 +874,8 @@ def download_files():
     2. GET: Query parameters should contain one or more file_url parameters:
         /api/files/download?file_url=url1&file_url=url2&file_url=url3
     
-    Returns a ZIP file containing all the requested files
+    Returns a ZIP file containing all the requested files.
+    The archive is streamed: it starts before all files are downloaded and is never held in memory whole.
     """
     try:
         file_urls = []
@@ -742,53 +900,17 @@ def download_files():
         for i, url in enumerate(file_urls):
             print(f"  File {i+1}: {url}")
         
-        # Create a ZIP file in memory
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w') as zf:
-            # Add each file to the ZIP
-            for i, file_url in enumerate(file_urls):
-                print(f"Processing file {i+1}/{len(file_urls)}: {file_url}")
-                
-                # Download the file
-                file_content, content_type, filename = firebase.download_file_from_url(file_url)
-                
-                if file_content is None:
-                    print(f"Failed to download file: {file_url}")
-                    continue
-                    
-                # Ensure filename is unique in case of duplicates
-                if not filename or filename == '':
-                    filename = f"file_{i+1}"
-                    
-                # Add file extension if missing based on content type
-                if '.' not in filename:
-                    if content_type == 'application/pdf':
-                        filename += '.pdf'
-                    elif content_type == 'image/jpeg':
-                        filename += '.jpg'
-                    elif content_type == 'image/png':
-                        filename += '.png'
-                    elif content_type == 'text/plain':
-                        filename += '.txt'
-                    elif content_type == 'application/msword':
-                        filename += '.doc'
-                    elif content_type == 'application/vnd.ms-excel':
-                        filename += '.xls'
-                        
-                # Add the file to the ZIP
-                zf.writestr(filename, file_content)
-                print(f"Added {filename} to ZIP ({len(file_content)} bytes)")
-        
-        # Seek to the beginning of the file
-        memory_file.seek(0)
-        
-        # Send the ZIP file as a response
+        # Stream the ZIP while the files are downloaded, a few at a time
+        entries = []
+        for i, file_url in enumerate(file_urls):
+            filename = firebase.filename_from_url(file_url) or f"file_{i+1}"
+            entries.append((filename, lambda file_url=file_url: firebase.iter_file_chunks(file_url)))
+
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        return send_file(
-            memory_file,
+        return Response(
+            stream_zip(entries, prefetch=Config.DOWNLOAD_CONCURRENCY),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'files_{timestamp}.zip'
+            headers={'Content-Disposition': f'attachment; filename="files_{timestamp}.zip"'}
         )
         
     except Exception as e:
@@ -0,0 +1,191 @@
+"""
+Local disk cache for Firebase Storage objects
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+
+
+class BlobCache:
+    """
+    Copies of Storage objects kept on local disk, one file per (bucket path, generation).
+
+    - The index is a SQLite table: path -> generation, etag, size, file, last_used, validated_at
+    - Files are written to a temporary file and renamed into place, so a reader never sees a partial copy
+    - The total size is capped at `max_bytes`, least recently used files are evicted first;
+      objects larger than the whole cap are not cached at all (see `fits`)
+    - An entry validated less than `ttl` seconds ago is served without asking Storage
+    """
+
+    def __init__(self, directory, max_bytes, ttl=60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "path TEXT PRIMARY KEY, generation TEXT, etag TEXT, size INTEGER, "
+            "file TEXT, last_used REAL, validated_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs(last_used)")
+        self._conn.commit()
+
+    def lookup(self, path):
+        """
+        Get the cache entry of a blob
+
+        Args:
+            path: Blob path inside the bucket
+
+        Returns:
+            Dict with generation, etag, size, file and validated_at, or None if the blob is not cached
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generation, etag, size, file, validated_at FROM blobs WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        generation, etag, size, file, validated_at = row
+        return {'generation': generation, 'etag': etag, 'size': size,
+                'file': os.path.join(self.directory, file), 'validated_at': validated_at}
+
+    def is_fresh(self, entry):
+        """Whether an entry can be served without revalidating it"""
+        return time.time() - entry['validated_at'] < self.ttl
+
+    def touch(self, path, validated=False):
+        """
+        Record a read of a cached blob
+
+        Args:
+            path: Blob path inside the bucket
+            validated: Storage just confirmed that the cached generation is current
+        """
+        now = time.time()
+        with self._lock:
+            if validated:
+                self._conn.execute("UPDATE blobs SET last_used = ?, validated_at = ? WHERE path = ?", (now, now, path))
+                self.revalidated += 1
+            else:
+                self._conn.execute("UPDATE blobs SET last_used = ? WHERE path = ?", (now, path))
+                self.hits += 1
+            self._conn.commit()
+
+    def fits(self, size):
+        """Whether an object of `size` bytes can be cached, a larger one would be evicted as soon as it is written"""
+        return size is not None and size <= self.max_bytes
+
+    def skip(self, path):
+        """
+        Record a read served straight from Storage because the blob does not fit in the cache,
+        dropping the copy of an older generation if there is one
+
+        Args:
+            path: Blob path inside the bucket
+        """
+        self.invalidate(path)
+        with self._lock:
+            self.skipped += 1
+
+    def temp_file(self):
+        """
+        Create an empty temporary file inside the cache directory, to be filled and passed to `commit`
+
+        Returns:
+            Path of the temporary file
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        return tmp
+
+    def commit(self, path, tmp, generation, etag):
+        """
+        Move a downloaded blob into the cache, replacing the copy of an older generation
+
+        Args:
+            path: Blob path inside the bucket
+            tmp: Temporary file returned by `temp_file`, holding the complete content
+            generation: Generation of the downloaded object
+            etag: ETag of the downloaded object
+
+        Returns:
+            Path of the cached file
+        """
+        file = hashlib.sha256(f"{path}#{generation}".encode('utf-8')).hexdigest()
+        target = os.path.join(self.directory, file)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, target)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT file FROM blobs WHERE path = ?", (path,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (path, generation, etag, size, file, last_used, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, str(generation), etag, size, file, now, now)
+            )
+            self.misses += 1
+            self._evict()
+            self._conn.commit()
+        if row is not None and row[0] != file:
+            self._remove_file(row[0])
+        return target
+
+    def invalidate(self, path):
+        """Drop a blob from the cache, e.g. after it was deleted from Storage"""
+        with self._lock:
+            row = self._conn.execute("SELECT file FROM blobs WHERE path = ?", (path,)).fetchone()
+            self._conn.execute("DELETE FROM blobs WHERE path = ?", (path,))
+            self._conn.commit()
+        if row is not None:
+            self._remove_file(row[0])
+
+    def _remove_file(self, file):
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for path, file, size in self._conn.execute(
+            "SELECT path, file, size FROM blobs ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM blobs WHERE path = ?", (path,))
+            self._remove_file(file)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns:
+            Hit/miss counters and the current size of the cache
+        """
+        with self._lock:
+            items, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'skipped': self.skipped,
+                'items': items,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+            }
@@ -7,6 +7,12 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     
+    # Seconds a user profile is reused by authenticated requests before it is read again
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    # Put role and name in the JWT so requests need no user lookup at all;
+    # a role change then only applies to tokens issued after it
+    JWT_EMBED_PROFILE = os.environ.get('JWT_EMBED_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+    
     FIREBASE_STORAGE_BUCKET = os.environ.get('FIREBASE_STORAGE_BUCKET')
     FIREBASE_CREDENTIALS_JSON = os.environ.get('FIREBASE_CREDENTIALS_JSON')
     
@@ -16,6 +22,26 @@ class Config:
     
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max file size
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # multiple of 256 KB
+    UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 4))  # files of one team upload sent in parallel
+    TRANSACTION_MAX_ATTEMPTS = int(os.environ.get('TRANSACTION_MAX_ATTEMPTS', 5))  # retries of conflicting meeting updates
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'ppt', 'pptx', 'txt', 'jpg', 'jpeg', 'png'}
+    
+    MEETINGS_PAGE_SIZE = int(os.environ.get('MEETINGS_PAGE_SIZE', 50))
+    MEETINGS_MAX_PAGE_SIZE = int(os.environ.get('MEETINGS_MAX_PAGE_SIZE', 200))
+    # Watermarks handed out with a full list are moved back by this many seconds, so changes
+    # committed while the list was read are sent again rather than missed
+    CHANGES_CLOCK_SKEW = int(os.environ.get('CHANGES_CLOCK_SKEW', 5))
+    # Longest wait of a /api/meeting/upcoming long poll, keep it below the proxies' idle timeouts
+    SCHEDULE_LONG_POLL_MAX = int(os.environ.get('SCHEDULE_LONG_POLL_MAX', 55))
+
+    # Concurrent Storage downloads (ZIP streaming, download_many) and the size of the pieces files are streamed in
+    DOWNLOAD_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', 4))
+    DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 2 * 1024 * 1024))
+
+    # Local copies of downloaded Storage objects, BLOB_CACHE_MAX_BYTES=0 disables the cache
+    BLOB_CACHE_DIR = os.environ.get('BLOB_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blob_cache'))
+    BLOB_CACHE_MAX_BYTES = int(os.environ.get('BLOB_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+    BLOB_CACHE_TTL = int(os.environ.get('BLOB_CACHE_TTL', 60))  # seconds a copy is served without revalidating
 
 
@@ -3,10 +3,49 @@ Firebase configuration for database and file storage
 """
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
+from google.api_core import retry
+from google.api_core.exceptions import NotFound, NotModified, Aborted, ServiceUnavailable, DeadlineExceeded
+from requests.adapters import HTTPAdapter
+from google.cloud.firestore_v1.base_query import FieldFilter, Or, And
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
-from datetime import datetime
+import base64
+from datetime import datetime, timezone
 from config import Config
+from blob_cache import BlobCache
+
+# Retry policy of single-document writes: contention and transient server errors
+WRITE_RETRY = retry.Retry(
+    predicate=retry.if_exception_type(Aborted, ServiceUnavailable, DeadlineExceeded),
+    initial=0.2,
+    maximum=5.0,
+    timeout=30.0
+)
+
+# Order of the buckets when meetings are sorted by status
+MEETING_STATUS_ORDER = ['pending', 'accepted', 'declined', 'completed']
+# Last bucket when meetings are sorted by status: every status outside MEETING_STATUS_ORDER
+OTHER_STATUSES = '*other'
+
+
+def encode_cursor(position):
+    """Turn a page position into an opaque cursor string for the client"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Read a cursor created by encode_cursor, raises ValueError if it is malformed"""
+    if not cursor:
+        return {}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
 
 class FirebaseService:
     _instance = None
@@ -19,6 +58,7 @@ class FirebaseService:
     
     def initialize(self):
         """Initialize Firebase with service account credentials"""
+        self.blob_cache = None
         try:
             self.mock_mode = False  # Default to not using mock mode
             
@@ -147,6 +187,10 @@ class FirebaseService:
                 self.bucket.reload()
                 print("Firebase Storage bucket successfully initialized")
                 print(f"Firebase Storage bucket name: {self.bucket.name}")
+                self._configure_download_pool(Config.DOWNLOAD_CONCURRENCY)
+                if Config.BLOB_CACHE_MAX_BYTES > 0:
+                    self.blob_cache = BlobCache(Config.BLOB_CACHE_DIR, Config.BLOB_CACHE_MAX_BYTES, Config.BLOB_CACHE_TTL)
+                    print(f"Blob cache enabled: {Config.BLOB_CACHE_DIR} ({Config.BLOB_CACHE_MAX_BYTES} bytes)")
             except Exception as e:
                 print(f"ERROR: Could not access Firebase Storage bucket: {str(e)}")
                 print("Possible solutions:")
@@ -163,12 +207,14 @@ class FirebaseService:
             # Use these collection names for Firestore
             self.users_collection = 'user'  # Changed from 'users' to 'user'
             self.appointments_collection = 'appointment'
+            self.tombstones_collection = 'appointment_tombstone'  # deleted meetings, read by the changes feed
             self.filter_data_collection = 'filter_data'
             
             # Create Firestore collections references
             if self.db:
                 self.users_ref = self.db.collection(self.users_collection)
                 self.appointments_ref = self.db.collection(self.appointments_collection)
+                self.tombstones_ref = self.db.collection(self.tombstones_collection)
                 self.filter_data_ref = self.db.collection(self.filter_data_collection)
                 print(f"Firestore collections initialized: {self.users_collection}, {self.appointments_collection}")
             
@@ -187,9 +233,20 @@ class FirebaseService:
             self.appointments_collection = 'appointment'
             self.users_ref = None
             self.appointments_ref = None
+            self.tombstones_ref = None
             self.mock_mode = True
     
     # File Storage methods
+    def _unique_blob_path(self, filename, folder=None):
+        """Blob path for an uploaded file, with a timestamp added to the name to avoid collisions"""
+        unique_id = filename.split('.')[0]
+        file_ext = filename.split('.')[-1] if '.' in filename else ''
+        unique_filename = f"{unique_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_ext}" if file_ext else unique_id
+        
+        if "/" in filename:
+            return filename
+        return f"{folder}/{unique_filename}" if folder else unique_filename
+
     def upload_file(self, file_path, filename=None, folder=None, content_type=None):
         """Upload a file to Firebase Storage and return the URL"""
         print(f"Starting upload_file: file_path={file_path}, filename={filename}, folder={folder}")
@@ -203,28 +260,37 @@ class FirebaseService:
         if not filename:
             filename = os.path.basename(file_path)
         
-        # Generate a unique filename to avoid collisions
-        unique_id = filename.split('.')[0]
-        file_ext = filename.split('.')[-1] if '.' in filename else ''
-        unique_filename = f"{unique_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_ext}" if file_ext else unique_id
-        
-        if "/" in filename:
-            blob_path = filename
-        else:
-            blob_path = f"{folder}/{unique_filename}" if folder else unique_filename
-        
-        print(f"Uploading to blob path: {blob_path}")
-        
-        # Create a storage reference
-        blob = self.bucket.blob(blob_path)
-        
         with open(file_path, 'rb') as file:
-            if content_type:
-                blob.upload_from_file(file, content_type=content_type)
-            else:
-                blob.upload_from_file(file)
+            return self.upload_stream(file, filename, folder=folder, content_type=content_type)
+
+    def upload_stream(self, stream, filename, folder=None, content_type=None):
+        """
+        Upload a file-like object to Firebase Storage and return its public URL
+
+        The stream is sent as a resumable upload in chunks of Config.UPLOAD_CHUNK_SIZE, so it never has
+        to be saved to disk or held in memory whole. The object is made public by the upload request
+        itself, and a CRC32C checksum computed while sending is verified by Storage at the end.
+
+        Args:
+            stream: Readable binary stream, e.g. the `stream` of a werkzeug FileStorage
+            filename: Name of the file, a timestamp is added to it unless it is already a full path
+            folder: Folder of the blob inside the bucket
+            content_type: MIME type of the file
+
+        Returns:
+            The public URL of the uploaded file
+        """
+        blob_path = self._unique_blob_path(filename, folder)
+        print(f"Uploading to blob path: {blob_path}")
         
-        blob.make_public()
+        # Setting a chunk size makes the client use a resumable upload
+        blob = self.bucket.blob(blob_path, chunk_size=Config.UPLOAD_CHUNK_SIZE)
+        blob.upload_from_file(
+            stream,
+            content_type=content_type,
+            predefined_acl='publicRead',
+            checksum='crc32c'
+        )
         
         bucket_name = self.bucket_name
         url = f"https://storage.googleapis.com/{bucket_name}/{blob_path}"
@@ -250,6 +316,8 @@ class FirebaseService:
             # Delete the file
             blob = self.bucket.blob(path)
             blob.delete()
+            if self.blob_cache:
+                self.blob_cache.invalidate(path)
     
     def create_user(self, user_data):
         """Create a new user in Firestore
@@ -301,6 +369,40 @@ class FirebaseService:
             
         return None
     
+    def get_user_by_id(self, user_id):
+        """Get a user by the ID of its document
+        
+        Note: This is a single document read on the 'user' collection.
+        """
+        if self.mock_mode or self.db is None:
+            print("Using mock database for get_user_by_id")
+            if user_id == "mock-user-id-12345":
+                return self.get_user_by_email("test@example.com")
+            return None
+            
+        user = self.users_ref.document(user_id).get()
+        if not user.exists:
+            return None
+        user_data = user.to_dict()
+        user_data['id'] = user.id
+        return user_data
+    
+    def update_user_role(self, user_id, role):
+        """Change the role of a user
+        
+        Returns:
+            True if successful, False if the user does not exist
+        """
+        if self.mock_mode or self.db is None:
+            print(f"Using mock database for update_user_role: {user_id}")
+            return True
+            
+        try:
+            self.users_ref.document(user_id).update({'role': role}, retry=WRITE_RETRY)
+            return True
+        except NotFound:
+            return False
+    
     # Meeting methods
     def create_meeting(self, meeting_data):
         """Create a new meeting in Firestore
@@ -366,6 +468,185 @@ class FirebaseService:
             
         return list(combined.values())
     
+    def _meetings_view_query(self, user, view):
+        """Base query of a dashboard view: 'mine' (created by the user), 'team' (assigned to the
+        user's team) or 'all' (assigned to or requested by the user's team)"""
+        if view == 'mine':
+            return self.appointments_ref.where(filter=FieldFilter('requester_id', '==', user['id']))
+        if view == 'team':
+            return self.appointments_ref.where(filter=FieldFilter('team_agent', '==', user['role']))
+        return self.appointments_ref.where(filter=Or([
+            FieldFilter('team_agent', '==', user['role']),
+            FieldFilter('requester_role', '==', user['role'])
+        ]))
+
+    def _other_statuses_filter(self):
+        """Filter on the statuses outside MEETING_STATUS_ORDER, as ranges around the known ones
+        (a not-in filter cannot be combined with the Or of the 'all' view)"""
+        known = sorted(MEETING_STATUS_ORDER)
+        ranges = [FieldFilter('status', '<', known[0]), FieldFilter('status', '>', known[-1])]
+        ranges += [And([FieldFilter('status', '>', low), FieldFilter('status', '<', high)])
+                   for low, high in zip(known, known[1:])]
+        return Or(ranges)
+
+    def _meetings_page(self, query, direction, after, limit, by_status=False):
+        """Run a meetings query ordered by date, time and ID (by status first if `by_status`),
+        starting after the position `after` (the sort values of the last meeting of the previous page).
+        The position holds values rather than a document, so it stays valid if that meeting is deleted."""
+        fields = ['date', 'time']
+        if by_status:
+            fields.insert(0, 'status')
+            query = query.order_by('status')
+        query = query.order_by('date', direction=direction).order_by('time', direction=direction) \
+            .order_by('__name__', direction=direction)
+        if after:
+            try:
+                values = {field: after[field] for field in fields} | {'__name__': after['id']}
+            except (KeyError, TypeError):
+                raise ValueError("Invalid cursor")
+            query = query.start_after(values)
+        return [doc.to_dict() | {'id': doc.id} for doc in query.limit(limit).stream()]
+
+    def query_meetings(self, user, view='all', statuses=None, sort='date_desc', page_size=50, cursor=None):
+        """Get one page of the meetings visible to a user, filtered and sorted by Firestore
+        
+        Args:
+            user: Current user (needs 'id' and 'role')
+            view: 'mine', 'team' or 'all'
+            statuses: Statuses to keep, all statuses if empty
+            sort: 'date_desc', 'date_asc' or 'status' (pending, accepted, declined, completed,
+                  then any other status; newest first inside a status)
+            page_size: Maximum number of meetings returned
+            cursor: next_cursor of the previous page, None for the first page
+            
+        Returns:
+            Tuple of (meetings, next_cursor), next_cursor is None on the last page
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        position = decode_cursor(cursor)
+        if self.mock_mode or self.db is None:
+            print("Using mock database for query_meetings")
+            return [], None
+        
+        base = self._meetings_view_query(user, view)
+        # one extra document tells whether there is a next page
+        limit = page_size + 1
+        
+        if sort == 'status':
+            # each status is its own bucket, pages continue in the next bucket when one runs out
+            order = [status for status in MEETING_STATUS_ORDER if not statuses or status in statuses]
+            if statuses:
+                order += [status for status in statuses if status not in MEETING_STATUS_ORDER]
+            else:
+                order.append(OTHER_STATUSES)
+            start = position.get('status')
+            first = order.index(start) if start in order else 0
+            meetings = []
+            for status in order[first:]:
+                if status == OTHER_STATUSES:
+                    query = base.where(filter=self._other_statuses_filter())
+                else:
+                    query = base.where(filter=FieldFilter('status', '==', status))
+                after_id = position.get('after') if status == start else None
+                meetings += self._meetings_page(query, firestore.Query.DESCENDING, after_id, limit - len(meetings),
+                                                by_status=status == OTHER_STATUSES)
+                if len(meetings) >= limit:
+                    break
+        else:
+            query = base
+            if statuses:
+                query = query.where(filter=FieldFilter('status', 'in', list(statuses)))
+            direction = firestore.Query.ASCENDING if sort == 'date_asc' else firestore.Query.DESCENDING
+            meetings = self._meetings_page(query, direction, position.get('after'), limit)
+        
+        if len(meetings) < limit:
+            return meetings, None
+        meetings = meetings[:page_size]
+        last = meetings[-1]
+        next_position = {'after': {'status': last.get('status'), 'date': last.get('date'),
+                                   'time': last.get('time'), 'id': last['id']}}
+        if sort == 'status':
+            next_position['status'] = last.get('status') if last.get('status') in order else OTHER_STATUSES
+        return meetings, encode_cursor(next_position)
+
+    @staticmethod
+    def _changed_after(query, field, since):
+        """Order a query by `field` and ID and start it after the watermark `since`.
+        Documents sharing the watermark's timestamp are told apart by their ID, so a page
+        that ends in the middle of such a group is continued by the next call."""
+        since_time, since_id = since
+        query = query.order_by(field).order_by('__name__')
+        if since_id is None:
+            return query.where(filter=FieldFilter(field, '>', since_time))
+        return query.start_after({field: since_time, '__name__': since_id})
+
+    def get_meeting_changes(self, user, since, limit=200):
+        """Get the meetings visible to a user that changed after a watermark, and the ones deleted since
+        
+        Args:
+            user: Current user (needs 'role')
+            since: Watermark as a (timezone-aware datetime, document ID or None) tuple, changes with a
+                   later (updated_at/deleted_at, ID) are returned; without an ID, changes with a later
+                   timestamp are returned
+            limit: Maximum number of changed meetings returned
+            
+        Returns:
+            Dict with 'meetings' (oldest change first), 'deleted' (IDs), 'watermark' (the
+            (timestamp, ID) of the last change returned, to pass as `since` next time) and
+            'has_more' (more changes are waiting, call again with the new watermark)
+        """
+        if self.mock_mode or self.db is None:
+            print("Using mock database for get_meeting_changes")
+            return {'meetings': [], 'deleted': [], 'watermark': since, 'has_more': False}
+        
+        query = self._changed_after(self._meetings_view_query(user, 'all'), 'updated_at', since).limit(limit + 1)
+        meetings = [doc.to_dict() | {'id': doc.id} for doc in query.stream()]
+        has_more = len(meetings) > limit
+        meetings = meetings[:limit]
+        watermark = (meetings[-1]['updated_at'], meetings[-1]['id']) if meetings else since
+        
+        deleted = []
+        for doc in self._changed_after(self.tombstones_ref, 'deleted_at', since).stream():
+            tombstone = doc.to_dict()
+            position = (tombstone['deleted_at'], doc.id)
+            # with a partial page of meetings, later tombstones are sent with the next call
+            if has_more and position > watermark:
+                break
+            if user['role'] in (tombstone.get('team_agent'), tombstone.get('requester_role')):
+                deleted.append(doc.id)
+            watermark = max(watermark, position)
+        
+        return {'meetings': meetings, 'deleted': deleted, 'watermark': watermark, 'has_more': has_more}
+
+    def delete_meeting(self, meeting_id):
+        """Delete a meeting and leave a tombstone so clients syncing changes drop it too
+        
+        Returns:
+            True if the meeting was deleted, False if it does not exist
+        """
+        if self.mock_mode or self.db is None:
+            print(f"Using mock database for delete_meeting: {meeting_id}")
+            return False
+        
+        meeting_ref = self.appointments_ref.document(meeting_id)
+        meeting = meeting_ref.get()
+        if not meeting.exists:
+            return False
+        meeting_data = meeting.to_dict()
+        
+        batch = self.db.batch()
+        batch.delete(meeting_ref)
+        batch.set(self.tombstones_ref.document(meeting_id), {
+            'deleted_at': firestore.SERVER_TIMESTAMP,
+            'team_agent': meeting_data.get('team_agent'),
+            'requester_role': meeting_data.get('requester_role'),
+            'requester_id': meeting_data.get('requester_id'),
+        })
+        batch.commit(retry=WRITE_RETRY)
+        return True
+
     def get_meeting_by_id(self, meeting_id):
         """Get a meeting by ID
         
@@ -412,23 +693,169 @@ class FirebaseService:
             
         return None
     
-    def download_files(self, files_urls):
+    def _configure_download_pool(self, size):
+        """
+        Size the connection pool of the authorized session shared by all Storage calls,
+        so that `size` concurrent downloads do not queue for a connection
+        """
         try:
-            files_content = []
-            for file_url in files_urls:
-                if 'googleapis.com' in file_url:
-                    path = file_url.split(f'{Config.FIREBASE_STORAGE_BUCKET}/o/')[1].split('?')[0]
-                    path = path.replace('%2F', '/')
-
-                    blob = self.bucket.blob(path)
-                    blob.download_to_filename(file_url)
-                    files_content.append(blob)
-            return files_content
-        
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            self.bucket.client._http.mount("https://", adapter)
         except Exception as e:
-            print(f"Error downloading files: {str(e)}")
+            print(f"Could not resize the Storage connection pool: {str(e)}")
+
+    def download_files(self, files_urls):
+        """
+        Download several files from their Firebase Storage URLs
+
+        Returns:
+            List with the content of every file (None for the ones that failed), in the order of the URLs
+        """
+        return self.download_many(files_urls)
+
+    def download_many(self, file_urls, max_workers=None):
+        """
+        Download several files concurrently over the shared authorized session
+
+        Args:
+            file_urls: URLs of the files in Firebase Storage
+            max_workers: Number of concurrent downloads, defaults to Config.DOWNLOAD_CONCURRENCY
+
+        Returns:
+            List with the content of every file (None for the ones that failed), in the order of the URLs
+        """
+        if not file_urls:
+            return []
+        max_workers = max_workers or Config.DOWNLOAD_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_urls))) as pool:
+            return list(pool.map(self.get_file_content, file_urls))
+
+    def _blob_path_from_url(self, file_url):
+        """
+        Get the path of a blob inside the bucket from its URL
+
+        Args:
+            file_url: URL of the file in Firebase Storage
+
+        Returns:
+            The blob path or None if the URL format is not recognized
+        """
+        # Extract the path more reliably
+        if 'storage.googleapis.com' in file_url:
+            # Format: https://storage.googleapis.com/BUCKET_NAME/PATH
+            # Remove https://storage.googleapis.com/
+            path = '/'.join(file_url.split('/')[4:])
+            print(f"Parsed path using storage.googleapis.com format: {path}")
+        elif 'firebasestorage.googleapis.com' in file_url:
+            # Extract path from Firebase Storage URL
+            if '/o/' in file_url:
+                # Handle URL format: https://firebasestorage.googleapis.com/v0/b/BUCKET/o/PATH?...
+                path = file_url.split('/o/')[1].split('?')[0]
+                path = path.replace('%2F', '/')
+                print(f"Parsed path using firebasestorage /o/ format: {path}")
+            else:
+                # Handle direct URL format
+                parts = file_url.split('firebasestorage.googleapis.com/')
+                if len(parts) > 1:
+                    path = parts[1]
+                    if '?' in path:
+                        path = path.split('?')[0]
+                    print(f"Parsed path using firebasestorage direct format: {path}")
+                else:
+                    print(f"Could not parse path from firebasestorage URL: {file_url}")
+                    return None
+        else:
+            print(f"URL format not recognized: {file_url}")
             return None
-        
+        return path
+
+    def _fetch_blob(self, path, if_generation_not_match=None):
+        """
+        Download a blob with a single GET. The generation, etag and content type of the blob
+        are filled in from the response headers, no metadata request is made.
+
+        Args:
+            path: Blob path inside the bucket
+            if_generation_not_match: Only download if the blob generation differs from this one
+
+        Returns:
+            Tuple of (content, blob)
+
+        Raises:
+            NotFound: If the blob does not exist
+            NotModified: If the blob generation equals if_generation_not_match
+        """
+        blob = self.bucket.blob(path)
+        content = blob.download_as_bytes(if_generation_not_match=if_generation_not_match)
+        return content, blob
+
+    def _download_to_cache(self, path, blob):
+        """
+        Download a blob into the blob cache
+
+        Args:
+            path: Blob path inside the bucket
+            blob: Blob with its metadata loaded, the generation it names is downloaded
+
+        Returns:
+            Path of the local copy
+
+        Raises:
+            NotFound: If the blob (or that generation) does not exist anymore
+        """
+        tmp = self.blob_cache.temp_file()
+        try:
+            with open(tmp, 'wb') as f:
+                blob.download_to_file(f)
+        except BaseException as e:
+            os.remove(tmp)
+            if isinstance(e, NotFound):
+                self.blob_cache.invalidate(path)
+            raise
+        return self.blob_cache.commit(path, tmp, blob.generation, blob.etag)
+
+    def _open_cached_blob(self, path, retry_evicted=True):
+        """
+        Open the local copy of a blob from the blob cache, downloading or revalidating it first when needed.
+        A blob larger than the whole cache is read from Storage instead of being written to disk and evicted at once.
+
+        Args:
+            path: Blob path inside the bucket
+            retry_evicted: Download the blob again if its copy is evicted before it is opened
+
+        Returns:
+            Binary file object
+
+        Raises:
+            NotFound: If the blob does not exist
+        """
+        entry = self.blob_cache.lookup(path)
+        if entry is not None and self.blob_cache.is_fresh(entry):
+            self.blob_cache.touch(path)
+            file = entry['file']
+        else:
+            # one metadata GET revalidates an unchanged copy and gives the size before anything is downloaded
+            blob = self.bucket.get_blob(path)
+            if blob is None:
+                self.blob_cache.invalidate(path)
+                raise NotFound(f"Blob does not exist: {path}")
+            if entry is not None and entry['generation'] == str(blob.generation):
+                self.blob_cache.touch(path, validated=True)
+                file = entry['file']
+            elif not self.blob_cache.fits(blob.size):
+                self.blob_cache.skip(path)
+                return blob.open('rb', chunk_size=Config.DOWNLOAD_CHUNK_SIZE)
+            else:
+                file = self._download_to_cache(path, blob)
+        try:
+            return open(file, 'rb')
+        except FileNotFoundError:
+            # evicted by another request in the meantime
+            self.blob_cache.invalidate(path)
+            if not retry_evicted:
+                raise
+            return self._open_cached_blob(path, retry_evicted=False)
+
     def get_file_content(self, file_url):
         """
         Get the content of a file from a Firebase Storage URL
@@ -441,49 +868,23 @@ class FirebaseService:
         """
         try:
             print(f"Attempting to get file content from URL: {file_url}")
-            print(f"Current bucket name in config: {Config.FIREBASE_STORAGE_BUCKET}")
-            
-            # Extract the path more reliably
-            if 'storage.googleapis.com' in file_url:
-                # Format: https://storage.googleapis.com/BUCKET_NAME/PATH
-                # Remove https://storage.googleapis.com/
-                path = '/'.join(file_url.split('/')[4:])
-                print(f"Parsed path using storage.googleapis.com format: {path}")
-            elif 'firebasestorage.googleapis.com' in file_url:
-                # Extract path from Firebase Storage URL
-                if '/o/' in file_url:
-                    # Handle URL format: https://firebasestorage.googleapis.com/v0/b/BUCKET/o/PATH?...
-                    path = file_url.split('/o/')[1].split('?')[0]
-                    path = path.replace('%2F', '/')
-                    print(f"Parsed path using firebasestorage /o/ format: {path}")
-                else:
-                    # Handle direct URL format
-                    parts = file_url.split('firebasestorage.googleapis.com/')
-                    if len(parts) > 1:
-                        path = parts[1]
-                        if '?' in path:
-                            path = path.split('?')[0]
-                        print(f"Parsed path using firebasestorage direct format: {path}")
-                    else:
-                        print(f"Could not parse path from firebasestorage URL: {file_url}")
-                        return None
-            else:
-                print(f"URL format not recognized: {file_url}")
+            
+            path = self._blob_path_from_url(file_url)
+            if path is None:
                 return None
 
             print(f"Final extracted path: {path}")
             
-            # Get blob from bucket
-            blob = self.bucket.blob(path)
-            
-            # Check if blob exists
-            if not blob.exists():
+            # One GET: a missing blob shows up as NotFound instead of a separate exists() call
+            try:
+                if self.blob_cache:
+                    with self._open_cached_blob(path) as f:
+                        content = f.read()
+                else:
+                    content, _ = self._fetch_blob(path)
+            except NotFound:
                 print(f"Blob does not exist: {path}")
                 return None
-                
-            print(f"Blob exists, downloading content")
-            # Download file content
-            content = blob.download_as_bytes()
             print(f"Successfully downloaded {len(content)} bytes")
             return content
             
@@ -492,6 +893,46 @@ class FirebaseService:
             import traceback
             traceback.print_exc()
             return None
+
+    def iter_file_chunks(self, file_url, chunk_size=None):
+        """
+        Read a file from a Firebase Storage URL piece by piece instead of loading it whole
+
+        Args:
+            file_url: URL of the file in Firebase Storage
+            chunk_size: Bytes per chunk, defaults to Config.DOWNLOAD_CHUNK_SIZE
+
+        Yields:
+            Chunks of the file content
+
+        Raises:
+            FileNotFoundError: If the URL cannot be parsed or the blob does not exist
+        """
+        chunk_size = chunk_size or Config.DOWNLOAD_CHUNK_SIZE
+        path = self._blob_path_from_url(file_url)
+        if path is None:
+            raise FileNotFoundError(f"Not a Firebase Storage URL: {file_url}")
+        try:
+            if self.blob_cache:
+                reader = self._open_cached_blob(path)
+            else:
+                reader = self.bucket.blob(path).open('rb', chunk_size=chunk_size)
+            with reader:
+                while True:
+                    chunk = reader.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        except NotFound:
+            raise FileNotFoundError(f"Blob does not exist: {path}")
+
+    @staticmethod
+    def filename_from_url(file_url):
+        """Get the file name at the end of a storage URL, without the query string"""
+        filename = file_url.split('/')[-1]
+        if '?' in filename:
+            filename = filename.split('?')[0]
+        return filename.replace('%2F', '/').split('/')[-1]
             
     def download_file_from_url(self, file_url):
         """
@@ -566,54 +1007,117 @@ class FirebaseService:
             'updated_at': firestore.SERVER_TIMESTAMP
         })
     
-    def add_attachment_to_meeting(self, meeting_id, attachment_data):
-        """Add a file attachment to a meeting
+    # Meeting file list mutations: every add is one ArrayUnion write (the array is created if missing),
+    # a remove is one transaction because the entry has to be found by URL first
+    def _add_to_meeting_array(self, meeting_id, field, items):
+        """Append items to an array field of a meeting with a single write
+        
+        Returns:
+            True if successful, False otherwise (e.g. the meeting does not exist)
+        """
+        if not items:
+            return True
+        try:
+            self.appointments_ref.document(meeting_id).update({
+                field: firestore.ArrayUnion(list(items)),
+                'updated_at': firestore.SERVER_TIMESTAMP
+            }, retry=WRITE_RETRY)
+            return True
+        except Exception as e:
+            print(f"Error adding {len(items)} item(s) to {field} of meeting {meeting_id}: {str(e)}")
+            return False
+
+    def _remove_from_meeting_array(self, meeting_id, field, key, value):
+        """Remove the entries of an array field of a meeting whose `key` equals `value`
+        
+        The read and the write run in one transaction, which Firestore retries when
+        another write to the meeting conflicts with it.
+        
+        Returns:
+            True if the meeting exists, False otherwise
+            
+        Raises:
+            ValueError: If the transaction still conflicted after TRANSACTION_MAX_ATTEMPTS attempts
+        """
+        meeting_ref = self.appointments_ref.document(meeting_id)
+        
+        @firestore.transactional
+        def remove(transaction):
+            meeting = meeting_ref.get(transaction=transaction)
+            if not meeting.exists:
+                return False
+            items = meeting.to_dict().get(field, [])
+            kept = [item for item in items if item.get(key) != value]
+            if len(kept) != len(items):
+                transaction.update(meeting_ref, {
+                    field: kept,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                })
+            return True
+        
+        return remove(self.db.transaction(max_attempts=Config.TRANSACTION_MAX_ATTEMPTS))
+
+    def add_attachments_to_meeting(self, meeting_id, attachments_data):
+        """Add several file attachments to a meeting with a single write
         
         Note: This updates a document in the 'appointment' collection.
         """
         if self.mock_mode or self.db is None:
-            print(f"Using mock database for add_attachment_to_meeting: {meeting_id}")
+            print(f"Using mock database for add_attachments_to_meeting: {meeting_id}")
             return True
             
         # Add timestamp to attachment - use a string timestamp instead of SERVER_TIMESTAMP
-        attachment_data['uploaded_at'] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        uploaded_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        for attachment_data in attachments_data:
+            attachment_data['uploaded_at'] = uploaded_at
         
-        self.appointments_ref.document(meeting_id).update({
-            'attachments': firestore.ArrayUnion([attachment_data]),
-            'updated_at': firestore.SERVER_TIMESTAMP
-        })
-        return True
+        return self._add_to_meeting_array(meeting_id, 'attachments', attachments_data)
+    
+    def add_attachment_to_meeting(self, meeting_id, attachment_data):
+        """Add a file attachment to a meeting
+        
+        Note: This updates a document in the 'appointment' collection.
+        """
+        return self.add_attachments_to_meeting(meeting_id, [attachment_data])
     
     def remove_attachment_from_meeting(self, meeting_id, file_url):
         """Remove a file attachment from a meeting
         
         Note: This updates a document in the 'appointment' collection.
-        This requires getting the meeting, modifying the attachments list,
-        and updating the document since ArrayRemove requires the exact object.
+        ArrayRemove requires the exact object, so the attachment is looked up by URL
+        and the list rewritten inside a transaction.
+        
+        Returns:
+            True if the meeting exists, False otherwise
+            
+        Raises:
+            ValueError: If the transaction still conflicted after TRANSACTION_MAX_ATTEMPTS attempts
         """
         if self.mock_mode or self.db is None:
             print(f"Using mock database for remove_attachment_from_meeting: {meeting_id}")
             return True
             
-        # Get the meeting
-        meeting_ref = self.appointments_ref.document(meeting_id)
-        meeting = meeting_ref.get()
+        return self._remove_from_meeting_array(meeting_id, 'attachments', 'file_url', file_url)
         
-        if meeting.exists:
-            meeting_data = meeting.to_dict()
-            attachments = meeting_data.get('attachments', [])
-            
-            # Find and remove the attachment with the matching URL
-            updated_attachments = [a for a in attachments if a.get('file_url') != file_url]
+    def add_response_files_to_meeting(self, meeting_id, files_data):
+        """Add several response files to a meeting with a single write
+        
+        ArrayUnion creates the 'response_files' array if it does not exist yet,
+        so no read of the meeting document is needed.
+        
+        Args:
+            meeting_id: The ID of the meeting to add the files to
+            files_data: List of dictionaries containing file metadata
             
-            # Update the meeting document
-            meeting_ref.update({
-                'attachments': updated_attachments,
-                'updated_at': firestore.SERVER_TIMESTAMP
-            })
+        Returns:
+            True if successful, False otherwise (e.g. the meeting does not exist)
+        """
+        if self.mock_mode or self.db is None:
+            print(f"Using mock database for add_response_files_to_meeting: {meeting_id}")
+            return True
             
-        return True
-        
+        return self._add_to_meeting_array(meeting_id, 'response_files', files_data)
+
     def add_response_file_to_meeting(self, meeting_id, file_data):
         """Add a response file to a meeting
         
@@ -627,33 +1131,20 @@ class FirebaseService:
         Returns:
             True if successful, False otherwise
         """
+        return self.add_response_files_to_meeting(meeting_id, [file_data])
+
+    def remove_response_file_from_meeting(self, meeting_id, file_url):
+        """Remove a response file from a meeting
+        
+        Args:
+            meeting_id: The ID of the meeting
+            file_url: URL of the response file to remove
+            
+        Returns:
+            True if the meeting exists, False otherwise
+        """
         if self.mock_mode or self.db is None:
-            print(f"Using mock database for add_response_file_to_meeting: {meeting_id}")
+            print(f"Using mock database for remove_response_file_from_meeting: {meeting_id}")
             return True
             
-        try:
-            # Get the meeting document
-            meeting_ref = self.appointments_ref.document(meeting_id)
-            meeting = meeting_ref.get()
-            
-            if not meeting.exists:
-                print(f"Meeting {meeting_id} not found")
-                return False
-                
-            # Initialize response_files array if it doesn't exist
-            meeting_data = meeting.to_dict()
-            if 'response_files' not in meeting_data:
-                meeting_ref.update({
-                    'response_files': []
-                })
-            
-            # Add the response file to the response_files array
-            meeting_ref.update({
-                'response_files': firestore.ArrayUnion([file_data]),
-                'updated_at': firestore.SERVER_TIMESTAMP
-            })
-            
-            return True
-        except Exception as e:
-            print(f"Error adding response file to meeting: {str(e)}")
-            return False 
\ No newline at end of file
+        return self._remove_from_meeting_array(meeting_id, 'response_files', 'url', file_url)
@@ -3,61 +3,267 @@
 Appointment Management Utility
 
 This script provides direct access to view, add, and delete appointments
-in the appointments.json file.
+in the local appointment store (appointments.sqlite3). The Flask app uses
+the same store, SQLite takes care of concurrent access between processes.
 """
 
 import argparse
 import json
 import sys
 import os
+import time
+import sqlite3
+import threading
 from datetime import datetime
-from collections import OrderedDict
 
-# Path to the appointments JSON file
-APPOINTMENTS_FILE = "appointments.json"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def load_appointments():
-    """Load appointments from the JSON file"""
-    if not os.path.exists(APPOINTMENTS_FILE):
-        print(f"Appointments file not found: {APPOINTMENTS_FILE}")
-        return OrderedDict()
-        
+# Path to the appointment store
+APPOINTMENTS_DB = os.environ.get('APPOINTMENTS_DB', os.path.join(BASE_DIR, "appointments.sqlite3"))
+
+# Path to the legacy JSON file, imported once into an empty store
+APPOINTMENTS_FILE = os.path.join(BASE_DIR, "appointments.json")
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class AppointmentStore:
+    """
+    Appointments kept in a SQLite database in WAL mode.
+
+    - Rows are (appointment_id, starts_at), the ID is the primary key so lookups and deletes by ID use its index
+    - starts_at is a "YYYY-MM-DD HH:MM" string with its own index, so the earliest appointment
+      and past appointments are found without scanning the table
+    - Several appointments can share a time slot, adding an existing ID moves it to the new time
+    - Every change is one transaction, readers in other processes never see a partial write
+    - Every change also bumps a version number, so watchers can tell when to reload the schedule
+    """
+
+    def __init__(self, path, legacy_file=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS appointments ("
+                "appointment_id TEXT PRIMARY KEY, starts_at TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS appointments_starts_at ON appointments(starts_at, appointment_id)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self._changed = threading.Condition(self._lock)
+        if legacy_file:
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file):
+        """Copy the entries of appointments.json into the store the first time it is opened"""
+        with self._lock, self._conn:
+            # user_version marks a store that already went through the import
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+            imported = 0
+            if os.path.exists(legacy_file):
+                try:
+                    with open(legacy_file, 'r') as f:
+                        data = json.load(f)
+                    for date_time, appointment_id in data.items():
+                        if _valid_datetime(date_time):
+                            self._conn.execute(
+                                "INSERT OR REPLACE INTO appointments (appointment_id, starts_at) VALUES (?, ?)",
+                                (appointment_id, date_time)
+                            )
+                            imported += 1
+                except Exception as e:
+                    print(f"Error importing {legacy_file}: {str(e)}")
+            self._conn.execute("PRAGMA user_version = 1")
+            if imported:
+                self._bump()
+        if imported:
+            print(f"Imported {imported} appointments from {legacy_file}")
+
+    def _bump(self):
+        """Increase the version inside the current write transaction and wake up the watchers"""
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self._changed.notify_all()
+
+    def _version(self):
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def version(self):
+        """Version of the store, changes with every add or delete"""
+        with self._lock:
+            return self._version()
+
+    def snapshot(self):
+        """
+        Returns:
+            (version, list of (datetime, appointment_id) earliest first), read in one transaction
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            rows = self._conn.execute(
+                "SELECT starts_at, appointment_id FROM appointments ORDER BY starts_at, appointment_id"
+            ).fetchall()
+            return self._version(), rows
+
+    def wait_for_change(self, version, timeout):
+        """
+        Block until the version differs from `version` or `timeout` seconds have passed.
+        Writes from this process wake the waiters right away, writes from other
+        processes (e.g. the CLI) are noticed within a second.
+
+        Returns:
+            The current version
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            current = self._version()
+            while current == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(min(remaining, 1.0))
+                current = self._version()
+            return current
+
+    def add(self, date_time, appointment_id):
+        """
+        Add an appointment, or move it if its ID is already scheduled
+
+        Args:
+            date_time: "YYYY-MM-DD HH:MM"
+            appointment_id: ID of the meeting
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO appointments (appointment_id, starts_at) VALUES (?, ?)",
+                (appointment_id, date_time)
+            )
+            self._bump()
+
+    def get(self, appointment_id):
+        """
+        Returns:
+            The "YYYY-MM-DD HH:MM" of an appointment, or None if it is not scheduled
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT starts_at FROM appointments WHERE appointment_id = ?", (appointment_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete_by_id(self, appointment_id):
+        """
+        Returns:
+            The "YYYY-MM-DD HH:MM" of the deleted appointment, or None if it was not scheduled
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "DELETE FROM appointments WHERE appointment_id = ? RETURNING starts_at", (appointment_id,)
+            ).fetchone()
+            if row:
+                self._bump()
+        return row[0] if row else None
+
+    def delete_at(self, date_time):
+        """
+        Returns:
+            IDs of the deleted appointments scheduled at that time
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "DELETE FROM appointments WHERE starts_at = ? RETURNING appointment_id", (date_time,)
+            ).fetchall()
+            if rows:
+                self._bump()
+        return [row[0] for row in rows]
+
+    def delete_before(self, date_time):
+        """
+        Args:
+            date_time: "YYYY-MM-DD HH:MM:SS", appointments starting before it are deleted
+
+        Returns:
+            Number of deleted appointments
+        """
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM appointments WHERE starts_at < ?", (date_time,)).rowcount
+            if removed:
+                self._bump()
+            return removed
+
+    def earliest(self):
+        """
+        Returns:
+            (datetime, appointment_id) of the first appointment, or None if there are none
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT starts_at, appointment_id FROM appointments ORDER BY starts_at, appointment_id LIMIT 1"
+            ).fetchone()
+
+    def all(self):
+        """
+        Returns:
+            List of (datetime, appointment_id), earliest first
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT starts_at, appointment_id FROM appointments ORDER BY starts_at, appointment_id"
+            ).fetchall()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The appointment store shared by the whole process, opened on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AppointmentStore(APPOINTMENTS_DB, legacy_file=APPOINTMENTS_FILE)
+        return _store
+
+
+def _valid_datetime(date_time):
     try:
-        with open(APPOINTMENTS_FILE, 'r') as f:
-            data = json.load(f)
-            # Convert to OrderedDict and sort
-            appointments = OrderedDict(sorted(data.items()))
-            return appointments
-    except Exception as e:
-        print(f"Error loading appointments: {str(e)}")
-        return OrderedDict()
+        datetime.strptime(date_time, DATETIME_FORMAT)
+        return True
+    except (TypeError, ValueError):
+        return False
 
-def save_appointments(appointments):
-    """Save appointments to the JSON file"""
+
+def load_appointments():
+    """Load all appointments, earliest first, as a list of (datetime, appointment_id)"""
     try:
-        with open(APPOINTMENTS_FILE, 'w') as f:
-            json.dump(dict(appointments), f, indent=4)
-        print(f"Successfully saved {len(appointments)} appointments to {APPOINTMENTS_FILE}")
+        return get_store().all()
     except Exception as e:
-        print(f"Error saving appointments: {str(e)}")
+        print(f"Error loading appointments: {str(e)}")
+        return []
 
 def display_appointments(appointments):
     """Display all appointments in a readable format"""
     if not appointments:
         print("No appointments found.")
         return
-        
+
     print(f"\nFound {len(appointments)} appointments:")
     print("-" * 50)
     print(f"{'DATETIME':<20} | {'APPOINTMENT ID'}")
     print("-" * 50)
-    
-    for date_time, appointment_id in appointments.items():
+
+    for date_time, appointment_id in appointments:
         print(f"{date_time:<20} | {appointment_id}")
-    
+
     print("-" * 50)
 
-def add_appointment(appointments, date, time, appointment_id):
+def add_appointment(date, time, appointment_id):
     """Add a new appointment"""
     # Validate date format
     try:
@@ -65,90 +271,54 @@ def add_appointment(appointments, date, time, appointment_id):
     except ValueError:
         print("Error: Date must be in YYYY-MM-DD format")
         return False
-        
+
     # Validate time format
     try:
         datetime.strptime(time, "%H:%M")
     except ValueError:
         print("Error: Time must be in HH:MM format")
         return False
-    
-    # Create key
+
     key = f"{date} {time}"
-    
-    # Add to dictionary
-    appointments[key] = appointment_id
-    
-    # Sort
-    sorted_appointments = OrderedDict(sorted(appointments.items()))
-    
-    # Save
-    save_appointments(sorted_appointments)
+    get_store().add(key, appointment_id)
     print(f"Added appointment {appointment_id} at {key}")
     return True
 
-def delete_appointment(appointments, date_time=None, appointment_id=None):
-    """Delete an appointment by datetime or ID"""
-    if not appointments:
-        print("No appointments to delete.")
-        return False
-        
-    if date_time and date_time in appointments:
-        removed_id = appointments.pop(date_time)
-        save_appointments(appointments)
-        print(f"Deleted appointment at {date_time} with ID {removed_id}")
-        return True
-        
+def delete_appointment(date_time=None, appointment_id=None):
+    """Delete an appointment by ID, or every appointment at a datetime"""
+    store = get_store()
+
     if appointment_id:
-        for dt, aid in list(appointments.items()):
-            if aid == appointment_id:
-                del appointments[dt]
-                save_appointments(appointments)
-                print(f"Deleted appointment with ID {appointment_id} at {dt}")
-                return True
-    
+        removed_at = store.delete_by_id(appointment_id)
+        if removed_at:
+            print(f"Deleted appointment with ID {appointment_id} at {removed_at}")
+            return True
+
+    if date_time:
+        removed_ids = store.delete_at(date_time)
+        if removed_ids:
+            print(f"Deleted appointment at {date_time} with ID {', '.join(removed_ids)}")
+            return True
+
     print("Appointment not found.")
     return False
 
-def cleanup_past(appointments=None):
+def cleanup_past():
     """
     Remove all past appointments
-    
-    Args:
-        appointments: Optional appointments dictionary. If None, will load from file.
-    
+
     Returns:
         int: Number of appointments removed
     """
-    # If no appointments provided, load them from file
-    if appointments is None:
-        appointments = load_appointments()
-    
-    now = datetime.now()
-    current_date_time = now.strftime("%Y-%m-%d %H:%M")
-    
-    # Find keys to remove
-    to_remove = []
-    for date_time in appointments:
-        try:
-            dt = datetime.strptime(date_time, "%Y-%m-%d %H:%M")
-            if dt < now:
-                to_remove.append(date_time)
-        except ValueError:
-            # Invalid format, should be removed
-            to_remove.append(date_time)
-    
-    # Remove the keys
-    for key in to_remove:
-        del appointments[key]
-    
-    if to_remove:
-        save_appointments(appointments)
-        print(f"Removed {len(to_remove)} past appointments")
+    # an appointment is past once its minute has started, like the "YYYY-MM-DD HH:MM" < now comparison did
+    removed = get_store().delete_before(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    if removed:
+        print(f"Removed {removed} past appointments")
     else:
         print("No past appointments to remove")
-    
-    return len(to_remove)
+
+    return removed
 
 # Alias for cleanup_past for backward compatibility
 def cleanup_meetings():
@@ -158,78 +328,87 @@ def cleanup_meetings():
 def get_earliest_meeting():
     """
     Get the earliest upcoming meeting
-    
+
     Returns:
         dict: Dictionary with datetime and appointment_id, or None if no appointments
     """
-    # Load appointments and clean up past ones
-    # cleanup_past()  # This will automatically load, clean up, and save appointments
-    
-    # Now load the cleaned appointments
-    appointments = load_appointments()
-    
+    earliest = get_store().earliest()
+
     # If no appointments, return None
-    if not appointments:
+    if earliest is None:
         return None
-        
-    # Get the first item (earliest by date since it's sorted)
-    earliest_datetime, appointment_id = next(iter(appointments.items()))
-    
+
+    earliest_datetime, appointment_id = earliest
+
     return {
         'datetime': earliest_datetime,
         'appointment_id': appointment_id
     }
 
+def get_upcoming(version=None, timeout=0):
+    """
+    Get every scheduled appointment, waiting up to `timeout` seconds for a change first
+    if the caller already has `version`
+
+    Returns:
+        dict: version and appointments (list of dicts with datetime and appointment_id),
+              or None if nothing changed before the timeout
+    """
+    store = get_store()
+    if version is not None and store.wait_for_change(version, timeout) == version:
+        return None
+    version, rows = store.snapshot()
+    return {
+        'version': version,
+        'appointments': [{'datetime': date_time, 'appointment_id': appointment_id} for date_time, appointment_id in rows]
+    }
+
 def main():
     parser = argparse.ArgumentParser(description='Manage appointments')
     subparsers = parser.add_subparsers(dest='command', help='Command to execute')
-    
+
     # List command
     list_parser = subparsers.add_parser('list', help='List all appointments')
-    
+
     # Add command
     add_parser = subparsers.add_parser('add', help='Add a new appointment')
     add_parser.add_argument('--date', required=True, help='Date in YYYY-MM-DD format')
     add_parser.add_argument('--time', required=True, help='Time in HH:MM format')
     add_parser.add_argument('--id', required=True, help='Appointment ID')
-    
+
+    # Earliest command
+    earliest_parser = subparsers.add_parser('earliest', help='Show the earliest appointment')
+
     # Delete command
     delete_parser = subparsers.add_parser('delete', help='Delete an appointment')
     delete_parser.add_argument('--datetime', help='Datetime in "YYYY-MM-DD HH:MM" format')
     delete_parser.add_argument('--id', help='Appointment ID')
-    
+
     # Cleanup command
     cleanup_parser = subparsers.add_parser('cleanup', help='Remove past appointments')
-    
+
     args = parser.parse_args()
-    
+
     if args.command == 'list' or args.command is None:
-        # Load appointments and display them
         appointments = load_appointments()
         display_appointments(appointments)
-    
+
     elif args.command == 'add':
-        # Load appointments and add a new one
-        appointments = load_appointments()
-        add_appointment(appointments, args.date, args.time, args.id)
+        add_appointment(args.date, args.time, args.id)
 
     elif args.command == 'earliest':
-        # Get the earliest meeting (cleanup is handled inside this function)
         earliest_meeting = get_earliest_meeting()
         print(earliest_meeting)
-    
+
     elif args.command == 'delete':
-        # Load appointments and delete one
         if not args.datetime and not args.id:
             print("Error: You must specify either --datetime or --id")
             return
-        appointments = load_appointments()
-        delete_appointment(appointments, args.datetime, args.id)
+        delete_appointment(args.datetime, args.id)
 
     elif args.command == 'cleanup':
-        # Call cleanup_past without arguments - it will handle loading and saving
         removed = cleanup_past()
         print(f"Cleaned up {removed} past appointments")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
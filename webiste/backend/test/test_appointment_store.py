@@ -0,0 +1,115 @@
+"""
+Tests for the SQLite appointment store, run with: python -m pytest test/test_appointment_store.py
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manage_appointments
+from manage_appointments import AppointmentStore
+
+
+def test_add_move_and_delete(tmp_path):
+    store = AppointmentStore(str(tmp_path / "a.sqlite3"))
+    store.add("2025-05-02 10:00", "m2")
+    store.add("2025-05-01 09:00", "m1")
+    store.add("2025-05-01 09:00", "m3")
+    assert store.all() == [("2025-05-01 09:00", "m1"), ("2025-05-01 09:00", "m3"), ("2025-05-02 10:00", "m2")]
+    assert store.earliest() == ("2025-05-01 09:00", "m1")
+
+    # adding an existing ID moves it
+    store.add("2025-05-03 08:00", "m1")
+    assert store.get("m1") == "2025-05-03 08:00"
+    assert len(store.all()) == 3
+
+    assert store.delete_by_id("m1") == "2025-05-03 08:00"
+    assert store.delete_by_id("m1") is None
+    assert store.delete_at("2025-05-01 09:00") == ["m3"]
+    # an appointment is past once its minute has started
+    assert store.delete_before("2025-05-02 09:59:59") == 0
+    assert store.delete_before("2025-05-02 10:00:00") == 1
+    assert store.earliest() is None
+
+
+def test_version_changes_only_on_writes(tmp_path):
+    store = AppointmentStore(str(tmp_path / "a.sqlite3"))
+    assert store.version() == 0
+    store.add("2025-05-01 09:00", "m1")
+    assert store.version() == 1
+    # deletes that remove nothing keep the version
+    store.delete_by_id("missing")
+    store.delete_at("2025-01-01 00:00")
+    store.delete_before("2000-01-01 00:00:00")
+    assert store.version() == 1
+    store.delete_by_id("m1")
+    assert store.version() == 2
+
+    version, rows = store.snapshot()
+    assert (version, rows) == (2, [])
+
+
+def test_wait_for_change_times_out_without_writes(tmp_path):
+    store = AppointmentStore(str(tmp_path / "a.sqlite3"))
+    started = time.monotonic()
+    assert store.wait_for_change(0, 0.2) == 0
+    assert time.monotonic() - started >= 0.2
+    # a stale version returns at once
+    store.add("2025-05-01 09:00", "m1")
+    assert store.wait_for_change(0, 5) == 1
+
+
+def test_wait_for_change_is_woken_by_a_write(tmp_path):
+    store = AppointmentStore(str(tmp_path / "a.sqlite3"))
+    writer = threading.Timer(0.1, store.add, ("2025-05-01 09:00", "m1"))
+    started = time.monotonic()
+    writer.start()
+    assert store.wait_for_change(0, 5) == 1
+    # woken by the notification, not by the once a second poll
+    assert time.monotonic() - started < 0.9
+    writer.join()
+
+
+def test_wait_for_change_sees_other_processes(tmp_path):
+    path = str(tmp_path / "a.sqlite3")
+    store = AppointmentStore(path)
+    # a second connection stands in for the CLI running in another process
+    other = AppointmentStore(path)
+    writer = threading.Timer(0.1, other.add, ("2025-05-01 09:00", "m1"))
+    writer.start()
+    assert store.wait_for_change(0, 5) == 1
+    assert store.get("m1") == "2025-05-01 09:00"
+    writer.join()
+
+
+def test_legacy_file_is_imported_once(tmp_path):
+    legacy = tmp_path / "appointments.json"
+    legacy.write_text(json.dumps({"2025-05-01 09:00": "m1", "not a date": "m2"}))
+    path = str(tmp_path / "a.sqlite3")
+
+    store = AppointmentStore(path, legacy_file=str(legacy))
+    assert store.all() == [("2025-05-01 09:00", "m1")]
+    assert store.version() == 1
+
+    store.delete_by_id("m1")
+    # the JSON file is not read again once the store was initialised from it
+    store = AppointmentStore(path, legacy_file=str(legacy))
+    assert store.all() == []
+
+
+def test_get_upcoming_long_poll(tmp_path, monkeypatch):
+    monkeypatch.setattr(manage_appointments, "_store", AppointmentStore(str(tmp_path / "a.sqlite3")))
+    manage_appointments.get_store().add("2025-05-01 09:00", "m1")
+
+    upcoming = manage_appointments.get_upcoming()
+    assert upcoming == {'version': 1, 'appointments': [{'datetime': "2025-05-01 09:00", 'appointment_id': "m1"}]}
+    # nothing changed before the timeout
+    assert manage_appointments.get_upcoming(version=1, timeout=0.1) is None
+
+    writer = threading.Timer(0.1, manage_appointments.get_store().delete_by_id, ("m1",))
+    writer.start()
+    assert manage_appointments.get_upcoming(version=1, timeout=5) == {'version': 2, 'appointments': []}
+    writer.join()
@@ -0,0 +1,80 @@
+"""
+In-memory cache of user profiles for authenticated requests
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class UserCache:
+    """
+    User profiles keyed by user ID, each entry expires `ttl` seconds after it was loaded.
+    At most `max_items` profiles are kept, least recently used ones are dropped first.
+    """
+
+    def __init__(self, ttl=300, max_items=10000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """
+        Args:
+            user_id: ID of the user document
+
+        Returns:
+            The cached profile, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._users.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user):
+        """
+        Args:
+            user: User profile, must contain its 'id'
+        """
+        with self._lock:
+            self._users[user['id']] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(user['id'])
+            while len(self._users) > self.max_items:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id=None, email=None):
+        """
+        Drop the profile of a user, e.g. after its role changed
+
+        Args:
+            user_id: ID of the user document
+            email: Email of the user, for callers that do not know the ID
+        """
+        with self._lock:
+            for key in [key for key, (_, user) in self._users.items()
+                        if key == user_id or (email is not None and user.get('email') == email)]:
+                del self._users[key]
+                self.invalidations += 1
+
+    def stats(self):
+        """
+        Returns:
+            Hit/miss counters and the number of cached profiles
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'items': len(self._users),
+            }
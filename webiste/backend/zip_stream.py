@@ -0,0 +1,123 @@
+"""
+Streaming ZIP archives for multi-file downloads
+"""
+import io
+import queue
+import zipfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Formats that are already compressed are stored as is, deflating them only costs CPU
+STORED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'zip', 'docx', 'pptx', 'xlsx', 'mp3', 'mp4'}
+
+_END = object()
+
+
+class _ZipBuffer(io.RawIOBase):
+    """Unseekable sink for ZipFile, the written bytes are taken out with drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _put(q, item, cancelled):
+    while not cancelled.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _prefetch(open_chunks, q, cancelled):
+    """Download one entry into its queue, ends with _END or the exception that stopped it"""
+    try:
+        for chunk in open_chunks():
+            if not _put(q, chunk, cancelled):
+                return
+        item = _END
+    except Exception as e:
+        item = e
+    _put(q, item, cancelled)
+
+
+def _unique_name(name, used):
+    candidate, n = name, 1
+    while candidate in used:
+        stem, dot, ext = name.rpartition('.')
+        candidate = f"{stem}_{n}.{ext}" if dot else f"{name}_{n}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def stream_zip(entries, prefetch=4, queue_chunks=4):
+    """
+    Generate a ZIP archive piece by piece, so the first bytes go out before the files are downloaded
+
+    Args:
+        entries: List of (filename, open_chunks) where open_chunks() returns an iterator of bytes
+        prefetch: Number of entries downloaded concurrently ahead of the one being written
+        queue_chunks: Chunks buffered per entry, bounds the memory to prefetch * queue_chunks chunks
+
+    Yields:
+        Bytes of the archive
+
+    Entries that fail before their first chunk are left out of the archive.
+    """
+    buffer = _ZipBuffer()
+    cancelled = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max(1, prefetch))
+    # entries start in order, so the one being written always has a worker
+    queues = []
+    for _, open_chunks in entries:
+        q = queue.Queue(maxsize=queue_chunks)
+        pool.submit(_prefetch, open_chunks, q, cancelled)
+        queues.append(q)
+
+    used = set()
+    try:
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            for (filename, _), q in zip(entries, queues):
+                item = q.get()
+                if isinstance(item, Exception):
+                    print(f"Failed to download file {filename}: {item}")
+                    continue
+
+                zinfo = zipfile.ZipInfo(_unique_name(filename, used), date_time=datetime.now().timetuple()[:6])
+                extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+                zinfo.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                size = 0
+                with zf.open(zinfo, 'w') as f:
+                    while item is not _END:
+                        if isinstance(item, Exception):
+                            # the entry header is already sent, the archive cannot be completed
+                            raise item
+                        f.write(item)
+                        size += len(item)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                        item = q.get()
+                print(f"Added {zinfo.filename} to ZIP ({size} bytes)")
+                yield buffer.drain()
+        # central directory
+        yield buffer.drain()
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -6,7 +6,11 @@ import requests
 import json
 from datetime import datetime
 import pandas as pd
-from utils.common import API_BASE_URL
+from utils.common import API_BASE_URL, get_meetings_store, fetch_next_page, mark_meetings_stale
+
+VIEW_MODES = {"My Requests": "mine", "Other Team Requests": "team", "All Requests": "all"}
+SORT_KEYS = {"Date (newest first)": "date_desc", "Date (oldest first)": "date_asc", "Status": "status"}
+PAGE_SIZE = 50
 
 def show_dashboard_page():
     """
@@ -55,25 +59,22 @@ def show_dashboard_page():
         hide_test_users = st.checkbox("Hide Test Users", value=True, 
                                     help="Filter out requests from users with 'test' in their name or email")
         
-        if st.button("🔄 Refresh Data", use_container_width=True):
-            st.rerun()
+        refresh = st.button("🔄 Refresh Data", use_container_width=True)
     
-    # Main content area
-    meetings = fetch_meetings(user_role)
-    
-    if not meetings:
-        st.warning("No meeting requests found.")
-        return
-    
-    # Filter meetings based on view mode, status, and test users
-    filtered_meetings = filter_meetings(meetings, user_role, user_id, view_mode, status_filter, hide_test_users)
-    
-    if not filtered_meetings:
+    # Main content area: view mode, status and sort are applied by the API, one page at a time
+    params = {
+        "view": VIEW_MODES[view_mode],
+        "status": status_filter,
+        "sort": SORT_KEYS[sort_by],
+        "page_size": PAGE_SIZE,
+    }
+    store = get_meetings_store("dashboard", params, refresh=refresh)
+    if not store["meetings"] and store["next_cursor"] is None:
         st.info("No meeting requests match your filter criteria.")
         return
     
-    # Sort meetings
-    sorted_meetings = sort_meetings(filtered_meetings, sort_by)
+    # Test users are not a stored attribute, they are still filtered here
+    sorted_meetings = filter_meetings(store["meetings"], hide_test_users)
     
     # Display meetings summary
     display_meetings_summary(sorted_meetings)
@@ -91,69 +92,27 @@ def show_dashboard_page():
     # Display meetings using pure Streamlit components
     for meeting in sorted_meetings:
         display_meeting_card_pure_streamlit(meeting, user_role)
+    
+    if store["next_cursor"]:
+        if st.button("Load more", use_container_width=True):
+            fetch_next_page(store)
+            st.rerun()
 
-def fetch_meetings(user_role):
-    """Fetch meetings from the API"""
-    try:
-        response = requests.get(
-            f"{API_BASE_URL}/meetings",
-            headers={"Authorization": f"Bearer {st.session_state.token}"}
-        )
-        
-        if response.status_code == 200:
-            return response.json().get('meetings', [])
-        else:
-            st.error(f"Error fetching meetings: {response.json().get('message', 'Unknown error')}")
-            return []
-            
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-        return []
-
-def filter_meetings(meetings, user_role, user_id, view_mode, status_filter, hide_test_users=True):
-    """Filter meetings based on view mode, status, and hide test users option"""
-    filtered = []
+def filter_meetings(meetings, hide_test_users=True):
+    """Filter out requests from test users"""
+    if not hide_test_users:
+        return meetings
     
+    filtered = []
     for meeting in meetings:
-        # Skip test users if enabled
-        if hide_test_users:
-            requester_name = meeting.get('requester_name', '').lower()
-            requester_email = meeting.get('requester_email', '').lower()
-            if 'test' in requester_name or 'test' in requester_email:
-                continue
-        
-        # Get meeting properties for filtering
-        is_my_request = meeting.get('requester_id') == user_id
-        is_for_my_team = meeting.get('team_agent') == user_role
-        
-        # Filter by view mode
-        if view_mode == "My Requests" and not is_my_request:
-            continue
-        elif view_mode == "Other Team Requests" and not is_for_my_team:
+        requester_name = meeting.get('requester_name', '').lower()
+        requester_email = meeting.get('requester_email', '').lower()
+        if 'test' in requester_name or 'test' in requester_email:
             continue
-        # If view_mode is "All Requests", include everything
-            
-        # Filter by status
-        if status_filter and meeting.get('status') not in status_filter:
-            continue
-            
         filtered.append(meeting)
     
     return filtered
 
-def sort_meetings(meetings, sort_by):
-    """Sort meetings based on the selected criteria"""
-    if sort_by == "Date (newest first)":
-        return sorted(meetings, key=lambda m: m.get('date', ''), reverse=True)
-    elif sort_by == "Date (oldest first)":
-        return sorted(meetings, key=lambda m: m.get('date', ''))
-    elif sort_by == "Status":
-        # Custom status order: pending, accepted, declined, completed
-        status_order = {"pending": 0, "accepted": 1, "declined": 2, "completed": 3}
-        return sorted(meetings, key=lambda m: status_order.get(m.get('status', 'pending'), 99))
-    
-    return meetings
-
 def display_meetings_summary(meetings):
     """Display a summary of meetings"""
     # Count meetings by status
@@ -291,6 +250,8 @@ def update_meeting_status(meeting_id, status):
         
         if response.status_code != 200:
             st.error(f"Error updating meeting: {response.json().get('message', 'Unknown error')}")
+        else:
+            mark_meetings_stale()
     
     except Exception as e:
         st.error(f"Error: {str(e)}")
@@ -1,9 +1,11 @@
 import streamlit as st
 import requests
 import os
-from utils.common import API_BASE_URL, MAX_FILE_SIZE_MB
+from utils.common import API_BASE_URL, MAX_FILE_SIZE_MB, get_meetings_store, fetch_next_page, mark_meetings_stale
 import time
 
+PAGE_SIZE = 50
+
 # Define file types to be uploaded
 ALLOWED_FILE_TYPES = ['pdf', 'doc', 'docx', 'ppt', 'pptx', 'txt', 'jpg', 'jpeg', 'png']
 
@@ -12,33 +14,30 @@ def show_response_page():
     st.title("Meeting Requests Dashboard")
     st.caption("Review and respond to meeting requests")
     
-    if st.button("🔄 Refresh"):
-        st.rerun()
+    refresh = st.button("🔄 Refresh")
     
     try:
-        load_and_display_meetings()
+        load_and_display_meetings(refresh=refresh)
     except Exception as e:
         st.error(f"Error: {str(e)}")
 
-def load_and_display_meetings():
-    """Load and display meeting requests"""
+def load_and_display_meetings(refresh=False):
+    """Load and display meeting requests, one page at a time"""
     if "token" not in st.session_state or not st.session_state.token:
         st.error("You must be logged in to view this page.")
         return
         
     headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    response = requests.get(f"{API_BASE_URL}/meetings", headers=headers)
+    store = get_meetings_store("response", {"view": "all", "sort": "date_desc", "page_size": PAGE_SIZE}, refresh=refresh)
+    meetings = store["meetings"]
     
-    if response.status_code == 200:
-        data = response.json()
-        meetings = data.get('meetings', [])
-        
-        if not meetings:
-            display_empty_state()
-        else:
-            display_meetings(meetings, headers)
+    if not meetings:
+        display_empty_state()
     else:
-        st.error(f"Failed to load meetings: {response.status_code}")
+        display_meetings(meetings, headers)
+        if store["next_cursor"] and st.button("Load more", use_container_width=True):
+            fetch_next_page(store)
+            st.rerun()
 
 def display_empty_state():
     """Display a message when there are no meetings"""
@@ -184,7 +183,11 @@ def display_response_form(meeting, headers):
                             result = response.json()
                             successful_uploads += 1
                         else:
-                            st.error(f"Failed to upload {uploaded_file.name}")
+                            try:
+                                error = response.json().get('error')
+                            except ValueError:
+                                error = None
+                            st.error(f"Failed to upload {uploaded_file.name}" + (f": {error}" if error else ""))
                     except Exception as e:
                         st.error(f"Error uploading {uploaded_file.name}: {str(e)}")
                 
@@ -193,6 +196,7 @@ def display_response_form(meeting, headers):
                     st.success(f"Successfully uploaded {successful_uploads} of {len(uploaded_files)} files")
                     # Set flag to clear the uploader on next render
                     st.session_state[f'clear_uploader_{meeting_id}'] = True
+                    mark_meetings_stale()
                     # Short pause to show success message before refreshing
                     time.sleep(1.5)
                     st.rerun()
@@ -236,6 +240,7 @@ def update_meeting(meeting_id, status, response, headers):
         )
         if response.status_code == 200:
             st.success("Meeting updated successfully")
+            mark_meetings_stale()
             st.rerun()
         else:
             st.error(f"Failed to update meeting: {response.json().get('message', 'Unknown error')}")
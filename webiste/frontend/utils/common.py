@@ -2,8 +2,10 @@
 Common utilities for the frontend application
 """
 import streamlit as st
+import requests
 import time
 import os
+from functools import cmp_to_key
 
 # API Constants
 API_BASE_URL = "http://localhost:8000/api"
@@ -14,6 +16,9 @@ ROLES = ["Frontend", "Backend", "Design", "Product", "Marketing", "Sales"]
 # Max size for file uploads in MB
 MAX_FILE_SIZE_MB = 10
 
+# Order of the statuses when meetings are sorted by status (same as the API)
+MEETING_STATUS_ORDER = ["pending", "accepted", "declined", "completed"]
+
 def load_css(css_file):
     """Load a CSS file and return its contents as a string"""
     try:
@@ -102,4 +107,138 @@ def display_back_button():
     if st.session_state.page != 'landing':
         if st.button("← Back to Landing Page"):
             st.session_state.page = 'landing'
-            st.rerun() 
\ No newline at end of file
+            st.rerun() 
+
+def fetch_meetings_page(params, cursor=None):
+    """
+    Fetch one page of meetings from the API
+    
+    Returns:
+        (meetings, next_cursor), or None if the request failed
+    """
+    try:
+        response = requests.get(
+            f"{API_BASE_URL}/meetings",
+            params={**params, "cursor": cursor} if cursor else params,
+            headers={"Authorization": f"Bearer {st.session_state.token}"}
+        )
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            st.error(f"Error fetching meetings: {response.json().get('message', 'Unknown error')}")
+            return None
+            
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return None
+
+def fetch_meeting_changes(since):
+    """
+    Fetch the meetings changed or deleted after a watermark
+    
+    Returns:
+        Dict with meetings, deleted, watermark and has_more, or None if the request failed
+    """
+    try:
+        response = requests.get(
+            f"{API_BASE_URL}/meetings/changes",
+            params={"since": since},
+            headers={"Authorization": f"Bearer {st.session_state.token}"}
+        )
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error fetching meeting changes: {response.status_code}")
+        return None
+    except Exception as e:
+        print(f"Error fetching meeting changes: {str(e)}")
+        return None
+
+def get_meetings_store(name, params, refresh=False):
+    """
+    Meetings loaded so far for a page of the app, kept in the session state.
+    The first page is fetched when the query parameters change; on refresh, or after
+    mark_meetings_stale, only the changes since the last sync are fetched and merged.
+    """
+    key = f"meetings_store_{name}"
+    store = st.session_state.get(key)
+    if store is None or store["params"] != params:
+        store = {"params": params, "meetings": [], "next_cursor": None, "watermark": None, "stale": False}
+        st.session_state[key] = store
+        fetch_next_page(store, first=True)
+    elif refresh or store["stale"]:
+        sync_meetings_store(store)
+    return store
+
+def mark_meetings_stale():
+    """Sync every store on its next use, e.g. after this session changed a meeting"""
+    for key in list(st.session_state.keys()):
+        if key.startswith("meetings_store_"):
+            st.session_state[key]["stale"] = True
+
+def fetch_next_page(store, first=False):
+    """Append the next page of meetings to a store"""
+    page = fetch_meetings_page(store["params"], None if first else store["next_cursor"])
+    if page is None:
+        return
+    if first:
+        store["watermark"] = page.get("watermark")
+    # a page can repeat a meeting merged by a sync
+    known = {meeting.get('id') for meeting in store["meetings"]}
+    store["meetings"].extend(m for m in page.get('meetings', []) if m.get('id') not in known)
+    store["next_cursor"] = page.get('next_cursor')
+
+def _compare_meetings(a, b, sort):
+    """Order of two meetings in the list, as sorted by the API"""
+    key_a = (a.get('date', ''), a.get('time', ''))
+    key_b = (b.get('date', ''), b.get('time', ''))
+    if sort == "date_asc":
+        return (key_a > key_b) - (key_a < key_b)
+    if sort == "status":
+        rank = {status: i for i, status in enumerate(MEETING_STATUS_ORDER)}
+        rank_a = rank.get(a.get('status'), len(rank))
+        rank_b = rank.get(b.get('status'), len(rank))
+        if rank_a != rank_b:
+            return rank_a - rank_b
+        # the other statuses share the last bucket, ordered by name
+        status_a, status_b = str(a.get('status', '')), str(b.get('status', ''))
+        if rank_a == len(rank) and status_a != status_b:
+            return (status_a > status_b) - (status_a < status_b)
+    return (key_b > key_a) - (key_b < key_a)
+
+def _matches_params(meeting, params):
+    """Whether a meeting belongs to the list described by the query parameters"""
+    user_info = st.session_state.user_info
+    if params.get("view") == "mine" and meeting.get('requester_id') != user_info.get('id'):
+        return False
+    if params.get("view") == "team" and meeting.get('team_agent') != user_info.get('role'):
+        return False
+    statuses = params.get("status")
+    return not statuses or meeting.get('status') in statuses
+
+def sync_meetings_store(store):
+    """
+    Merge the changes since the store's watermark into it.
+    Falls back to loading the first page again if the changes cannot be fetched.
+    """
+    store["stale"] = False
+    sort_key = cmp_to_key(lambda a, b: _compare_meetings(a, b, store["params"].get("sort", "date_desc")))
+    # meetings after the last loaded one arrive with the next pages
+    last = sort_key(store["meetings"][-1]) if store["meetings"] and store["next_cursor"] else None
+    
+    while store["watermark"]:
+        changes = fetch_meeting_changes(store["watermark"])
+        if changes is None:
+            break
+        dropped = set(changes.get('deleted', [])) | {m.get('id') for m in changes.get('meetings', [])}
+        meetings = [m for m in store["meetings"] if m.get('id') not in dropped]
+        for meeting in changes.get('meetings', []):
+            if _matches_params(meeting, store["params"]) and (last is None or not sort_key(meeting) > last):
+                meetings.append(meeting)
+        store["meetings"] = sorted(meetings, key=sort_key)
+        store["watermark"] = changes.get('watermark')
+        if not changes.get('has_more'):
+            return
+    
+    store["meetings"], store["next_cursor"] = [], None
+    fetch_next_page(store, first=True)